@@ -8,6 +8,7 @@ from peft import LoraConfig, get_peft_model, PeftModel
 from transformers import BitsAndBytesConfig
 from huggingface_hub import login
 from dotenv import load_dotenv
+from app.extract import scan_layout
 load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env"))
 
 # Function to clean and convert numeric values
@@ -23,28 +24,13 @@ def clean_numeric(value):
 
 # Step 1: Read and process the Excel file
 def process_trial_balance_excel(file_path, source_file_name):
-    # Try different skiprows to find the correct header
-    for skip in range(0, 10):
-        df = pd.read_excel(file_path, skiprows=skip)
-        print(f"Trying skiprows={skip} -> Columns: {df.columns.tolist()}")
-        # Try to find the correct columns for account name and amount
-        possible_account_cols = ["Account Name", "Unnamed: 0", "A/c Name", "A/c Code", "Advance Tax"]
-        possible_amount_cols = ["Net Credit", "Amount", "Net Amount", "Net Debit", "Closing Balance", "95,56,617.16", 9487093, 69524.16, 0]
-        account_col = None
-        amount_col = None
-        for col in possible_account_cols:
-            if col in df.columns:
-                account_col = col
-                break
-        for col in possible_amount_cols:
-            if col in df.columns:
-                amount_col = col
-                break
-        if account_col and amount_col:
-            print(f"Using skiprows={skip}, account_col={account_col}, amount_col={amount_col}")
-            break
-    else:
-        raise KeyError(f"Could not find account or amount columns. Columns found: {df.columns.tolist()}")
+    # Find the header row and columns from the first rows, then read the data once
+    layout = scan_layout(file_path)
+    if not layout.detected or layout.amount_column is None:
+        raise KeyError(f"Could not find account or amount columns. Header scan: {layout.labels}")
+    account_col, amount_col = layout.account, layout.amount_column
+    print(f"Using header row {layout.header_row}, account_col={layout.labels.get(account_col)}, amount_col={layout.labels.get(amount_col)}")
+    df = pd.read_excel(file_path, header=None, skiprows=layout.data_start)
 
     # Rename columns for consistency
     df = df.rename(columns={account_col: "Account Name", amount_col: "Amount"})
@@ -1,122 +1,292 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
-from fastapi.responses import JSONResponse, PlainTextResponse
-from typing import Optional
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from typing import List, Optional
 from app.notes import generate_notes
-from app.utils import clean_value
-import pandas as pd
 import os
 from app.pnl import generate_pnl_report
-import shutil
-from app.extract import extract_trial_balance_data, analyze_and_save_results
+from app.extract import extract_trial_balance_data, extract_trial_balance_to_file
+from app.columnar import load_trial_balance_frame, save_parsed_trial_balance
 from app.new_main import FlexibleFinancialNoteGenerator  
 import json
-from app.main16_23 import process_json
-from app.json_xlsx import json_to_xlsx
-import json as pyjson
+import hashlib
+import io
+import time
+import asyncio
+import threading
+import zipfile
+from app.main16_23 import notes_document
 from app.utils_normalize import normalize_llm_note_json
 from app.bs import generate_balance_sheet_report
 from app.cashflow import generate_cashflow_report
-import subprocess
+from app.workspace import JobWorkspace
+from app.jobs import get_job_queue
+from app.executor import run_cpu, run_io, executor_metrics
+from app.cache import get_result_cache
+from app.mapping_registry import current_mappings
+from app.classifier import get_classification_cache
+from app.llm_fallback import get_llm_fallback
+from app.classification_metrics import collect_extraction_stats, get_classification_metrics
+from app.pipeline import run_notes_pipeline
+from app.batch import BATCH_EXTENSIONS, BATCH_MAX_FILES, build_archive, entity_name, expand_zip, run_entity
+from pnlbs.sircodebs import extract_bs_notes
+from pnlbs.sircodepnl import extract_pnl_notes
+from pnlbs.csv_json_bs import FinancialCSVMapper as BSNotesMapper
+from pnlbs.csv_json_pnl import FinancialCSVMapper as PnLNotesMapper
+from pnlbs.bl_llm import EnhancedBalanceSheetGenerator
+from pnlbs.pnl_note import PnLGenerator
 
 
 router = APIRouter()
 
-def process_uploaded_file(file: UploadFile):
-    os.makedirs("input", exist_ok=True)
-    file_location = f"input/{file.filename}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    structured_data = extract_trial_balance_data(file_location)
-    output_file = "output1/parsed_trial_balance.json"
-    analyze_and_save_results(structured_data, output_file)
-    # Load DataFrame from the just-created JSON
-    with open(output_file, "r", encoding="utf-8") as f:
-        parsed_data = json.load(f)
-    tb_df = pd.DataFrame(parsed_data if isinstance(parsed_data, list) else parsed_data.get("trial_balance", parsed_data))
-    tb_df['amount'] = tb_df['amount'].apply(clean_value)
-    return tb_df
+def open_workspace(job_id: Optional[str]):
+    """Re-open an existing job workspace, or None to use the legacy shared folders."""
+    if not job_id:
+        return None
+    try:
+        return JobWorkspace.open(job_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+def extract_parsed_trial_balance(file_location: str, output_file: str):
+    """
+    Parse the uploaded workbook and write the classified records to output_file
+    (streamed for .xlsx). Returns the extraction's classification report.
+    """
+    with collect_extraction_stats() as stats:
+        extract_trial_balance_to_file(file_location, output_file)
+    return stats.report()
+
+def process_uploaded_file(file_location: str, output_file: str):
+    extract_parsed_trial_balance(file_location, output_file)
+    return load_parsed_trial_balance(output_file)
+
+def load_parsed_trial_balance(output_file: str):
+    # Load DataFrame from the parsed trial balance (.tbc columns, or JSON of older jobs)
+    return load_trial_balance_frame(output_file)
+
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+def render_workbook_bytes(render, output_kwarg="output_file", **kwargs):
+    """Run a workbook renderer into an in-memory buffer; returns the .xlsx bytes or None."""
+    buffer = io.BytesIO()
+    kwargs[output_kwarg] = buffer
+    if not render(**kwargs):
+        return None
+    return buffer.getvalue()
+
+def save_bytes(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+def read_bytes(path: str):
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def xlsx_response(data: bytes, filename: str, job_id: Optional[str] = None, extra_headers=None, background=None):
+    """Stream an in-memory workbook back as a file download."""
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if job_id:
+        headers["X-Job-Id"] = job_id
+    headers.update(extra_headers or {})
+    return StreamingResponse(io.BytesIO(data), media_type=XLSX_MEDIA_TYPE, headers=headers, background=background)
+
+def cleanup_task(workspace: JobWorkspace):
+    """Remove a workspace nobody will ask for by job_id once its response has been sent."""
+    return BackgroundTask(workspace.cleanup)
+
+async def stream_report(render, filename: str, persist_path: Optional[str], job_id: Optional[str], **kwargs):
+    """Render a report in memory on the CPU pool and stream it, saving a copy only when persist_path is set."""
+    data = await run_cpu(render_workbook_bytes, render, **kwargs)
+    if data is None:
+        raise HTTPException(status_code=500, detail=f"Failed to generate {filename}")
+    if persist_path:
+        await run_io(save_bytes, persist_path, data)
+    return xlsx_response(data, filename, job_id)
+
+def parse_note_numbers(note_number: Optional[str]):
+    """'13, 16' -> ['13', '16'] (sorted, de-duplicated); None when no filter was given."""
+    if not note_number:
+        return None
+    return sorted({n.strip() for n in note_number.split(",") if n.strip()}) or None
+
+def artifact_name(stem: str, ext: str, numbers):
+    """Cache artifact name for an output, distinct per note filter."""
+    if not numbers:
+        return f"{stem}.{ext}"
+    return f"{stem}_{hashlib.sha256(','.join(numbers).encode()).hexdigest()[:16]}.{ext}"
+
+async def generate_notes_cached(workspace: JobWorkspace, file_location: str, numbers=None):
+    """
+    app.notes output for an upload (only the requested note numbers, if any)
+    and the classification report of its extraction, served from the result
+    cache when the same file was seen before.
+    """
+    cache = get_result_cache()
+    cache_key = await run_io(cache.key_for_file, file_location)
+    notes_name = artifact_name("notes", "json", numbers)
+    notes = await run_io(cache.get_json, cache_key, notes_name)
+    classification = await run_io(cache.get_json, cache_key, "classification.json")
+    if notes is not None:
+        await run_io(cache.restore, cache_key, {"parsed_trial_balance.tbc": workspace.parsed_trial_balance})
+        return notes, classification
+    if not await run_io(cache.restore, cache_key, {"parsed_trial_balance.tbc": workspace.parsed_trial_balance}):
+        classification = await run_cpu(extract_parsed_trial_balance, file_location, workspace.parsed_trial_balance)
+        get_classification_metrics().record(classification)
+        await run_io(cache.put, cache_key, "parsed_trial_balance.tbc", workspace.parsed_trial_balance)
+        await run_io(cache.put_json, cache_key, "classification.json", classification)
+    tb_df = await run_cpu(load_parsed_trial_balance, workspace.parsed_trial_balance)
+    notes = await run_cpu(generate_notes, tb_df, requested_notes=numbers)
+    await run_io(cache.put_json, cache_key, notes_name, notes)
+    return notes, classification
 
 @router.post("/notes/json")
 async def post_notes_json(
     file: UploadFile = File(...),
     note_number: Optional[str] = Form(None)  # Comma-separated string, e.g. "13,16"
 ):
-    tb_df = process_uploaded_file(file)
-    notes = generate_notes(tb_df)
-    # Filter notes if note_number is provided
-    if note_number:
-        numbers = [n.strip() for n in note_number.split(",")]
-        notes = [note for note in notes if any(note['Note'].startswith(f"{n}.") or note['Note'] == n for n in numbers)]
-    return JSONResponse({"notes": notes})
+    workspace = JobWorkspace()
+    file_location = await run_io(workspace.save_upload, file)
+    # Only the requested notes are computed
+    notes, classification = await generate_notes_cached(workspace, file_location, parse_note_numbers(note_number))
+    return JSONResponse({"job_id": workspace.job_id, "notes": notes, "classification": classification})
 
 @router.post("/notes/text")
 async def post_notes_text(
     file: UploadFile = File(...),
     note_number: Optional[str] = Form(None)  # Comma-separated string, e.g. "13,16"
 ):
-    tb_df = process_uploaded_file(file)
-    notes = generate_notes(tb_df)
-    # Filter notes if note_number is provided
-    if note_number:
-        numbers = [n.strip() for n in note_number.split(",")]
-        notes = [note for note in notes if any(note['Note'].startswith(f"{n}.") or note['Note'] == n for n in numbers)]
+    workspace = JobWorkspace()
+    file_location = await run_io(workspace.save_upload, file)
+    # Only the requested notes are computed
+    notes, _ = await generate_notes_cached(workspace, file_location, parse_note_numbers(note_number))
     # Build markdown string
     md = "# Notes to Financial Statements for the Year Ended March 31, 2024\n\n"
     for note in notes:
         md += f"## {note['Note']}\n\n{note['Content']}\n\n"
-    return PlainTextResponse(md, media_type="text/plain")
+    # No job_id is returned, so the workspace is not needed afterwards
+    return PlainTextResponse(md, media_type="text/plain", background=cleanup_task(workspace))
 
 @router.post("/cf")
-async def generate_cashflow():
+async def generate_cashflow(
+    job_id: Optional[str] = Form(None),
+    download: bool = Form(False),
+    persist: bool = Form(False),
+):
+    """
+    Generates the Cash Flow Excel file. With job_id, reads the notes and parsed
+    trial balance of that job's workspace instead of the shared folders.
+    With download, the workbook is streamed back from memory (saved too only if persist).
+    """
+    workspace = open_workspace(job_id)
+    if download:
+        folders = {"notes_folder": workspace.notes_dir, "tb_folder": workspace.path("output1")} if workspace else {}
+        output_file = (workspace.path("cashflow_excel", "cashflow_report.xlsx") if workspace
+                       else os.path.join("cashflow_excel", "cashflow_report.xlsx"))
+        return await stream_report(generate_cashflow_report, "cashflow_report.xlsx",
+                                   output_file if persist else None, job_id, **folders)
     try:
-        generate_cashflow_report()
-        return {"message": "Cash Flow report generated successfully as 'cashflow_excel/cashflow_report.xlsx'."}
+        if workspace:
+            output_file = await run_cpu(
+                generate_cashflow_report,
+                notes_folder=workspace.notes_dir,
+                tb_folder=workspace.path("output1"),
+                output_file=workspace.path("cashflow_excel", "cashflow_report.xlsx"),
+            )
+        else:
+            output_file = await run_cpu(generate_cashflow_report)
+        return {"message": f"Cash Flow report generated successfully as '{output_file}'.", "job_id": job_id}
     except Exception as e:
         return {"error": f"Failed to generate Cash Flow report: {str(e)}"}
     
 
 @router.post("/bs")
-async def generate_balancesheet():
+async def generate_balancesheet(
+    job_id: Optional[str] = Form(None),
+    download: bool = Form(False),
+    persist: bool = Form(False),
+):
     """
-    Generates the Balance Sheet Excel file from the notes in generated_notes/notes.json.
-    Returns a message with the output file location.
+    Generates the Balance Sheet Excel file from the notes in generated_notes/notes.json
+    (or the job's own generated_notes when job_id is given).
+    Returns a message with the output file location, or with download the workbook itself.
     """
+    workspace = open_workspace(job_id)
+    if download:
+        folders = {"notes_folder": workspace.notes_dir} if workspace else {}
+        output_file = (workspace.path("balancesheet_excel", "balancesheet_report.xlsx") if workspace
+                       else os.path.join("balancesheet_excel", "balancesheet_report.xlsx"))
+        return await stream_report(generate_balance_sheet_report, "balancesheet_report.xlsx",
+                                   output_file if persist else None, job_id, **folders)
     try:
-        generate_balance_sheet_report()
-        return {"message": "Balance Sheet report generated successfully as 'balance_sheet_report.xlsx'."}
+        if workspace:
+            output_file = await run_cpu(
+                generate_balance_sheet_report,
+                notes_folder=workspace.notes_dir,
+                output_file=workspace.path("balancesheet_excel", "balancesheet_report.xlsx"),
+            )
+        else:
+            output_file = await run_cpu(generate_balance_sheet_report)
+        return {"message": f"Balance Sheet report generated successfully as '{output_file}'.", "job_id": job_id}
     except Exception as e:
         return {"error": f"Failed to generate Balance Sheet: {str(e)}"}
 
 @router.post("/pnl")
-async def generate_pnl():
-    
+async def generate_pnl(
+    job_id: Optional[str] = Form(None),
+    download: bool = Form(False),
+    persist: bool = Form(False),
+):
+    workspace = open_workspace(job_id)
+    if download:
+        folders = {"notes_folder": workspace.notes_dir} if workspace else {}
+        output_file = (workspace.path("pnl_excel", "pnl_report.xlsx") if workspace
+                       else os.path.join("pnl_excel", "pnl_report.xlsx"))
+        return await stream_report(generate_pnl_report, "pnl_report.xlsx",
+                                   output_file if persist else None, job_id, **folders)
     try:
-        generate_pnl_report()
-        return {"message": "P&L report generated successfully as 'pnl_report.xlsx'."}
+        if workspace:
+            output_file = await run_cpu(
+                generate_pnl_report,
+                notes_folder=workspace.notes_dir,
+                output_file=workspace.path("pnl_excel", "pnl_report.xlsx"),
+            )
+        else:
+            output_file = await run_cpu(generate_pnl_report)
+        return {"message": f"P&L report generated successfully as '{output_file}'.", "job_id": job_id}
     except Exception as e:
         return {"error": f"Failed to generate P&L report: {str(e)}"}
     
     
-@router.post("/new")
-async def llm_generate_and_excel(
-    file: UploadFile = File(...),
-    note_number: Optional[str] = Form(None)
-):
-    import os
-    import json
-    import shutil
-    from app.utils_normalize import normalize_llm_note_json, normalize_llm_notes_json
-
-    # 1. Save uploaded Excel file
-    os.makedirs("input", exist_ok=True)
-    file_location = f"input/{file.filename}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # 2. Extract trial balance and save as JSON
-    structured_data = extract_trial_balance_data(file_location)
-    output_json = "output1/parsed_trial_balance.json"
-    analyze_and_save_results(structured_data, output_json)
+def generate_llm_notes(workspace: JobWorkspace, file_location: str, note_number: Optional[str] = None, progress=None, excel_output=None,
+                       on_note_event=None, write_outputs=True):
+    """
+    Runs the LLM notes pipeline for an upload already saved in the workspace.
+    progress(note_number, success, total) is called as each note finishes, and
+    on_note_event(event) with the note JSON, latency and model (see iter_notes).
+    excel_output, a file-like object, receives the workbook instead of generated_notes_excel/.
+    Without write_outputs (needs excel_output) the trial balance and notes stay in
+    memory and nothing is written to the workspace.
+    Returns (message, artifacts) with artifacts relative to the workspace root.
+    """
+    from app.utils_normalize import normalize_llm_notes_json
+    from app.json_xlsx import json_to_xlsx
+
+    if not write_outputs:
+        return generate_llm_notes_in_memory(file_location, note_number, excel_output, progress, on_note_event)
+
+    # 2. Extract trial balance and save it (columnar, plus JSON if EXPORT_PARSED_JSON)
+    parsed_tb = workspace.parsed_trial_balance
+    with collect_extraction_stats() as stats:
+        extract_trial_balance_to_file(file_location, parsed_tb)
+    get_classification_metrics().record(stats.report())
 
     # 3. Initialize the generator
     try:
@@ -125,321 +295,444 @@ async def llm_generate_and_excel(
         raise HTTPException(status_code=500, detail=f"Generator init failed: {e}")
 
     # 4. Generate notes using the extracted JSON
-    os.makedirs("generated_notes_excel", exist_ok=True)
-    from app.json_xlsx import json_to_xlsx
-
-    wrapped_json_path = "generated_notes/notes_wrapped.json"
+    notes_dir = workspace.notes_dir
+    notes_json_path = os.path.join(notes_dir, "notes.json")
+    wrapped_json_path = os.path.join(notes_dir, "notes_wrapped.json")
+    excel_path = workspace.path("generated_notes_excel", "notes.xlsx")
+    artifacts = {
+        "notes_json": "generated_notes/notes.json",
+        "notes_wrapped_json": "generated_notes/notes_wrapped.json",
+    }
+    if excel_output is None:
+        artifacts["notes_xlsx"] = "generated_notes_excel/notes.xlsx"
+        excel_note = f"Excel saved at {excel_path}."
+    else:
+        excel_note = "Excel returned in the response."
 
     if note_number:
         # Support multiple note numbers (comma-separated)
         note_numbers = [n.strip() for n in note_number.split(",")]
         all_notes = []
-        for n in note_numbers:
-            success = generator.generate_note(n, trial_balance_path=output_json)
+        for index, n in enumerate(note_numbers, start=1):
+            started = time.perf_counter()
+            generator.last_model = None
+            success = generator.generate_note(n, trial_balance_path=parsed_tb, output_dir=notes_dir)
+            note_json = None
             if success:
                 # Read the just-generated note
-                with open("generated_notes/notes.json", "r", encoding="utf-8") as f:
+                with open(notes_json_path, "r", encoding="utf-8") as f:
                     note_json = json.load(f)
                 all_notes.append(note_json)
+            if progress:
+                progress(n, success, len(note_numbers))
+            if on_note_event:
+                on_note_event({
+                    "note_number": n,
+                    "success": success,
+                    "latency_ms": round((time.perf_counter() - started) * 1000),
+                    "model": generator.last_model,
+                    "completed": index,
+                    "total": len(note_numbers),
+                    "note": note_json,
+                })
         # Now write all notes together
-        with open("generated_notes/notes.json", "w", encoding="utf-8") as f:
+        with open(notes_json_path, "w", encoding="utf-8") as f:
             json.dump({"notes": all_notes}, f, indent=2, ensure_ascii=False)
         # --- Normalize all notes ---
         wrapped = normalize_llm_notes_json({"notes": all_notes})
         with open(wrapped_json_path, "w", encoding="utf-8") as f2:
             json.dump(wrapped, f2, ensure_ascii=False, indent=2)
         # --------------------------
-        excel_path = f"generated_notes_excel/notes.xlsx"
-        json_to_xlsx(wrapped_json_path, excel_path)
-        return {"message": f"Notes {', '.join(note_numbers)} generated. Excel saved at {excel_path}."}
+        json_to_xlsx(wrapped, excel_output or excel_path)
+        return f"Notes {', '.join(note_numbers)} generated. {excel_note}", artifacts
     else:
         # Generate all notes
-        results = generator.generate_all_notes(trial_balance_path=output_json)
+        results = generator.generate_all_notes(trial_balance_path=parsed_tb, output_dir=notes_dir,
+                                               on_note_done=progress, on_note_event=on_note_event)
         if not any(results.values()):
             raise HTTPException(status_code=500, detail="Failed to generate any notes. LLM API may be down or unreachable.")
         # Read all notes.json
-        with open("generated_notes/notes.json", "r", encoding="utf-8") as f:
+        with open(notes_json_path, "r", encoding="utf-8") as f:
             notes_json = json.load(f)
         # --- Normalize all notes ---
         wrapped = normalize_llm_notes_json(notes_json)
         with open(wrapped_json_path, "w", encoding="utf-8") as f2:
             json.dump(wrapped, f2, ensure_ascii=False, indent=2)
         # --------------------------
-        excel_path = f"generated_notes_excel/notes.xlsx"
-        json_to_xlsx(wrapped_json_path, excel_path)
-        return {"message": f"All notes generated. Excel saved at {excel_path}."}
-        
+        json_to_xlsx(wrapped, excel_output or excel_path)
+        return f"All notes generated. {excel_note}", artifacts
 
 
-@router.post("/hardcoded")
-async def run_full_pipeline(
-    file: UploadFile = File(...),
-    note_number: Optional[str] = Form(None)  # Accepts comma-separated note numbers
-):
-    import json
-
-    # 1. Save uploaded Excel file
-    os.makedirs("input", exist_ok=True)
-    file_location = f"input/{file.filename}"
-    with open(file_location, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-
-    # 2. Run extract.py logic and save to output1
-    os.makedirs("output1", exist_ok=True)
-    structured_data = extract_trial_balance_data(file_location)
-    output1_json = "output1/parsed_trial_balance.json"
-    analyze_and_save_results(structured_data, output1_json)
-
-    # 3. Run main16-23.py logic and save to output2
-    os.makedirs("output2", exist_ok=True)
+def generate_llm_notes_in_memory(file_location: str, note_number: Optional[str], excel_output, progress=None,
+                                 on_note_event=None):
+    """generate_llm_notes() without any workspace files: the workbook goes to excel_output only."""
+    from app.utils_normalize import normalize_llm_notes_json
+    from app.json_xlsx import json_to_xlsx
+
+    with collect_extraction_stats() as stats:
+        records = extract_trial_balance_data(file_location)
+    get_classification_metrics().record(stats.report())
     try:
-        from app.main16_23 import process_json
-        process_json(output1_json)
-    except ImportError:
-        raise HTTPException(status_code=500, detail="main16_23.process_json not found. Please ensure 'app/main16_23.py' exists and is named correctly.")
+        generator = FlexibleFinancialNoteGenerator()
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"main16_23.process_json failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Generator init failed: {e}")
 
-    # 4. Filter notes if note_number is provided
-    notes_json = "output2/notes_output.json"
-    with open(notes_json, "r", encoding="utf-8") as f:
-        notes_data = json.load(f)
+    note_numbers = [n.strip() for n in note_number.split(",")] if note_number else None
+    all_notes = []
+    for event in generator.iter_notes(note_numbers=note_numbers, trial_balance={"accounts": records}):
+        if event["success"]:
+            all_notes.append(event["note"])
+        if progress:
+            progress(event["note_number"], event["success"], event["total"])
+        if on_note_event:
+            on_note_event(event)
+    if not all_notes and not note_numbers:
+        raise HTTPException(status_code=500, detail="Failed to generate any notes. LLM API may be down or unreachable.")
+    json_to_xlsx(normalize_llm_notes_json({"notes": all_notes}), excel_output)
+    generated = f"Notes {', '.join(note_numbers)}" if note_numbers else "All notes"
+    return f"{generated} generated. Excel returned in the response.", {}
 
-    # If notes_data is a dict with a key (e.g. "notes"), extract the list
-    if isinstance(notes_data, dict):
-        for key in ["notes", "trial_balance"]:
-            if key in notes_data:
-                notes_data = notes_data[key]
-                break
 
-    # Always wrap as dict for Excel conversion
-    def wrap_notes(notes):
-        return {"notes": notes}
+@router.post("/new")
+async def llm_generate_and_excel(
+    file: UploadFile = File(...),
+    note_number: Optional[str] = Form(None),
+    download: bool = Form(False),
+    persist: bool = Form(False),
+):
+    # 1. Save uploaded Excel file into this request's workspace
+    workspace = JobWorkspace()
+    file_location = await run_io(workspace.save_upload, file)
+    if download:
+        buffer = io.BytesIO()
+        # Without persist only the upload is written; everything else stays in memory
+        await run_io(generate_llm_notes, workspace, file_location, note_number, excel_output=buffer,
+                     write_outputs=persist)
+        data = buffer.getvalue()
+        if persist:
+            await run_io(save_bytes, workspace.path("generated_notes_excel", "notes.xlsx"), data)
+            return xlsx_response(data, "notes.xlsx", workspace.job_id)
+        return xlsx_response(data, "notes.xlsx", workspace.job_id, background=cleanup_task(workspace))
+    # Mostly waiting on the LLM API, so this runs on the I/O thread pool
+    message, _ = await run_io(generate_llm_notes, workspace, file_location, note_number)
+    return {"message": message, "job_id": workspace.job_id}
+
+
+class StreamClosed(Exception):
+    """Raised inside the generator thread once the streaming client has gone away."""
+
+
+def format_stream_event(event_type: str, data: dict, stream_format: str) -> str:
+    if stream_format == "ndjson":
+        return json.dumps({"event": event_type, **data}, ensure_ascii=False, default=str) + "\n"
+    return f"event: {event_type}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/new/stream")
+async def stream_llm_notes(
+    file: UploadFile = File(...),
+    note_number: Optional[str] = Form(None),
+    stream_format: str = Form("sse"),  # "sse" (text/event-stream) or "ndjson"
+):
+    """
+    Runs the /new pipeline and streams one "note" event per note as soon as it is
+    generated (note_number, success, latency_ms, model, normalized note JSON),
+    then a final "done" event with the job_id and artifact links, or "error".
+    """
+    if stream_format not in ("sse", "ndjson"):
+        raise HTTPException(status_code=400, detail="stream_format must be 'sse' or 'ndjson'")
+    workspace = JobWorkspace()
+    file_location = await run_io(workspace.save_upload, file)
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    client_gone = threading.Event()
+
+    def on_note_event(event):
+        if client_gone.is_set():
+            raise StreamClosed()
+        note = event["note"]
+        payload = {**event, "note": normalize_llm_note_json(note) if note else None}
+        loop.call_soon_threadsafe(queue.put_nowait, ("note", payload))
+
+    def run():
+        try:
+            return generate_llm_notes(workspace, file_location, note_number, on_note_event=on_note_event)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    async def events():
+        task = asyncio.ensure_future(run_io(run))
+        try:
+            yield format_stream_event("start", {"job_id": workspace.job_id}, stream_format)
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                yield format_stream_event(*item, stream_format)
+            try:
+                message, artifacts = await task
+                links = {name: f"/jobs/{workspace.job_id}/artifacts/{path}" for name, path in artifacts.items()}
+                yield format_stream_event("done", {"job_id": workspace.job_id, "message": message, "artifacts": links}, stream_format)
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                yield format_stream_event("error", {"job_id": workspace.job_id, "error": str(detail)}, stream_format)
+        finally:
+            # Stops generation at the next note if the client disconnected
+            client_gone.set()
+
+    media_type = "application/x-ndjson" if stream_format == "ndjson" else "text/event-stream"
+    return StreamingResponse(events(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Job-Id": workspace.job_id})
+
+
+@router.post("/new/jobs", status_code=202)
+async def submit_llm_notes_job(
+    file: UploadFile = File(...),
+    note_number: Optional[str] = Form(None)
+):
+    """
+    Queues the /new pipeline on the background worker pool and returns at once.
+    Poll GET /jobs/{job_id} for status, per-note progress and artifact links.
+    """
+    workspace = JobWorkspace()
+    file_location = await run_io(workspace.save_upload, file)
+    get_job_queue().submit(workspace.job_id, "llm_notes", generate_llm_notes, workspace, file_location, note_number,
+                           on_failure=workspace.cleanup)
+    return {"job_id": workspace.job_id, "status": "queued", "status_url": f"/jobs/{workspace.job_id}"}
+
+
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = get_job_queue().store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    job["artifacts"] = {
+        name: f"/jobs/{job_id}/artifacts/{relative_path}"
+        for name, relative_path in job["artifacts"].items()
+    }
+    return job
+
+
+@router.get("/jobs/{job_id}/artifacts/{artifact_path:path}")
+async def get_job_artifact(job_id: str, artifact_path: str):
+    workspace = open_workspace(job_id)
+    file_path = os.path.realpath(workspace.path(artifact_path))
+    if not file_path.startswith(os.path.realpath(workspace.root) + os.sep) or not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail=f"Artifact {artifact_path} not found")
+    return FileResponse(file_path, filename=os.path.basename(file_path))
 
-    # Filter notes if note_number is provided
-    if note_number:
-        numbers = [n.strip() for n in note_number.split(",")]
-        notes_data = [
-            note for note in notes_data
-            if str(note.get('note_number', '')).strip() in numbers
-        ]
-        filtered_json = "output2/notes_output_filtered.json"
-        with open(filtered_json, "w", encoding="utf-8") as f2:
-            json.dump(wrap_notes(notes_data), f2, ensure_ascii=False, indent=2)
-        json_input_for_excel = filtered_json
-    else:
-        temp_json = "output2/notes_output_wrapped.json"
-        with open(temp_json, "w", encoding="utf-8") as f2:
-            json.dump(wrap_notes(notes_data), f2, ensure_ascii=False, indent=2)
-        json_input_for_excel = temp_json
 
-    # 5. Run json-xlsx.py logic and save to output3
-    os.makedirs("output3", exist_ok=True)
+@router.post("/hardcoded")
+async def run_full_pipeline(
+    file: UploadFile = File(...),
+    note_number: Optional[str] = Form(None),  # Accepts comma-separated note numbers
+    download: bool = Form(False),  # Stream the workbook back instead of returning a message
+    persist: bool = Form(False),  # With download, also keep the workbook in the workspace
+):
+    # 1. Save uploaded Excel file into this request's workspace
+    workspace = JobWorkspace()
+    file_location = await run_io(workspace.save_upload, file)
+
+    # 2-4. extract -> main16_23 notes -> workbook, each stage memoized on its
+    # inputs' content hash; a new note filter or output format for a file seen
+    # before reuses the extracted records and the notes already built
     try:
-        from app.json_xlsx import json_to_xlsx
-        output3_xlsx = "output3/final_output.xlsx"
-        json_to_xlsx(json_input_for_excel, output3_xlsx)
-    except ImportError:
-        raise HTTPException(status_code=500, detail="json_xlsx.json_to_xlsx not found")
+        run = await run_notes_pipeline(
+            file_location, parse_note_numbers(note_number),
+            targets=("extraction", "records", "notes_json", "workbook"),
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"json_xlsx.json_to_xlsx failed: {e}")
-
-    return {"message": "Pipeline completed successfully. Excel file saved in output3."}
-
-
+        raise HTTPException(status_code=500, detail=f"Pipeline failed: {e}")
+    data = run.values["workbook"]
+    if data is None:
+        raise HTTPException(status_code=500, detail="json_xlsx.json_to_xlsx failed: workbook could not be written")
+    print(f"⏱️ /hardcoded stages: {run.summary()}")
+    classification = run.values["extraction"]["classification"]
+    if "extract" in run.ran:
+        get_classification_metrics().record(classification)
+
+    # Keep the intermediates in the workspace for the job_id based endpoints;
+    # a download without persist writes nothing besides the upload
+    if not download or persist:
+        await run_io(write_pipeline_outputs, workspace, run.values["records"], run.values["notes_json"])
+    output3_xlsx = workspace.final_output_xlsx
+    if download:
+        if persist:
+            await run_io(save_bytes, output3_xlsx, data)
+            return xlsx_response(data, "final_output.xlsx", workspace.job_id, classification_headers(classification))
+        return xlsx_response(data, "final_output.xlsx", workspace.job_id, classification_headers(classification),
+                             background=cleanup_task(workspace))
+    await run_io(save_bytes, output3_xlsx, data)
+    return {"message": f"Pipeline completed successfully. Excel file saved at {output3_xlsx}.", "job_id": workspace.job_id,
+            "cached": run.cached, "classification": classification}
+
+
+def classification_headers(classification):
+    """Headline numbers of a classification report for responses that are not JSON."""
+    if not classification:
+        return {}
+    return {
+        "X-Mapping-Success-Rate": str(classification["mapping_success_rate"]),
+        "X-Unmapped-Records": str(classification["tiers"].get("Unmapped", {}).get("records", 0)),
+        "X-Rows-Per-Second": str(classification["rows_per_second"]),
+    }
+
+
+def write_pipeline_outputs(workspace: JobWorkspace, records, notes_json):
+    """Write output1/parsed_trial_balance.tbc and output2/notes_output.json of a pipeline run."""
+    save_parsed_trial_balance(records, workspace.parsed_trial_balance)
+    with open(workspace.notes_output, "w", encoding="utf-8") as f:
+        json.dump(notes_document(notes_json["notes"]), f, ensure_ascii=False, indent=2)
+
+
+def build_balance_sheet_from_notes(input_excel_path: str, output_dir: str):
+    """Note sheets -> financial JSON -> balance sheet Excel, all in memory. Returns the Excel path."""
+    frames = extract_bs_notes(input_excel_path)
+    financial_data = BSNotesMapper().process_dataframes(frames)
+    if "error" in financial_data:
+        raise ValueError(financial_data["error"])
+    generator = EnhancedBalanceSheetGenerator(os.getenv("OPENROUTER_API_KEY"))
+    return generator.process_data(financial_data, output_dir)
+
+def build_pnl_from_notes(input_excel_path: str, output_file: str):
+    """Note sheets -> financial JSON -> P&L Excel, all in memory. Returns the Excel path or None."""
+    frames = extract_pnl_notes(input_excel_path)
+    financial_data = PnLNotesMapper().process_dataframes(frames)
+    if "error" in financial_data:
+        raise ValueError(financial_data["error"])
+    generator = PnLGenerator(data=financial_data)
+    if not generator.generate_pnl_statement(output_file):
+        return None
+    return output_file
 
 @router.post("/bs_from_notes")
 async def bs_from_notes(file: UploadFile = File(...)):
     """
-    Accepts an Excel file, runs the full pipeline (sircodebs.py -> csv_json.py -> bl_llm.py),
-    and returns the path to the generated balance sheet Excel file.
+    Accepts an Excel file, runs the full pipeline (sircodebs -> csv_json_bs -> bl_llm)
+    in-process, and returns the path to the generated balance sheet Excel file.
     """
-    import os
-
-    # 1. Save uploaded Excel file
-    os.makedirs("input", exist_ok=True)
-    input_excel_path = os.path.join("input", file.filename)
-    with open(input_excel_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    print(f"[DEBUG] Uploaded Excel saved to: {input_excel_path}")
-    print(f"[DEBUG] Files in input/: {os.listdir('input')}")
-
-    # Prepare environment for subprocesses
-    env = os.environ.copy()
-    if os.getenv("OPENROUTER_API_KEY"):
-        env["OPENROUTER_API_KEY"] = os.getenv("OPENROUTER_API_KEY")
-    env["INPUT_FILE"] = "clean_financial_data_bs.json"
-
-    # 2. Run sircodebs.py with the uploaded Excel file
-    try:
-        print("[DEBUG] Running sircodebs.py...")
-        result1 = subprocess.run(
-            ["python", "pnlbs/sircodebs.py", input_excel_path],
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-            cwd="C:/SAHIL/NOTES"
-        )
-        print("[DEBUG] sircodebs.py STDOUT:\n", result1.stdout)
-        print("[DEBUG] sircodebs.py STDERR:\n", result1.stderr)
-        print(f"[DEBUG] Files in csv_notes_bs/: {os.listdir('csv_notes_bs') if os.path.exists('csv_notes_bs') else 'csv_notes_bs does not exist'}")
-    except subprocess.CalledProcessError as e:
-        print("[ERROR] sircodebs.py failed")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        raise HTTPException(status_code=500, detail=f"sircodebs.py failed: {e}\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}")
-
-    # 3. Run csv_json.py to generate clean_financial_data_bs.json
-    try:
-        print("[DEBUG] Running csv_json_bs.py...")
-        result2 = subprocess.run(
-            ["python", "pnlbs/csv_json_bs.py"],
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-            cwd="C:/SAHIL/NOTES"
-        )
-        print("[DEBUG] csv_json_bs.py STDOUT:\n", result2.stdout)
-        print("[DEBUG] csv_json_bs.py STDERR:\n", result2.stderr)
-        print(f"[DEBUG] clean_financial_data_bs.json exists: {os.path.exists('clean_financial_data_bs.json')}")
-    except subprocess.CalledProcessError as e:
-        print("[ERROR] csv_json_bs.py failed")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        raise HTTPException(status_code=500, detail=f"csv_json_bs.py failed: {e}\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}")
-
-    # 4. Run bl_llm.py to generate the balance sheet Excel
-    try:
-        print("[DEBUG] Running bl_llm.py...")
-        result3 = subprocess.run(
-            ["python", "pnlbs/bl_llm.py"],
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-            cwd="C:/SAHIL/NOTES"
-        )
-        print("[DEBUG] bl_llm.py STDOUT:\n", result3.stdout)
-        print("[DEBUG] bl_llm.py STDERR:\n", result3.stderr)
-        # Try to extract the output file path from the script output
-        output_file = None
-        for line in result3.stdout.splitlines():
-            if "Output file:" in line:
-                output_file = line.split("Output file:")[-1].strip()
-                break
-        if not output_file or not os.path.exists(output_file):
-            debug_msg = f"\nSTDOUT:\n{result3.stdout}\nSTDERR:\n{result3.stderr}"
-            print("[ERROR] Could not determine output file from bl_llm.py output.", debug_msg)
-            raise Exception(f"Could not determine output file from bl_llm.py output.{debug_msg}")
-    except subprocess.CalledProcessError as e:
-        print("[ERROR] bl_llm.py failed")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        raise HTTPException(
-            status_code=500,
-            detail=f"bl_llm.py failed: {e}\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}"
-        )
+    if not os.getenv("OPENROUTER_API_KEY"):
+        raise HTTPException(status_code=500, detail="Missing OPENROUTER_API_KEY environment variable")
 
-    print(f"[DEBUG] Pipeline completed. Output file: {output_file}")
-    return {"message": "Balance Sheet generated successfully.", "file": output_file}
+    workspace = JobWorkspace()
+    input_excel_path = await run_io(workspace.save_upload, file)
+    try:
+        output_file = await run_cpu(build_balance_sheet_from_notes, input_excel_path, workspace.path("balancesheet_excel"))
+    except Exception as e:
+        print(f"❌ Balance sheet pipeline failed: {e}")
+        raise HTTPException(status_code=500, detail=f"Balance sheet pipeline failed: {e}")
+    if not output_file or not os.path.exists(output_file):
+        raise HTTPException(status_code=500, detail="No balance sheet items could be extracted from the uploaded file.")
 
+    print(f"✅ Pipeline completed. Output file: {output_file}")
+    return {"message": "Balance Sheet generated successfully.", "file": output_file, "job_id": workspace.job_id}
 
 
 @router.post("/pnl_from_notes")
-async def bs_from_notes(file: UploadFile = File(...)):
+async def pnl_from_notes(file: UploadFile = File(...)):
     """
-    Accepts an Excel file, runs the full pipeline (sircodebs.py -> csv_json.py -> bl_llm.py),
-    and returns the path to the generated balance sheet Excel file.
+    Accepts an Excel file, runs the full pipeline (sircodepnl -> csv_json_pnl -> pnl_note)
+    in-process, and returns the path to the generated P&L Excel file.
     """
-    import os
-
-    # 1. Save uploaded Excel file
-    os.makedirs("input", exist_ok=True)
-    input_excel_path = os.path.join("input", file.filename)
-    with open(input_excel_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    print(f"[DEBUG] Uploaded Excel saved to: {input_excel_path}")
-    print(f"[DEBUG] Files in input/: {os.listdir('input')}")
-
-    # Prepare environment for subprocesses
-    env = os.environ.copy()
-    if os.getenv("OPENROUTER_API_KEY"):
-        env["OPENROUTER_API_KEY"] = os.getenv("OPENROUTER_API_KEY")
-    env["INPUT_FILE"] = "clean_financial_data_pnl.json"
-
-    # 2. Run sircodepnl.py with the uploaded Excel file
+    workspace = JobWorkspace()
+    input_excel_path = await run_io(workspace.save_upload, file)
     try:
-        print("[DEBUG] Running sircodepnl.py...")
-        result1 = subprocess.run(
-            ["python", "pnlbs/sircodepnl.py", input_excel_path],
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-            cwd="C:/SAHIL/NOTES"
-        )
-        print("[DEBUG] sircodepnl.py STDOUT:\n", result1.stdout)
-        print("[DEBUG] sircodepnl.py STDERR:\n", result1.stderr)
-        print(f"[DEBUG] Files in csv_notes_pnl/: {os.listdir('csv_notes_pnl') if os.path.exists('csv_notes_pnl') else 'csv_notes_pnl does not exist'}")
-    except subprocess.CalledProcessError as e:
-        print("[ERROR] sircodepnl.py failed")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        raise HTTPException(status_code=500, detail=f"sircodepnl.py failed: {e}\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}")
-
-    # 3. Run csv_json.py to generate clean_financial_data_pnl.json
-    try:
-        print("[DEBUG] Running csv_json_pnl.py...")
-        result2 = subprocess.run(
-            ["python", "pnlbs/csv_json_pnl.py"],
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-            cwd="C:/SAHIL/NOTES"
-        )
-        print("[DEBUG] csv_json_pnl.py STDOUT:\n", result2.stdout)
-        print("[DEBUG] csv_json_pnl.py STDERR:\n", result2.stderr)
-        print(f"[DEBUG] clean_financial_data_pnl.json exists: {os.path.exists('clean_financial_data_pnl.json')}")
-    except subprocess.CalledProcessError as e:
-        print("[ERROR] csv_json_pnl.py failed")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        raise HTTPException(status_code=500, detail=f"csv_json_pnl.py failed: {e}\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}")
-
-    # 4. Run pnl_note.py to generate the balance sheet Excel
-    try:
-        print("[DEBUG] Running pnl_note.py...")
-        result3 = subprocess.run(
-            ["python", "pnlbs/pnl_note.py"],
-            capture_output=True,
-            text=True,
-            check=True,
-            env=env,
-            cwd="C:/SAHIL/NOTES"
-        )
-        print("[DEBUG] pnl_note.py STDOUT:\n", result3.stdout)
-        print("[DEBUG] pnl_note.py STDERR:\n", result3.stderr)
-        # Try to extract the output file path from the script output
-        output_file = None
-        for line in result3.stdout.splitlines():
-            if "Output file:" in line:
-                output_file = line.split("Output file:")[-1].strip()
-                break
-        if not output_file or not os.path.exists(output_file):
-            debug_msg = f"\nSTDOUT:\n{result3.stdout}\nSTDERR:\n{result3.stderr}"
-            print("[ERROR] Could not determine output file from pnl_note.py output.", debug_msg)
-            raise Exception(f"Could not determine output file from pnl_note.py output.{debug_msg}")
-    except subprocess.CalledProcessError as e:
-        print("[ERROR] pnl_note.py failed")
-        print("STDOUT:", e.stdout)
-        print("STDERR:", e.stderr)
-        raise HTTPException(
-            status_code=500,
-            detail=f"pnl_note.py failed: {e}\nSTDOUT:\n{e.stdout}\nSTDERR:\n{e.stderr}"
-        )
+        output_file = await run_cpu(build_pnl_from_notes, input_excel_path, workspace.path("pnl_excel", "pnl_statement.xlsx"))
+    except Exception as e:
+        print(f"❌ P&L pipeline failed: {e}")
+        raise HTTPException(status_code=500, detail=f"P&L pipeline failed: {e}")
+    if not output_file or not os.path.exists(output_file):
+        raise HTTPException(status_code=500, detail="Failed to generate P&L statement from the uploaded file.")
+
+    print(f"✅ Pipeline completed. Output file: {output_file}")
+    return {"message": "Profit and Loss statement generated successfully.", "file": output_file, "job_id": workspace.job_id}
+
+
+@router.post("/batch")
+async def run_batch(files: List[UploadFile] = File(...)):
+    """
+    Runs the /hardcoded pipeline (extract -> main16_23 notes -> Excel) for many trial
+    balances at once. Accepts several workbooks and/or zips of workbooks, processes them
+    in parallel on the CPU pool and returns a zip with one folder per entity plus
+    summary.json (per-file timings and mapping success rate).
+    """
+    workspace = JobWorkspace()
+    inputs = []
+    for index, file in enumerate(files):
+        # One folder per upload so same-named files from different entities don't collide
+        folder = os.path.join("input", str(index))
+        path = await run_io(workspace.save_upload, file, folder)
+        if path.lower().endswith(".zip"):
+            try:
+                inputs.extend(await run_io(expand_zip, path, workspace.path(folder, "zip")))
+            except (ValueError, zipfile.BadZipFile) as e:
+                raise HTTPException(status_code=400, detail=f"{file.filename}: {e}")
+        elif path.lower().endswith(BATCH_EXTENSIONS):
+            inputs.append(path)
+    if not inputs:
+        raise HTTPException(status_code=400, detail="No .xlsx/.xls trial balances found in the upload.")
+    if len(inputs) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {BATCH_MAX_FILES} workbooks")
+
+    batch_dir = workspace.path("batch")
+    taken = set()
+    entities = [(entity_name(path, taken), path) for path in inputs]
+    started = time.perf_counter()
+    results = await asyncio.gather(
+        *(run_cpu(run_entity, path, os.path.join(batch_dir, name)) for name, path in entities)
+    )
+    for (name, _), result in zip(entities, results):
+        result["entity"] = name
+        get_classification_metrics().record(result.get("classification"))
+
+    records = sum(r.get("records", 0) for r in results)
+    mapped = sum(r.get("mapped", 0) for r in results)
+    summary = {
+        "job_id": workspace.job_id,
+        "files": len(results),
+        "completed": sum(1 for r in results if r["status"] == "completed"),
+        "failed": sum(1 for r in results if r["status"] != "completed"),
+        "wall_time_ms": round((time.perf_counter() - started) * 1000, 1),
+        "records": records,
+        "mapping_success_rate": round(mapped / records * 100, 2) if records else 0,
+        "results": results,
+    }
+    data = await run_io(build_archive, batch_dir, results, summary)
+    headers = {"Content-Disposition": f'attachment; filename="batch_{workspace.job_id}.zip"', "X-Job-Id": workspace.job_id}
+    # Everything the batch produced is in the archive
+    return StreamingResponse(io.BytesIO(data), media_type="application/zip", headers=headers,
+                             background=cleanup_task(workspace))
+
+
+@router.get("/metrics/cache")
+async def get_cache_metrics():
+    """Size, bounds and hit/miss counters of the result cache."""
+    return await run_io(get_result_cache().stats)
+
+
+@router.get("/metrics/mappings")
+async def get_mapping_metrics():
+    """
+    Active account mapping version (hash of the mapping/rule files), table sizes,
+    the classification cache counters of this API process and of the CPU workers
+    (as of their last extraction report) and the LLM fallback counters.
+    """
+    info = (await run_io(current_mappings)).info()
+    info["classification_cache"] = get_classification_metrics().cache_snapshot(get_classification_cache().stats())
+    info["llm_fallback"] = get_llm_fallback().stats()
+    return info
+
+
+@router.get("/metrics/classification")
+async def get_classification_metrics_endpoint():
+    """
+    Totals over the extractions this API process ran or received from its
+    workers: records per classification tier, time per tier and phase,
+    rows/second and the most frequent unmapped account names.
+    """
+    return get_classification_metrics().snapshot()
+
 
-    print(f"[DEBUG] Pipeline completed. Output file: {output_file}")
-    return {"message": "Profit and Loss statement generated successfully.", "file": output_file}
\ No newline at end of file
+@router.get("/metrics/executors")
+async def get_executor_metrics():
+    """Pool sizes, in-flight work and queue depth of the CPU and I/O execution pools."""
+    return executor_metrics()
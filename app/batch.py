@@ -0,0 +1,115 @@
+import io
+import json
+import os
+import re
+import shutil
+import time
+import zipfile
+
+from app.extract import extract_trial_balance_data
+from app.columnar import save_parsed_trial_balance
+from app.classification_metrics import collect_extraction_stats
+from app.main16_23 import process_json
+from app.json_xlsx import json_to_xlsx
+
+BATCH_EXTENSIONS = (".xlsx", ".xls")
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", "200"))
+# Uncompressed bytes the workbooks of one zip may add up to
+BATCH_MAX_BYTES = int(os.getenv("BATCH_MAX_BYTES", str(512 * 1024 * 1024)))
+
+
+def entity_name(filename, taken):
+    """Folder-safe, unique entity name derived from an uploaded file name."""
+    stem = os.path.splitext(os.path.basename(filename))[0]
+    name = re.sub(r"[^A-Za-z0-9._ -]+", "_", stem).strip(" .") or "entity"
+    candidate, suffix = name, 2
+    while candidate.lower() in taken:
+        candidate = f"{name}_{suffix}"
+        suffix += 1
+    taken.add(candidate.lower())
+    return candidate
+
+
+def expand_zip(zip_path, target_dir, limit=BATCH_MAX_FILES, max_bytes=BATCH_MAX_BYTES):
+    """
+    Extract the trial balance workbooks of a zip into target_dir; returns the
+    saved paths. Members are streamed to disk, and their uncompressed sizes
+    may add up to max_bytes at most (zipfile never reads a member past the
+    size its header declares).
+    """
+    saved = []
+    total_bytes = 0
+    os.makedirs(target_dir, exist_ok=True)
+    with zipfile.ZipFile(zip_path) as archive:
+        for member in archive.infolist():
+            filename = os.path.basename(member.filename)
+            if member.is_dir() or member.filename.startswith("__MACOSX") or filename.startswith("."):
+                continue
+            if not filename.lower().endswith(BATCH_EXTENSIONS):
+                continue
+            if len(saved) >= limit:
+                raise ValueError(f"Batch is limited to {limit} workbooks")
+            total_bytes += member.file_size
+            if total_bytes > max_bytes:
+                raise ValueError(f"Batch workbooks are limited to {max_bytes:,} bytes uncompressed")
+            # basename() above keeps zip entries from escaping target_dir
+            path = os.path.join(target_dir, filename)
+            if os.path.exists(path):
+                base, ext = os.path.splitext(filename)
+                path = os.path.join(target_dir, f"{base}_{len(saved)}{ext}")
+            with archive.open(member) as src, open(path, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            saved.append(path)
+    return saved
+
+
+def run_entity(file_location, output_dir):
+    """
+    extract -> main16_23 notes -> workbook for one trial balance. Runs in a
+    worker process; returns the summary row for this file (never raises).
+    """
+    summary = {"file": os.path.basename(file_location), "status": "failed", "timings_ms": {}}
+    timings = summary["timings_ms"]
+    started = time.perf_counter()
+    try:
+        os.makedirs(output_dir, exist_ok=True)
+        stage = time.perf_counter()
+        with collect_extraction_stats() as stats:
+            records = extract_trial_balance_data(file_location)
+        summary["classification"] = stats.report()
+        parsed_tb = os.path.join(output_dir, "parsed_trial_balance.tbc")
+        save_parsed_trial_balance(records, parsed_tb)
+        timings["extract"] = round((time.perf_counter() - stage) * 1000, 1)
+
+        mapped = sum(1 for r in records if r["mapped_by"] != "Unmapped")
+        summary["records"] = len(records)
+        summary["mapped"] = mapped
+        summary["mapping_success_rate"] = round(mapped / len(records) * 100, 2) if records else 0
+
+        stage = time.perf_counter()
+        notes_json = process_json(parsed_tb, os.path.join(output_dir, "notes_output.json"))
+        timings["notes"] = round((time.perf_counter() - stage) * 1000, 1)
+
+        stage = time.perf_counter()
+        if not json_to_xlsx(notes_json, os.path.join(output_dir, "final_output.xlsx")):
+            raise RuntimeError("workbook could not be written")
+        timings["xlsx"] = round((time.perf_counter() - stage) * 1000, 1)
+        summary["status"] = "completed"
+    except Exception as e:
+        summary["error"] = str(e)
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return summary
+
+
+def build_archive(batch_dir, results, summary):
+    """Zip every entity's output folder plus summary.json; returns the archive bytes."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for result in results:
+            entity_dir = os.path.join(batch_dir, result["entity"])
+            if not os.path.isdir(entity_dir):
+                continue
+            for filename in sorted(os.listdir(entity_dir)):
+                archive.write(os.path.join(entity_dir, filename), f"{result['entity']}/{filename}")
+        archive.writestr("summary.json", json.dumps(summary, ensure_ascii=False, indent=2))
+    return buffer.getvalue()
@@ -122,8 +122,13 @@ def format_currency(value):
         return f"{value:,.2f}"
     return "0.00"
 
-def generate_balance_sheet_report():
-    """Generate Balance Sheet report in Excel format using data from generated_notes folder."""
+def generate_balance_sheet_report(notes_folder=None, output_file=None):
+    """
+    Generate Balance Sheet report in Excel format using data from generated_notes folder.
+    notes_folder/output_file let a job workspace point at its own notes and report path;
+    output_file may also be a file-like object (e.g. io.BytesIO) to keep the workbook in memory.
+    Returns the path (or buffer) the workbook was saved to, or None.
+    """
     wb = Workbook()
     ws = wb.active
     ws.title = "Balance Sheet"
@@ -165,7 +170,7 @@ def generate_balance_sheet_report():
     # Load all required notes (2-15 for Balance Sheet)
     notes_data = {}
     for note_num in range(2, 16):  # Notes 2-15
-        notes_data[str(note_num)] = load_note_data(str(note_num))
+        notes_data[str(note_num)] = load_note_data(str(note_num), notes_folder)
 
     # Extract values from notes
     # Equity and Liabilities
@@ -324,23 +329,26 @@ def generate_balance_sheet_report():
 
     # Save Excel file with error handling
     
+    if output_file is None:
+        output_file = os.path.join("balancesheet_excel", "balancesheet_report.xlsx")
     try:
-        output_folder = "balancesheet_excel"
-        os.makedirs(output_folder, exist_ok=True)
-        output_file = os.path.join(output_folder, "balancesheet_report.xlsx")
+        if isinstance(output_file, str):
+            os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
         wb.save(output_file)
         print(f"Balance Sheet report generated successfully and saved to {output_file}")
-        
+        return output_file
     except PermissionError:
         print(f"PermissionError: Unable to save to {output_file}. Trying alternative location...")
         fallback_file = os.path.join(os.path.expanduser("~"), "Desktop", "balance_sheet_report_fallback.xlsx")
         try:
             wb.save(fallback_file)
             print(f"Balance Sheet report saved to alternative location: {fallback_file}")
+            return fallback_file
         except Exception as e:
             print(f"Failed to save Balance Sheet report: {str(e)}")
     except Exception as e:
         print(f"Error saving Balance Sheet report: {str(e)}")
+    return None
 
 if __name__ == "__main__":
     generate_balance_sheet_report()
\ No newline at end of file
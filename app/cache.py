@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+
+from app.mapping_registry import current_mappings
+from app.ml_fallback import ML_FALLBACK, ML_FALLBACK_MIN_CONFIDENCE, ML_FALLBACK_NEIGHBOURS
+from app.llm_fallback import LLM_FALLBACK, LLM_FALLBACK_MODEL
+from app.workspace import JOBS_ROOT
+import app.notes as notes
+from app.note_specs import get_note_plan
+
+RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE", "1") != "0"
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR", os.path.join(JOBS_ROOT, "cache"))
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "512"))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+
+# Bump when a pipeline stage changes its output so old entries stop matching
+CACHE_VERSION = "2"
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+_fingerprint = None
+_fingerprint_version = None
+_fingerprint_lock = threading.Lock()
+
+
+def config_fingerprint():
+    """
+    Hash of everything besides the upload that changes pipeline output: the
+    active account mapping version (mapping/rule files, smart rules and ML
+    fallback training data), the ML/LLM fallback settings, the note spec file
+    and the app.notes keyword table. Recomputed only when the mapping version
+    or the note specs change.
+    """
+    global _fingerprint, _fingerprint_version
+    version = (current_mappings().version, get_note_plan().spec_hash)
+    with _fingerprint_lock:
+        if _fingerprint is not None and version == _fingerprint_version:
+            return _fingerprint
+        h = hashlib.sha256(f"v{CACHE_VERSION}:{version[0]}:specs:{version[1]}".encode())
+        h.update(f"ml:{ML_FALLBACK}:{ML_FALLBACK_MIN_CONFIDENCE}:{ML_FALLBACK_NEIGHBOURS}".encode())
+        h.update(f"llm:{LLM_FALLBACK}:{LLM_FALLBACK_MODEL}".encode())
+        h.update(json.dumps(notes.NOTE_MAPPINGS, sort_keys=True).encode())
+        _fingerprint, _fingerprint_version = h.hexdigest(), version
+        return _fingerprint
+
+
+class ResultCache:
+    """
+    Content-addressed cache of pipeline artifacts on disk. An entry is a
+    directory named after sha256(upload bytes + config fingerprint) holding
+    named artifacts (parsed trial balance, notes JSON, workbooks). Entries are
+    evicted least-recently-used first once the size or entry bound is exceeded.
+    """
+
+    def __init__(self, root=RESULT_CACHE_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024,
+                 max_entries=RESULT_CACHE_MAX_ENTRIES, enabled=RESULT_CACHE_ENABLED):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+
+    def key_for_file(self, path):
+        """Cache key of an uploaded file, or None when caching is disabled."""
+        if not self.enabled:
+            return None
+        return hashlib.sha256(f"{file_sha256(path)}:{config_fingerprint()}".encode()).hexdigest()
+
+    def _entry(self, key):
+        return os.path.join(self.root, key)
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key, name):
+        """Path of a cached artifact, or None. A hit marks the entry as recently used."""
+        if not key:
+            return None
+        path = os.path.join(self._entry(key), name)
+        if not os.path.isfile(path):
+            self._count(False)
+            return None
+        try:
+            os.utime(self._entry(key))
+        except OSError:
+            pass
+        self._count(True)
+        return path
+
+    def restore(self, key, artifacts):
+        """Copy cached artifacts ({name: destination}) out; True only if all of them were cached."""
+        sources = {}
+        for name in artifacts:
+            source = self.get(key, name)
+            if source is None:
+                return False
+            sources[name] = source
+        try:
+            for name, destination in artifacts.items():
+                os.makedirs(os.path.dirname(destination) or ".", exist_ok=True)
+                shutil.copyfile(sources[name], destination)
+        except OSError:
+            # Evicted by another worker while copying
+            return False
+        return True
+
+    def get_json(self, key, name):
+        path = self.get(key, name)
+        if path is None:
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, name, source_path):
+        """Store a copy of source_path as artifact name of entry key."""
+        if not key:
+            return
+        tmp_path = self._tmp_path(key, name)
+        shutil.copyfile(source_path, tmp_path)
+        self._commit(key, name, tmp_path)
+
+    def put_bytes(self, key, name, data):
+        if not key:
+            return
+        tmp_path = self._tmp_path(key, name)
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        self._commit(key, name, tmp_path)
+
+    def put_json(self, key, name, data):
+        if not key:
+            return
+        tmp_path = self._tmp_path(key, name)
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        self._commit(key, name, tmp_path)
+
+    def _tmp_path(self, key, name):
+        os.makedirs(self._entry(key), exist_ok=True)
+        return os.path.join(self._entry(key), f".{name}.{uuid.uuid4().hex}.tmp")
+
+    def _commit(self, key, name, tmp_path):
+        # Atomic rename so readers in other workers never see a partial file
+        os.replace(tmp_path, os.path.join(self._entry(key), name))
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for key in os.listdir(self.root):
+            path = self._entry(key)
+            if not os.path.isdir(path):
+                continue
+            try:
+                size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+                entries.append((os.stat(path).st_mtime, size, path))
+            except OSError:
+                continue
+        return entries
+
+    def evict(self):
+        """Drop least-recently-used entries until both bounds hold."""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        while entries and (total > self.max_bytes or len(entries) > self.max_entries):
+            _, size, path = entries.pop(0)
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            "enabled": self.enabled,
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "config_fingerprint": config_fingerprint(),
+            "mapping_version": current_mappings().version,
+        }
+
+
+_result_cache = None
+_result_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Process-wide result cache, created on first use."""
+    global _result_cache
+    with _result_cache_lock:
+        if _result_cache is None:
+            _result_cache = ResultCache()
+        return _result_cache
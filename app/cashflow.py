@@ -97,8 +97,13 @@ def format_currency(value):
         return f"{value:,.2f}"
     return "-"
 
-def generate_cashflow_report():
-    """Generate Cash Flow Statement report in Excel format using notes and trial balance data."""
+def generate_cashflow_report(notes_folder=None, tb_folder="output1", output_file=None):
+    """
+    Generate Cash Flow Statement report in Excel format using notes and trial balance data.
+    The folder/output_file arguments let a job workspace point at its own files;
+    output_file may also be a file-like object (e.g. io.BytesIO) to keep the workbook in memory.
+    Returns the path (or buffer) the workbook was saved to, or None.
+    """
     wb = Workbook()
     ws = wb.active
     ws.title = "Cash Flow Statement"
@@ -137,13 +142,13 @@ def generate_cashflow_report():
         cell.alignment = center_align if col > 1 else left_align
 
     # Load data
-    note_4 = load_note_data("4")  # Cash Flow Statement
-    note_13 = load_note_data("13")  # Cash and Cash Equivalents
-    note_6 = load_note_data("6")  # Trade Payables
-    note_7 = load_note_data("7")  # Other Current Liabilities
-    note_8 = load_note_data("8")  # Provisions
-    note_9 = load_note_data("9")  # Fixed Assets
-    tb_data = load_trail_balance()
+    note_4 = load_note_data("4", notes_folder)  # Cash Flow Statement
+    note_13 = load_note_data("13", notes_folder)  # Cash and Cash Equivalents
+    note_6 = load_note_data("6", notes_folder)  # Trade Payables
+    note_7 = load_note_data("7", notes_folder)  # Other Current Liabilities
+    note_8 = load_note_data("8", notes_folder)  # Provisions
+    note_9 = load_note_data("9", notes_folder)  # Fixed Assets
+    tb_data = load_trail_balance(tb_folder)
     tb_2024 = tb_data.get("2024", {})
     tb_2023 = tb_data.get("2023", {})
 
@@ -324,23 +329,26 @@ def generate_cashflow_report():
     ws.cell(row=row, column=1).alignment = left_align
 
     # Save Excel file
+    if output_file is None:
+        output_file = os.path.join("cashflow_excel", "cashflow_report.xlsx")
     try:
-        output_folder = "cashflow_excel"
-        os.makedirs(output_folder, exist_ok=True)
-        output_file = os.path.join(output_folder, "cashflow_report.xlsx")
+        if isinstance(output_file, str):
+            os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
         wb.save(output_file)
         print(f"Cash Flow Statement report generated successfully and saved to {output_file}")
-        
+        return output_file
     except PermissionError:
         print(f"PermissionError: Unable to save to {output_file}. Trying alternative location...")
         fallback_file = os.path.join(os.path.expanduser("~"), "Desktop", "cash_flow_report_fallback.xlsx")
         try:
             wb.save(fallback_file)
             print(f"Cash Flow Statement report saved to alternative location: {fallback_file}")
+            return fallback_file
         except Exception as e:
             print(f"Failed to save Cash Flow Statement report: {str(e)}")
     except Exception as e:
         print(f"Error saving Cash Flow Statement report: {str(e)}")
+    return None
 
 if __name__ == "__main__":
     generate_cashflow_report()
\ No newline at end of file
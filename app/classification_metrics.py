@@ -0,0 +1,247 @@
+import contextvars
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# mapped_by values in the order the tiers are tried
+TIERS = ["mapping.json", "rules.json", "smart_rules", "ml_fallback", "llm_fallback", "Unmapped"]
+# Extraction steps timed separately; the rest of the elapsed time is reading the sheet
+PHASES = ["amounts", "classify", "ml_fallback", "llm_fallback"]
+TOP_UNMAPPED = int(os.getenv("TOP_UNMAPPED", "20"))
+# Distinct unmapped names the process-wide metrics keep counting
+UNMAPPED_TRACKED = 5000
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+class ExtractionStats:
+    """
+    Counters and timings of one extraction, filled in by the code it runs
+    through while collect_extraction_stats() is active: rows seen, time per
+    phase, rule classification time by the tier that placed each distinct name
+    (a name that ends up Unmapped paid for every tier), records per final
+    tier and group, and the unmapped names.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.rows = 0
+        self.phase_seconds = Counter()
+        self.tier_seconds = Counter()
+        self.tier_names = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # stats() of the process's ClassificationCache after its last lookup
+        self.cache_state = None
+        self.tier_records = Counter()
+        self.groups = {}
+        self.unmapped = Counter()
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_seconds[name] += time.perf_counter() - started
+
+    def add_tier(self, tier, seconds):
+        self.tier_seconds[tier] += seconds
+        self.tier_names[tier] += 1
+
+    def observe(self, records):
+        """Count finished records (called once per batch of extract_records())."""
+        for record in records:
+            mapped_by = record["mapped_by"]
+            self.tier_records[mapped_by] += 1
+            if mapped_by == "Unmapped":
+                self.unmapped[record["account_name"]] += 1
+                continue
+            group = self.groups.setdefault(record["group"], {"count": 0, "total_amount": 0.0})
+            group["count"] += 1
+            group["total_amount"] += abs(record["amount"])
+
+    def report(self, top=TOP_UNMAPPED):
+        """Plain dict (JSON- and pickle-friendly) of everything collected so far."""
+        elapsed = time.perf_counter() - self.started
+        records = sum(self.tier_records.values())
+        mapped = records - self.tier_records["Unmapped"]
+        tiers = [tier for tier in TIERS if tier in self.tier_records or tier in self.tier_names]
+        tiers += sorted(set(self.tier_records) - set(tiers))
+        phases = {phase: _ms(self.phase_seconds[phase]) for phase in PHASES}
+        phases["read"] = _ms(max(0.0, elapsed - sum(self.phase_seconds.values())))
+        return {
+            "rows": self.rows,
+            "records": records,
+            "mapped": mapped,
+            "mapping_success_rate": round(mapped / records * 100, 2) if records else 0,
+            "elapsed_ms": _ms(elapsed),
+            "rows_per_second": round(self.rows / elapsed, 1) if elapsed > 0 else None,
+            "phases_ms": phases,
+            "tiers": {
+                tier: {
+                    "records": self.tier_records[tier],
+                    "names_classified": self.tier_names[tier],
+                    # The fallback tiers run in batches: their time is their phase's
+                    "ms": _ms(self.tier_seconds[tier] + (self.phase_seconds[tier] if tier in PHASES else 0)),
+                }
+                for tier in tiers
+            },
+            "classification_cache_hits": self.cache_hits,
+            "classification_cache_misses": self.cache_misses,
+            "classification_cache": self.cache_state,
+            "groups": {
+                group: {"count": values["count"], "total_amount": round(values["total_amount"], 2)}
+                for group, values in sorted(self.groups.items(), key=lambda item: -item[1]["count"])
+            },
+            "top_unmapped": [
+                {"account_name": name, "count": count} for name, count in self.unmapped.most_common(top)
+            ],
+        }
+
+
+_current = contextvars.ContextVar("extraction_stats", default=None)
+
+
+def current_stats():
+    """The ExtractionStats being collected in this context, or None."""
+    return _current.get()
+
+
+@contextmanager
+def collect_extraction_stats():
+    """
+    Collect an ExtractionStats for the extraction run inside the block. Nested
+    blocks keep filling the outer one.
+    """
+    stats = _current.get()
+    if stats is not None:
+        yield stats
+        return
+    stats = ExtractionStats()
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def timed(phase):
+    """Add the block's time to phase of the stats being collected (no-op when none are)."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    with stats.phase(phase):
+        yield
+
+
+class ClassificationMetrics:
+    """
+    Totals of the extraction reports this process has seen (the API process
+    records the reports its workers send back), for /metrics/classification.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.extractions = 0
+        self.rows = 0
+        self.records = 0
+        self.elapsed_ms = 0.0
+        self.phases_ms = Counter()
+        self.tier_records = Counter()
+        self.tier_names = Counter()
+        self.tier_ms = Counter()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        # pid -> latest ClassificationCache stats() a worker sent with a report
+        self.worker_caches = {}
+        self.unmapped = Counter()
+
+    def record(self, report):
+        if not report:
+            return
+        with self._lock:
+            self.extractions += 1
+            self.rows += report["rows"]
+            self.records += report["records"]
+            self.elapsed_ms += report["elapsed_ms"]
+            self.phases_ms.update(report["phases_ms"])
+            for tier, values in report["tiers"].items():
+                self.tier_records[tier] += values["records"]
+                self.tier_names[tier] += values["names_classified"]
+                self.tier_ms[tier] += values["ms"]
+            self.cache_hits += report["classification_cache_hits"]
+            self.cache_misses += report.get("classification_cache_misses", 0)
+            cache_state = report.get("classification_cache")
+            if cache_state:
+                self.worker_caches[cache_state["pid"]] = cache_state
+            for entry in report["top_unmapped"]:
+                self.unmapped[entry["account_name"]] += entry["count"]
+            if len(self.unmapped) > UNMAPPED_TRACKED:
+                self.unmapped = Counter(dict(self.unmapped.most_common(UNMAPPED_TRACKED)))
+
+    def snapshot(self, top=TOP_UNMAPPED):
+        with self._lock:
+            mapped = self.records - self.tier_records["Unmapped"]
+            return {
+                "pid": os.getpid(),
+                "extractions": self.extractions,
+                "rows": self.rows,
+                "records": self.records,
+                "mapping_success_rate": round(mapped / self.records * 100, 2) if self.records else None,
+                "elapsed_ms": round(self.elapsed_ms, 2),
+                "rows_per_second": round(self.rows / self.elapsed_ms * 1000, 1) if self.elapsed_ms else None,
+                "phases_ms": {phase: round(ms, 2) for phase, ms in self.phases_ms.items()},
+                "tiers": {
+                    tier: {
+                        "records": self.tier_records[tier],
+                        "names_classified": self.tier_names[tier],
+                        "ms": round(self.tier_ms[tier], 2),
+                        "ms_per_name": round(self.tier_ms[tier] / self.tier_names[tier], 4)
+                        if self.tier_names[tier] else None,
+                    }
+                    for tier in TIERS if tier in self.tier_records or tier in self.tier_names
+                },
+                "classification_cache_hits": self.cache_hits,
+                "classification_cache_misses": self.cache_misses,
+                "top_unmapped": [
+                    {"account_name": name, "count": count} for name, count in self.unmapped.most_common(top)
+                ],
+            }
+
+    def cache_snapshot(self, local):
+        """
+        Classification cache stats over the processes that classify: local
+        (this process's stats()) and the latest state each worker reported,
+        with hits and misses summed across them.
+        """
+        with self._lock:
+            processes = {**self.worker_caches, local["pid"]: local}
+        hits = sum(state["hits"] for state in processes.values())
+        misses = sum(state["misses"] for state in processes.values())
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 4) if hits + misses else None,
+            "entries": sum(state["entries"] for state in processes.values()),
+            "processes": sorted(processes.values(), key=lambda state: state["pid"]),
+        }
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def get_classification_metrics():
+    """Process-wide classification metrics, created on first use."""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = ClassificationMetrics()
+        return _metrics
@@ -0,0 +1,280 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from app.classification_metrics import current_stats
+from app.extract import get_smart_rules
+
+UNMAPPED = ('Unmapped', 'Unmapped')
+
+
+def _classify_distinct(classifier, names):
+    """
+    {name: classifier.classify(name)} for distinct names. While extraction
+    stats are collected, each name's time is added to the tier that placed it.
+    """
+    stats = current_stats()
+    if stats is None:
+        return {name: classifier.classify(name) for name in names}
+    results = {}
+    clock = time.perf_counter
+    for name in names:
+        started = clock()
+        result = results[name] = classifier.classify(name)
+        stats.add_tier(result[1], clock() - started)
+    return results
+
+
+class CompiledClassifier:
+    """
+    classify_account() compiled once for a set of mappings and rules. Gives the
+    same answer for every name, tier by tier:
+
+    1. exact key of the mapping file
+    2. first mapping key equal to the name ignoring case   (lowercase hash index)
+    3. first keyword rule matching a whitespace token      (token -> rule rank index)
+    4. first smart-rule pattern found in the name          (one combined regex)
+    """
+
+    def __init__(self, exact_mappings=None, keyword_rules=None, smart_rules=None):
+        self.exact_mappings = dict(exact_mappings or {})
+        self.keyword_rules = dict(keyword_rules or {})
+        self.smart_rules = dict(get_smart_rules() if smart_rules is None else smart_rules)
+
+        self._lower_index = {}
+        for mapped_name, group in self.exact_mappings.items():
+            self._lower_index.setdefault(mapped_name.lower(), group)
+
+        # Lowest (group, keyword) position wins, as in the nested loop
+        self._token_index = {}
+        rank = 0
+        for group, keywords in self.keyword_rules.items():
+            for keyword in keywords:
+                self._token_index.setdefault(keyword.lower(), (rank, group))
+                rank += 1
+
+        self._smart_groups = []
+        self._smart_patterns = []
+        for group, patterns in self.smart_rules.items():
+            for pattern in patterns:
+                self._smart_groups.append(group)
+                self._smart_patterns.append(pattern)
+        self._smart_regex = self._compile_smart_rules(self._smart_patterns)
+        self._smart_compiled = [re.compile(pattern) for pattern in self._smart_patterns]
+
+    @staticmethod
+    def _compile_smart_rules(patterns):
+        """
+        One regex with an optional lookahead per pattern: a single match call
+        records every pattern found anywhere in the name, and the lowest
+        numbered group that took part is the first rule in priority order.
+        Patterns that cannot be embedded (back references, inline flags) keep
+        the per-pattern loop.
+        """
+        if not patterns:
+            return None
+        for pattern in patterns:
+            if re.search(r'\\\d|\(\?P=|\(\?[aiLmsux]+\)', pattern):
+                return None
+        combined = ''.join(f'(?=(?s:.*?)(?P<r{i}>{pattern}))?' for i, pattern in enumerate(patterns))
+        try:
+            return re.compile(combined)
+        except re.error:
+            return None
+
+    def _smart_rule(self, name_clean):
+        if self._smart_regex is not None:
+            found = self._smart_regex.match(name_clean)
+            for i, group in enumerate(self._smart_groups):
+                if found.group(f'r{i}') is not None:
+                    return group
+            return None
+        for group, compiled in zip(self._smart_groups, self._smart_compiled):
+            if compiled.search(name_clean):
+                return group
+        return None
+
+    def classify(self, account_name):
+        """(group, mapped_by) for one account name."""
+        if account_name in self.exact_mappings:
+            return self.exact_mappings[account_name], "mapping.json"
+        name_clean = account_name.strip().lower()
+        if name_clean in self._lower_index:
+            return self._lower_index[name_clean], "mapping.json"
+        if self._token_index:
+            hits = [self._token_index[token] for token in set(name_clean.split()) if token in self._token_index]
+            if hits:
+                return min(hits)[1], "rules.json"
+        group = self._smart_rule(name_clean)
+        if group is not None:
+            return group, "smart_rules"
+        return UNMAPPED
+
+    def classify_many(self, account_names):
+        """Classify a whole column; each distinct name is classified once."""
+        distinct = _classify_distinct(self, dict.fromkeys(account_names))
+        return [distinct[name] for name in account_names]
+
+
+
+CLASSIFY_CACHE_SIZE = int(os.getenv("CLASSIFY_CACHE_SIZE", "50000"))
+# Optional JSON file the cache is persisted to (and warmed from) across restarts
+CLASSIFY_CACHE_FILE = os.getenv("CLASSIFY_CACHE_FILE", "")
+CLASSIFY_CACHE_SAVE_INTERVAL = float(os.getenv("CLASSIFY_CACHE_SAVE_INTERVAL", "60"))
+
+
+class ClassificationCache:
+    """
+    Bounded LRU of account name -> (group, mapped_by), shared by every request
+    in the process. Entries belong to one mapping version; the cache empties
+    itself when a different version asks. Keys are the stripped account names
+    extraction passes in (not lowercased: the first tier is case-sensitive).
+    Hits and misses count distinct names per classify_many() call, per process;
+    extraction reports carry a worker's counts back to the API process.
+    Saving merges with the file, as every worker process saves its own cache.
+    """
+
+    def __init__(self, max_size=CLASSIFY_CACHE_SIZE, path=CLASSIFY_CACHE_FILE,
+                 save_interval=CLASSIFY_CACHE_SAVE_INTERVAL):
+        self.max_size = max_size
+        self.path = path
+        self.save_interval = save_interval
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._dirty = False
+        self._saved_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _use_version(self, version):
+        if version == self.version:
+            return
+        if self.version is not None:
+            self.invalidations += 1
+        self.version = version
+        self._entries.clear()
+        self._dirty = False
+        self._load()
+
+    def _read_file(self):
+        """Entries of CLASSIFY_CACHE_FILE for the current version (oldest first)."""
+        if not self.path or not os.path.isfile(self.path):
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring classification cache file {self.path}: {e}")
+            return []
+        if data.get("version") != self.version:
+            return []
+        return data.get("entries", [])[-self.max_size:]
+
+    def _load(self):
+        for name, group, mapped_by in self._read_file():
+            self._entries[name] = (group, mapped_by)
+
+    def save(self):
+        """Write the entries to CLASSIFY_CACHE_FILE (no-op when persistence is off)."""
+        with self._lock:
+            self._save()
+
+    def _save(self):
+        if not self.path or not self._dirty or self.version is None:
+            return
+        # Every worker process saves its own cache: keep what the others wrote
+        merged = OrderedDict((name, (group, mapped_by)) for name, group, mapped_by in self._read_file())
+        for name, result in self._entries.items():
+            merged.pop(name, None)
+            merged[name] = result
+        while len(merged) > self.max_size:
+            merged.popitem(last=False)
+        data = {
+            "version": self.version,
+            "entries": [[name, group, mapped_by] for name, (group, mapped_by) in merged.items()],
+        }
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            print(f"⚠️ Could not save classification cache: {e}")
+            return
+        self._dirty = False
+        self._saved_at = time.monotonic()
+
+    def classify_many(self, version, classifier, account_names):
+        """classifier.classify() for each name, answered from the cache where possible."""
+        distinct = list(dict.fromkeys(account_names))
+        with self._lock:
+            self._use_version(version)
+            found = {}
+            for name in distinct:
+                result = self._entries.get(name)
+                if result is not None:
+                    self._entries.move_to_end(name)
+                    found[name] = result
+            missing = [name for name in distinct if name not in found]
+            self.hits += len(found)
+            self.misses += len(missing)
+        stats = current_stats()
+        if stats is not None:
+            stats.cache_hits += len(found)
+            stats.cache_misses += len(missing)
+
+        # Classify outside the lock so other requests are not held up
+        computed = _classify_distinct(classifier, missing)
+        if computed:
+            with self._lock:
+                if self.version == version:
+                    self._entries.update(computed)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                    self._dirty = True
+                    if time.monotonic() - self._saved_at >= self.save_interval:
+                        self._save()
+            found.update(computed)
+        if stats is not None:
+            # Sent back with the extraction report, so the API process can show worker caches
+            stats.cache_state = self.stats()
+        return [found[name] for name in account_names]
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "pid": os.getpid(),
+                "version": self.version,
+                "entries": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+                "invalidations": self.invalidations,
+                "persisted_to": self.path or None,
+            }
+
+
+_classification_cache = None
+_classification_cache_lock = threading.Lock()
+
+
+def get_classification_cache():
+    """Process-wide classification cache, created on first use."""
+    global _classification_cache
+    with _classification_cache_lock:
+        if _classification_cache is None:
+            _classification_cache = ClassificationCache()
+        return _classification_cache
+
+
+def save_classification_cache():
+    """Persist the process-wide classification cache (if CLASSIFY_CACHE_FILE is set)."""
+    get_classification_cache().save()
@@ -0,0 +1,271 @@
+import json
+import os
+import struct
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# Single-file columnar store for the parsed trial balance:
+#   magic | header length (uint64 LE) | JSON header | column buffers (64-byte aligned)
+# Text columns are stored as int32 category codes (-1 = missing) with the
+# categories in the header; amounts as float64 (int64 when every value is an int).
+# Each buffer can be memory-mapped straight from the file.
+MAGIC = b"TBCOL01\n"
+ALIGNMENT = 64
+COLUMNAR_EXTENSION = ".tbc"
+# Also write the classic parsed_trial_balance.json next to the columnar file
+EXPORT_PARSED_JSON = os.getenv("EXPORT_PARSED_JSON", "0") == "1"
+
+RECORD_COLUMNS = ["account_name", "group", "amount", "mapped_by", "source_file"]
+
+
+def is_columnar(path):
+    return str(path).lower().endswith(COLUMNAR_EXTENSION)
+
+
+def json_export_path(path):
+    """parsed_trial_balance.json for parsed_trial_balance.tbc."""
+    return os.path.splitext(path)[0] + ".json"
+
+
+def resolve_parsed_trial_balance(path):
+    """
+    path if it exists, else its .tbc / .json sibling (workspaces written
+    before the columnar format only have the JSON file).
+    """
+    if os.path.exists(path):
+        return path
+    stem = os.path.splitext(path)[0]
+    for candidate in (stem + COLUMNAR_EXTENSION, stem + ".json"):
+        if os.path.exists(candidate):
+            return candidate
+    return path
+
+
+class _Column:
+    """Accumulates one column of records: category codes, or numbers while every value is one."""
+
+    def __init__(self, name):
+        self.name = name
+        self.numbers = array("d")
+        self.all_ints = True
+        self.codes = None
+        self.categories = {}
+
+    def _to_categorical(self):
+        self.codes = array("i")
+        for value in self.numbers:
+            self.codes.append(self._code(int(value) if self.all_ints else value))
+        self.numbers = None
+
+    def _code(self, value):
+        if value is None:
+            return -1
+        # (type, value): 1, 1.0 and True are different categories
+        key = (type(value), value)
+        code = self.categories.get(key)
+        if code is None:
+            code = self.categories[key] = len(self.categories)
+        return code
+
+    def append(self, value):
+        if self.codes is None:
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self.all_ints = self.all_ints and isinstance(value, int)
+                self.numbers.append(value)
+                return
+            self._to_categorical()
+        self.codes.append(self._code(value))
+
+    def buffer(self):
+        """(dtype, bytes, header entry) of the finished column."""
+        if self.codes is None:
+            values = np.frombuffer(self.numbers, dtype=np.float64)
+            if self.all_ints and len(values) and np.all(np.abs(values) < 2 ** 53):
+                dtype = np.dtype("<i8")
+                values = values.astype(dtype)
+            else:
+                dtype = np.dtype("<f8")
+            return dtype, values.astype(dtype, copy=False).tobytes(), {"kind": "number"}
+        dtype = np.dtype("<i4")
+        categories = [value for _, value in self.categories]
+        return dtype, np.frombuffer(self.codes, dtype=np.int32).astype(dtype).tobytes(), {
+            "kind": "category", "categories": categories,
+        }
+
+
+def write_records_columnar(records, output_file, columns=None):
+    """
+    Sink step: write an iterable of record dicts to output_file in the columnar
+    format, keeping only compact per-column arrays in memory. Returns the
+    number of records.
+    """
+    columns = list(columns or RECORD_COLUMNS)
+    builders = {name: _Column(name) for name in columns}
+    count = 0
+    for record in records:
+        for name in record:
+            if name not in builders:
+                # An extra key: earlier records did not have it
+                builders[name] = _Column(name)
+                for _ in range(count):
+                    builders[name].append(None)
+                columns.append(name)
+        for name in columns:
+            builders[name].append(record.get(name))
+        count += 1
+
+    header = {"format": 1, "rows": count, "columns": []}
+    buffers = []
+    offset = 0
+    for name in columns:
+        dtype, data, entry = builders[name].buffer()
+        entry.update({"name": name, "dtype": dtype.str, "offset": offset, "nbytes": len(data)})
+        header["columns"].append(entry)
+        buffers.append(data)
+        offset += len(data) + (-len(data) % ALIGNMENT)
+
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = len(MAGIC) + 8 + len(header_bytes)
+    data_start += -data_start % ALIGNMENT
+    header_bytes = header_bytes.ljust(data_start - len(MAGIC) - 8, b" ")
+
+    os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_file, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for data in buffers:
+                f.write(data)
+                f.write(b"\0" * (-len(data) % ALIGNMENT))
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return count
+
+
+def read_header(path):
+    """(header dict, byte offset of the first column buffer)."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a columnar trial balance file")
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length).decode("utf-8"))
+    return header, len(MAGIC) + 8 + length
+
+
+def _read_buffers(path, mmap):
+    header, data_start = read_header(path)
+    rows = header["rows"]
+    for entry in header["columns"]:
+        dtype = np.dtype(entry["dtype"])
+        if rows == 0:
+            values = np.empty(0, dtype=dtype)
+        elif mmap:
+            values = np.memmap(path, dtype=dtype, mode="r", offset=data_start + entry["offset"], shape=(rows,))
+        else:
+            with open(path, "rb") as f:
+                f.seek(data_start + entry["offset"])
+                values = np.frombuffer(f.read(entry["nbytes"]), dtype=dtype)
+        yield entry, values
+
+
+def _decode(categories, codes):
+    """Object array of the values behind category codes (-1 -> None)."""
+    lookup = np.empty(len(categories) + 1, dtype=object)
+    lookup[:-1] = categories
+    return lookup[np.asarray(codes)]
+
+
+def read_columns(path, mmap=True, categorical=True):
+    """
+    {name: array} of a columnar file. Number columns are float64/int64 arrays;
+    category columns are pandas Categoricals over the int32 codes, or plain
+    object arrays without categorical. With mmap the number and code arrays
+    are read-only views of the file instead of copies.
+    """
+    columns = {}
+    for entry, values in _read_buffers(path, mmap):
+        if entry["kind"] == "category":
+            categories = entry["categories"]
+            if not categorical:
+                values = _decode(categories, values)
+            else:
+                if len(set(map(type, categories))) > 1:
+                    # Mixed types would be coerced by pandas; keep them as objects
+                    categories = pd.Index(categories, dtype=object)
+                values = pd.Categorical.from_codes(np.asarray(values), categories=categories)
+        columns[entry["name"]] = values
+    return columns
+
+
+def read_frame(path, mmap=True, categorical=True):
+    """The parsed trial balance as a DataFrame with typed columns."""
+    return pd.DataFrame(read_columns(path, mmap=mmap, categorical=categorical), copy=False)
+
+
+def read_records(path):
+    """The record dicts that were written, as extraction produced them."""
+    values = {}
+    for entry, column in _read_buffers(path, mmap=False):
+        if entry["kind"] == "category":
+            values[entry["name"]] = _decode(entry["categories"], column).tolist()
+        else:
+            values[entry["name"]] = column.tolist()
+    names = list(values)
+    return [dict(zip(names, row)) for row in zip(*(values[name] for name in names))]
+
+
+def load_trial_balance_frame(path, categorical=False):
+    """
+    DataFrame of a parsed trial balance in either format, with float amounts.
+    Columnar files load straight from their typed columns (text as object
+    columns unless categorical; the note generators fillna() whole frames);
+    JSON goes through clean_value() row by row.
+    """
+    from app.utils import clean_value
+
+    path = resolve_parsed_trial_balance(path)
+    if is_columnar(path):
+        tb_df = read_frame(path, categorical=categorical)
+        if "amount" in tb_df.columns:
+            tb_df["amount"] = tb_df["amount"].astype(np.float64)
+        return tb_df
+    with open(path, "r", encoding="utf-8") as f:
+        parsed_data = json.load(f)
+    if isinstance(parsed_data, list):
+        tb_df = pd.DataFrame(parsed_data)
+    else:
+        tb_df = pd.DataFrame(parsed_data.get("trial_balance", parsed_data))
+    if "amount" in tb_df.columns:
+        tb_df["amount"] = tb_df["amount"].apply(clean_value)
+    return tb_df
+
+
+def load_trial_balance_records(path):
+    """List of record dicts of a parsed trial balance in either format."""
+    path = resolve_parsed_trial_balance(path)
+    if is_columnar(path):
+        return read_records(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_parsed_trial_balance(records, output_file, export_json=None):
+    """
+    Write records to output_file (columnar for .tbc, JSON otherwise) plus the
+    JSON export when export_json (default EXPORT_PARSED_JSON). Returns the
+    number of records.
+    """
+    from app.extract import write_records_json
+
+    if not is_columnar(output_file):
+        return write_records_json(records, output_file)
+    count = write_records_columnar(records, output_file)
+    if EXPORT_PARSED_JSON if export_json is None else export_json:
+        write_records_json(read_records(output_file), json_export_path(output_file))
+    return count
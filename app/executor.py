@@ -0,0 +1,120 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# CPU_WORKERS=0 runs CPU-bound stages on the I/O thread pool instead of
+# separate processes (useful for local debugging).
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 2)))
+IO_WORKERS = int(os.getenv("IO_WORKERS", "8"))
+CPU_START_METHOD = os.getenv("CPU_START_METHOD", "spawn")
+
+
+class ExecutionPool:
+    """
+    Wraps a concurrent.futures executor so async routes can await blocking
+    work, and keeps counters for the /metrics/executors endpoint.
+    """
+
+    def __init__(self, name, kind, max_workers, initializer=None):
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.initializer = initializer
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context(CPU_START_METHOD),
+                        initializer=self.initializer,
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.name
+                    )
+            return self._executor
+
+    def _on_done(self, future):
+        with self._lock:
+            if future.cancelled() or future.exception() is not None:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def submit(self, func, *args, **kwargs):
+        executor = self._get_executor()
+        with self._lock:
+            self.submitted += 1
+        future = executor.submit(functools.partial(func, *args, **kwargs))
+        future.add_done_callback(self._on_done)
+        return future
+
+    async def run(self, func, *args, **kwargs):
+        """Run func(*args, **kwargs) on this pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(func, *args, **kwargs))
+
+    def metrics(self):
+        with self._lock:
+            in_flight = self.submitted - self.completed - self.failed
+            return {
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "in_flight": in_flight,
+                "queue_depth": max(0, in_flight - self.max_workers),
+            }
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+def init_cpu_worker():
+    """
+    Process pool initializer: save the worker's classification cache when the
+    worker exits (pool shutdown), not only every CLASSIFY_CACHE_SAVE_INTERVAL.
+    """
+    # Runs in the worker at exit; multiprocessing children skip atexit handlers
+    from multiprocessing.util import Finalize
+    from app.classifier import save_classification_cache
+    Finalize(None, save_classification_cache, exitpriority=10)
+
+
+io_pool = ExecutionPool("io", "thread", IO_WORKERS)
+cpu_pool = ExecutionPool("cpu", "process", CPU_WORKERS, initializer=init_cpu_worker) if CPU_WORKERS > 0 else io_pool
+
+
+async def run_cpu(func, *args, **kwargs):
+    """Run a CPU-bound stage (pandas/openpyxl) on the process pool."""
+    return await cpu_pool.run(func, *args, **kwargs)
+
+
+async def run_io(func, *args, **kwargs):
+    """Run blocking I/O (LLM HTTP calls, subprocesses, file copies) on the thread pool."""
+    return await io_pool.run(func, *args, **kwargs)
+
+
+def executor_metrics():
+    pools = {"io": io_pool.metrics()}
+    if cpu_pool is not io_pool:
+        pools["cpu"] = cpu_pool.metrics()
+    return pools
+
+
+def shutdown_pools():
+    io_pool.shutdown()
+    cpu_pool.shutdown()
@@ -1,11 +1,16 @@
+import numpy as np
 import pandas as pd
 import json
 import os
 import re
 import glob
+from itertools import chain, islice
 from pathlib import Path
-import requests
-from dotenv import load_dotenv
+from app.columnar import save_parsed_trial_balance
+from app.layout import LAYOUT_SCAN_ROWS, detect_layout
+from app.ml_fallback import ML_FALLBACK, classify_unmapped
+from app.llm_fallback import LLM_FALLBACK, LLMBudget, classify_with_llm
+from app.classification_metrics import current_stats, timed
 
 def load_mappings(mapping_file='mapping1.json', rules_file='rules1.json'):
     """Loads exact mappings and keyword rules from JSON files."""
@@ -71,53 +76,124 @@ def classify_account(account_name, exact_mappings, keyword_rules, smart_rules, l
             if re.search(pattern, account_name_clean):
                 return group, "smart_rules"
             
-    # LLM Fallback
-    # load_dotenv()
-    # api_key = os.getenv("OPENROUTER_API_KEY")
-    # if api_key:
-    #     try:
-    #         response = requests.post(
-    #             "https://openrouter.ai/api/v1/chat/completions",
-    #             headers={
-    #                 "Authorization": f"Bearer {api_key}",
-    #                 "Content-Type": "application/json"
-    #             },
-    #             json={
-    #                 "model": "mistralai/mixtral-8x7b-instruct",
-    #                 "messages": [
-    #                     {
-    #                         "role": "system",
-    #                         "content": "You are a financial expert. Classify the following account name into one of these categories: Equity, Non-Current Liability, Current Liability, Non-Current Asset, Current Asset, Revenue from Operations, Cost of Materials Consumed, Direct Expenses, Other Income, Other Expenses, Employee Benefits Expense, Finance Cost, Accumulated Depreciation, Deferred Tax Liability, Profit and Loss Account. Respond only with the category name."
-    #                     },
-    #                     {
-    #                         "role": "user",
-    #                         "content": account_name
-    #                     }
-    #                 ]
-    #             },
-    #             timeout=10  # <-- Add this line!
-    #         )
-    #         response.raise_for_status()
-    #         llm_response = response.json()
-    #         llm_suggestion = llm_response['choices'][0]['message']['content'].strip()
-    #         return llm_suggestion, "llm_fallback"
-    #     except requests.exceptions.RequestException as e:
-    #         print(f"LLM fallback failed: {e}")
-    #     except Exception as e:
-    #         print(f"Unexpected error in LLM fallback: {e}")
+    # No per-account LLM call here: unmapped names go to app.llm_fallback in batches
     return 'Unmapped', 'Unmapped'
 
-def extract_trial_balance_data(file_path, sheet_name=0, header_row=0):
-    """Extracts trial balance data from an Excel file."""
+def parse_amount_column(values):
+    """
+    parse_amount() over a whole column: returns a float64 array with the same
+    results, including the "Cr" suffix turning a positive amount negative.
+    """
+    values = pd.Series(values).reset_index(drop=True)
+    if pd.api.types.is_bool_dtype(values) or not (
+        pd.api.types.is_numeric_dtype(values) or values.dtype == object
+    ):
+        return values.map(parse_amount).to_numpy(dtype=float)
+    if pd.api.types.is_numeric_dtype(values):
+        numbers = values.to_numpy(dtype=float)
+        result = np.where(np.isnan(numbers), 0.0, numbers)
+        # str() of these floats is in exponent form (or inf), which parse_amount
+        # strips to something that is not a number; let it decide those
+        magnitude = np.abs(numbers)
+        odd = ~np.isfinite(numbers) & ~np.isnan(numbers)
+        odd |= (numbers != 0) & ((magnitude < 1e-4) | (magnitude >= 1e16))
+        if odd.any():
+            result[odd] = [parse_amount(v) for v in values[odd]]
+        return result
+
+    missing = values.isna().to_numpy()
+    text = values.where(~missing, "").astype(str).str.strip()
+    is_credit = text.str.lower().str.endswith("cr").to_numpy()
+    cleaned = text.str.replace(r"[^\d\.\-\+]", "", regex=True)
+    cleaned = cleaned.where(~cleaned.isin(["", "-", "+"]), "0")
     try:
-        df_raw = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
-    except Exception as e:
-        print(f"Error reading Excel file: {e}")
+        result = cleaned.to_numpy(dtype=object).astype(float)
+    except ValueError:
+        # At least one value like "1.2.3" or "5-3"; float() rejects those as 0.0
+        result = cleaned.map(_float_or_zero).to_numpy(dtype=float)
+    result[missing] = 0.0
+    negate = is_credit & (result > 0)
+    result[negate] = -result[negate]
+    return result
+
+def _float_or_zero(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+def extract_records(df_raw, source_file, classifier, llm_budget=None):
+    """
+    Columnar version of the row loop in extract_records_rowwise(): the same
+    records, with the skip filter and amount parsing done as column operations
+    and the account names classified in one classifier.classify_many() call.
+    With ML_FALLBACK and a classifier that has a fallback model (a
+    MappingVersion), the names the rules leave Unmapped are then predicted in
+    one batch per call (so once per chunk of a streamed sheet) and every
+    record gets a "confidence"; with LLM_FALLBACK the names still Unmapped
+    after that are sent to the LLM in batched requests, within llm_budget
+    (the LLMBudget of the whole extraction when it is called per chunk).
+    Counts and timings go to the extraction stats being collected, if any.
+    """
+    stats = current_stats()
+    if stats is not None:
+        stats.rows += len(df_raw)
+    n_cols = len(df_raw.columns)
+    if n_cols == 0 or len(df_raw) == 0:
         return []
-    exact_mappings, keyword_rules = load_mappings()
-    smart_rules = get_smart_rules()
+    names = df_raw.iloc[:, 0].reset_index(drop=True)
+    present = names.notna()
+    names = names.where(present, "").astype(str).str.strip()
+    keep = present & (names != "")
+    keep &= names.str.len() > 2
+    keep &= ~names.str.replace(".", "", regex=False).str.replace("-", "", regex=False).str.isdigit()
+    keep = keep.to_numpy()
+    if not keep.any():
+        return []
+    rows = df_raw.iloc[keep]
+    names = names[keep].tolist()
+
+    with timed("amounts"):
+        if n_cols > 3:
+            net = rows.iloc[:, 3]
+            amounts = parse_amount_column(rows.iloc[:, 1]) - parse_amount_column(rows.iloc[:, 2])
+            has_net = net.notna().to_numpy()
+            amounts[has_net] = parse_amount_column(net[has_net])
+        elif n_cols > 2:
+            amounts = parse_amount_column(rows.iloc[:, 1]) - parse_amount_column(rows.iloc[:, 2])
+        else:
+            amounts = np.zeros(len(names))
+
+    with timed("classify"):
+        classified = classifier.classify_many(names)
+    records = [
+        {
+            "account_name": name,
+            "group": group,
+            "amount": amount,
+            "mapped_by": mapped_by,
+            "source_file": source_file
+        }
+        for name, (group, mapped_by), amount in zip(names, classified, amounts.tolist())
+    ]
+    if hasattr(classifier, "fallback_model") and (ML_FALLBACK or LLM_FALLBACK):
+        confidences = None
+        if ML_FALLBACK:
+            with timed("ml_fallback"):
+                classified, confidences = classify_unmapped(classifier.fallback_model(), names, classified)
+        if LLM_FALLBACK:
+            with timed("llm_fallback"):
+                classified, confidences = classify_with_llm(names, classified, confidences, classifier.groups,
+                                                            llm_budget, getattr(classifier, "version", None))
+        for record, (group, mapped_by), confidence in zip(records, classified, confidences):
+            record["group"], record["mapped_by"], record["confidence"] = group, mapped_by, confidence
+    if stats is not None:
+        stats.observe(records)
+    return records
+
+def extract_records_rowwise(df_raw, source_file, exact_mappings, keyword_rules, smart_rules):
+    """Original row-by-row extraction, kept as the reference for extract_records()."""
     structured_data = []
-    source_file = Path(file_path).name
     for idx, row in df_raw.iterrows():
         account_name = row.iloc[0] if len(row) > 0 else None
         if pd.isna(account_name) or str(account_name).strip() == '':
@@ -143,6 +219,200 @@ def extract_trial_balance_data(file_path, sheet_name=0, header_row=0):
         structured_data.append(record)
     return structured_data
 
+STREAM_EXTRACT = os.getenv("STREAM_EXTRACT", "1") != "0"
+# Find the header row and the account/debit/credit/net columns instead of assuming columns 0-3
+DETECT_LAYOUT = os.getenv("DETECT_LAYOUT", "1") != "0"
+STREAM_CHUNK_ROWS = int(os.getenv("STREAM_CHUNK_ROWS", "5000"))
+STREAMABLE_EXTENSIONS = ('.xlsx', '.xlsm')
+# Cell texts pandas.read_excel reads as missing (its default na_values), plus
+# the Excel error values it turns into NaN
+_MISSING_CELL_TEXT = {
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+    '#NULL!', '#DIV/0!', '#VALUE!', '#REF!', '#NAME?', '#NUM!', '#GETTING_DATA'
+}
+
+def iter_sheet_rows(file_path, sheet_name=0):
+    """Parse step: cell values of one sheet, row by row, from a read-only workbook."""
+    from openpyxl import load_workbook
+    workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+    try:
+        sheet = workbook[workbook.sheetnames[sheet_name] if isinstance(sheet_name, int) else sheet_name]
+        # The stored dimension is often wrong; let every row report its own width
+        sheet.reset_dimensions()
+        for row in sheet.iter_rows(values_only=True):
+            yield row
+    finally:
+        workbook.close()
+
+def _cell_value(value):
+    """A cell value as pandas.read_excel would hand it over (None when missing)."""
+    if isinstance(value, str):
+        return None if value in _MISSING_CELL_TEXT else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+def iter_row_chunks(rows, header_row=0, chunk_size=STREAM_CHUNK_ROWS, layout=None):
+    """
+    Filter step: skip the header (and the rows above it) and blank rows, and
+    yield the rest as DataFrames of at most chunk_size rows padded to the widest
+    row seen so far. (read_excel pads to the widest row of the whole sheet; that
+    only matters for sheets that look two columns wide until a later row.)
+    With a detected layout only its columns are kept, in extract_records() order.
+    """
+    if layout is not None and layout.detected:
+        header_row = layout.header_row
+    else:
+        layout = None
+    width = len(layout.columns) if layout is not None else 0
+    chunk = []
+    for index, row in enumerate(rows):
+        if layout is not None:
+            row = layout.select_row(row)
+        values = [_cell_value(value) for value in row]
+        while values and values[-1] is None:
+            values.pop()
+        width = max(width, len(values))
+        if (header_row is not None and index <= header_row) or not values:
+            continue
+        chunk.append(values)
+        if len(chunk) >= chunk_size:
+            yield _chunk_frame(chunk, width)
+            chunk = []
+    if chunk:
+        yield _chunk_frame(chunk, width)
+
+def _chunk_frame(chunk, width):
+    return pd.DataFrame([values + [None] * (width - len(values)) for values in chunk])
+
+def iter_records(chunks, source_file, classifier, llm_budget=None):
+    """
+    Classify step: the records of each chunk, built with the columnar
+    extract_records(). All chunks share one LLM fallback budget.
+    """
+    llm_budget = llm_budget or LLMBudget()
+    for frame in chunks:
+        yield from extract_records(frame, source_file, classifier, llm_budget)
+
+def stream_trial_balance_records(file_path, sheet_name=0, header_row=0, classifier=None, auto_layout=None,
+                                 llm_budget=None):
+    """
+    Records of extract_trial_balance_data() as a generator over a read-only
+    workbook: parse -> filter -> classify, holding one chunk of rows at a time.
+    The first LAYOUT_SCAN_ROWS rows are buffered to detect the layout, so the
+    sheet is still read only once.
+    """
+    if classifier is None:
+        from app.mapping_registry import current_mappings
+        classifier = current_mappings()
+    rows = iter_sheet_rows(file_path, sheet_name)
+    layout = None
+    if DETECT_LAYOUT if auto_layout is None else auto_layout:
+        head = list(islice(rows, LAYOUT_SCAN_ROWS))
+        layout = _detect(head, header_row, file_path)
+        rows = chain(head, rows)
+    yield from iter_records(iter_row_chunks(rows, header_row, layout=layout), Path(file_path).name, classifier,
+                            llm_budget)
+
+def _detect(head, header_row, file_path):
+    layout = detect_layout([[_cell_value(value) for value in row] for row in head], header_row)
+    if layout.detected:
+        print(f"🧭 {Path(file_path).name}: header row {layout.header_row}, columns {layout.labels}")
+    return layout
+
+def scan_layout(file_path, sheet_name=0, header_row=0):
+    """Layout of a sheet from its first LAYOUT_SCAN_ROWS rows only."""
+    if _streamable(file_path):
+        try:
+            return _detect(list(islice(iter_sheet_rows(file_path, sheet_name), LAYOUT_SCAN_ROWS)), header_row, file_path)
+        except Exception as e:
+            print(f"⚠️ Could not scan {Path(file_path).name} with openpyxl ({e}), using pandas")
+    head = pd.read_excel(file_path, sheet_name=sheet_name, header=None, nrows=LAYOUT_SCAN_ROWS)
+    rows = [[None if pd.isna(value) else value for value in row] for row in head.itertuples(index=False)]
+    return _detect(rows, header_row, file_path)
+
+def read_layout_frame(file_path, layout, sheet_name=0):
+    """
+    One targeted read of the data under a detected layout's header, as the
+    (account, debit, credit[, net]) frame extract_records() expects.
+    """
+    used = sorted(i for i in layout.columns if i is not None)
+    try:
+        df = pd.read_excel(file_path, sheet_name=sheet_name, header=None, skiprows=layout.data_start,
+                           usecols=range(used[-1] + 1))
+    except ValueError:
+        # Trailing columns that are empty below the header
+        df = pd.read_excel(file_path, sheet_name=sheet_name, header=None, skiprows=layout.data_start)
+    return layout.select_frame(df)
+
+def write_records_json(records, output_file):
+    """
+    Sink step: write records to output_file as they arrive, byte-for-byte the
+    JSON analyze_and_save_results() writes. Returns the number of records.
+    """
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
+    tmp_file = f"{output_file}.{os.getpid()}.tmp"
+    count = 0
+    try:
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            for record in records:
+                item = json.dumps(record, indent=2, ensure_ascii=False).replace('\n', '\n  ')
+                f.write(('[\n  ' if count == 0 else ',\n  ') + item)
+                count += 1
+            f.write('\n]' if count else '[]')
+        os.replace(tmp_file, output_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return count
+
+def _streamable(file_path):
+    return STREAM_EXTRACT and str(file_path).lower().endswith(STREAMABLE_EXTENSIONS)
+
+def extract_trial_balance_to_file(file_path, output_file, sheet_name=0, header_row=0):
+    """
+    Extract straight into output_file: the columnar format for a .tbc path,
+    JSON otherwise (see app.columnar.save_parsed_trial_balance). .xlsx files
+    are streamed so memory stays flat however long the sheet is; anything the
+    streaming reader cannot handle goes through pandas.
+    """
+    llm_budget = LLMBudget()
+    if _streamable(file_path):
+        try:
+            records = stream_trial_balance_records(file_path, sheet_name, header_row, llm_budget=llm_budget)
+            return save_parsed_trial_balance(records, output_file)
+        except Exception as e:
+            print(f"⚠️ Streaming read of {Path(file_path).name} failed ({e}), using pandas")
+    records = extract_trial_balance_data(file_path, sheet_name, header_row, stream=False, llm_budget=llm_budget)
+    return save_parsed_trial_balance(records, output_file)
+
+def extract_trial_balance_data(file_path, sheet_name=0, header_row=0, stream=None, auto_layout=None, llm_budget=None):
+    """
+    Extracts trial balance data from an Excel file. The LLM fallback gets one
+    LLMBudget for the whole extraction, however many chunks it is read in.
+    """
+    llm_budget = llm_budget or LLMBudget()
+    if (stream is None and _streamable(file_path)) or stream:
+        try:
+            return list(stream_trial_balance_records(file_path, sheet_name, header_row, auto_layout=auto_layout,
+                                                     llm_budget=llm_budget))
+        except Exception as e:
+            print(f"⚠️ Streaming read of {Path(file_path).name} failed ({e}), using pandas")
+    try:
+        layout = scan_layout(file_path, sheet_name, header_row) if (
+            DETECT_LAYOUT if auto_layout is None else auto_layout
+        ) else None
+        if layout is not None and layout.detected:
+            df_raw = read_layout_frame(file_path, layout, sheet_name)
+        else:
+            df_raw = pd.read_excel(file_path, sheet_name=sheet_name, header=header_row)
+    except Exception as e:
+        print(f"Error reading Excel file: {e}")
+        return []
+    from app.mapping_registry import current_mappings
+    return extract_records(df_raw, Path(file_path).name, current_mappings(), llm_budget)
+
 def analyze_and_save_results(structured_data, output_file):
     """Analyzes and saves the extracted data to a JSON file."""
     total_records = len(structured_data)
@@ -161,7 +431,7 @@ def analyze_and_save_results(structured_data, output_file):
             account_groups[group] = {'count': 0, 'total_amount': 0}
         account_groups[group]['count'] += 1
         account_groups[group]['total_amount'] += abs(record['amount'])
-    os.makedirs('output1', exist_ok=True)
+    os.makedirs(os.path.dirname(output_file) or '.', exist_ok=True)
     try:
         with open(output_file, 'w', encoding='utf-8') as f:
             json.dump(structured_data, f, indent=2, ensure_ascii=False)
@@ -0,0 +1,202 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from app.workspace import JOBS_ROOT
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOBS_DB = os.getenv("JOBS_DB", os.path.join(JOBS_ROOT, "jobs.db"))
+INTERRUPTED_ERROR = "interrupted by restart"
+
+
+# Made once per process: a restarted container can reuse the old process's
+# host name and pid (uvicorn runs as PID 1), never this token
+_PROCESS_TOKEN = uuid.uuid4().hex[:12]
+
+
+def _process_owner():
+    """host:pid:token of this process, recorded on the jobs it runs."""
+    return f"{socket.gethostname()}:{os.getpid()}:{_PROCESS_TOKEN}"
+
+
+def _owner_gone(owner):
+    """
+    True when owner (host:pid:token, or host:pid from before tokens) was a
+    process on this host that no longer runs: its pid is gone, or the pid is
+    this process's own under another token.
+    """
+    parts = (owner or "").rsplit(":", 2)
+    if len(parts) == 3 and parts[2].isalnum() and parts[1].isdigit():
+        host, pid, token = parts
+    else:
+        host, _, pid = (owner or "").rpartition(":")
+        token = None
+    if host != socket.gethostname() or not pid.isdigit():
+        return False
+    if int(pid) == os.getpid():
+        return token != _PROCESS_TOKEN
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except OSError:
+        pass
+    return False
+
+
+class JobStore:
+    """
+    Job table persisted in SQLite so any API worker process can answer
+    GET /jobs/{id} for a job started by another one.
+    """
+
+    def __init__(self, db_path=JOBS_DB):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    progress TEXT NOT NULL DEFAULT '{}',
+                    artifacts TEXT NOT NULL DEFAULT '{}',
+                    message TEXT,
+                    error TEXT,
+                    owner TEXT
+                )
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+            if "owner" not in columns:
+                conn.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def create(self, job_id, kind):
+        now = datetime.now().isoformat()
+        with self._lock, self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, kind, status, created_at, updated_at, owner) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (job_id, kind, now, now, _process_owner()),
+            )
+
+    def fail_interrupted(self):
+        """
+        Mark queued/running jobs whose process has stopped (a restart or a
+        crash) as failed, so clients polling them get an answer. A restart
+        that reuses the old pid is told apart by the owner's process token.
+        Jobs of other live worker processes, or of other hosts, are left
+        alone; jobs from before owners were recorded count as interrupted.
+        """
+        with self._lock, self._connect() as conn:
+            rows = conn.execute("SELECT job_id, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            interrupted = [job_id for job_id, owner in rows if owner is None or _owner_gone(owner)]
+            now = datetime.now().isoformat()
+            conn.executemany(
+                "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? "
+                "WHERE job_id = ? AND status IN ('queued', 'running')",
+                [(INTERRUPTED_ERROR, now, job_id) for job_id in interrupted],
+            )
+        if interrupted:
+            print(f"⚠️ Marked {len(interrupted)} interrupted job(s) as failed")
+        return interrupted
+
+    def get(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["progress"] = json.loads(job["progress"])
+        job["artifacts"] = json.loads(job["artifacts"])
+        return job
+
+    def update(self, job_id, **fields):
+        for key in ("progress", "artifacts"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], ensure_ascii=False)
+        fields["updated_at"] = datetime.now().isoformat()
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._lock, self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def record_note(self, job_id, note_number, success, total=None):
+        """Record the outcome of one note in the job's progress."""
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT progress FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+            progress = json.loads(row[0]) if row else {}
+            notes = progress.setdefault("notes", {})
+            notes[str(note_number)] = "success" if success else "failed"
+            progress["completed"] = len(notes)
+            if total is not None:
+                progress["total"] = total
+            conn.execute(
+                "UPDATE jobs SET progress = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(progress), datetime.now().isoformat(), job_id),
+            )
+
+
+class JobQueue:
+    """
+    Local worker pool that runs long jobs outside the HTTP request. On start
+    it fails the jobs a stopped process left queued or running.
+    """
+
+    def __init__(self, store, max_workers=JOB_WORKERS):
+        self.store = store
+        store.fail_interrupted()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, job_id, kind, func, *args, on_failure=None, **kwargs):
+        """
+        Queue func(*args, progress=callback, **kwargs). func returns
+        (message, artifacts) where artifacts maps a name to a workspace-relative path.
+        on_failure() runs when func raises (e.g. to remove the job's workspace,
+        which has no artifacts worth keeping then).
+        """
+        self.store.create(job_id, kind)
+        self.executor.submit(self._run, job_id, func, args, kwargs, on_failure)
+        return job_id
+
+    def _run(self, job_id, func, args, kwargs, on_failure=None):
+        self.store.update(job_id, status="running")
+
+        def progress(note_number, success, total=None):
+            self.store.record_note(job_id, note_number, success, total)
+
+        try:
+            message, artifacts = func(*args, progress=progress, **kwargs)
+            self.store.update(job_id, status="completed", message=message, artifacts=artifacts)
+        except Exception as e:
+            detail = getattr(e, "detail", None) or str(e)
+            print(f"❌ Job {job_id} failed: {detail}")
+            traceback.print_exc()
+            self.store.update(job_id, status="failed", error=str(detail))
+            if on_failure is not None:
+                on_failure()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue():
+    """Process-wide job queue, created on first use."""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = JobQueue(JobStore())
+        return _job_queue
@@ -1,6 +1,5 @@
 import json
 import os
-import pandas as pd
 from openpyxl import Workbook
 from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
 from openpyxl.utils.dataframe import dataframe_to_rows
@@ -94,11 +93,13 @@ def create_financial_table_sheet(workbook, sheet_name, note_data):
     if 'table_data' in note_data and note_data['table_data']:
         table_data = note_data['table_data']
         
-        # Create DataFrame from table_data
-        df = pd.DataFrame(table_data)
+        # Columns of the rows; 'role' (header/heading/line/total) styles a row instead
+        columns = []
+        for row in table_data:
+            columns.extend(key for key in row if key != 'role' and key not in columns)
         
         # Add table headers
-        for col_num, column_name in enumerate(df.columns, 1):
+        for col_num, column_name in enumerate(columns, 1):
             cell = ws.cell(row=current_row, column=col_num, value=column_name.replace('_', ' ').title())
             cell.font = header_font
             cell.fill = header_fill
@@ -108,17 +109,25 @@ def create_financial_table_sheet(workbook, sheet_name, note_data):
         current_row += 1
         
         # Add table data
-        for _, row in df.iterrows():
-            for col_num, value in enumerate(row, 1):
+        for row in table_data:
+            role = row.get('role')
+            for col_num, column_name in enumerate(columns, 1):
+                value = row.get(column_name)
                 cell = ws.cell(row=current_row, column=col_num, value=value)
                 cell.border = thin_border
                 
                 # Right align numeric columns (except first column)
                 if col_num > 1:
                     cell.alignment = right_alignment
+                    if isinstance(value, float):
+                        cell.number_format = '0.00'
                 
+                if role is not None:
+                    # Typed rows: numbers are already numbers, the role says what is bold
+                    if role in ('header', 'heading', 'total'):
+                        cell.font = bold_font
                 # Bold formatting for total rows and headers
-                if isinstance(value, str) and ('**' in value or 'Total' in value or 'Particulars' in value):
+                elif isinstance(value, str) and ('**' in value or 'Total' in value or 'Particulars' in value):
                     cell.font = bold_font
                     # Remove markdown formatting
                     cell.value = value.replace('**', '')
@@ -237,9 +246,12 @@ def create_financial_table_sheet(workbook, sheet_name, note_data):
     return ws
 
 def convert_json_to_excel(input_file, output_file):
-    """Main function to convert JSON to Excel"""
+    """
+    Main function to convert JSON to Excel. input_file may be a path or the
+    already-loaded JSON; output_file may be a path or a file-like object.
+    """
     # Read JSON data
-    json_data = read_json_file(input_file)
+    json_data = read_json_file(input_file) if isinstance(input_file, str) else input_file
     if json_data is None:
         return False
 
@@ -300,9 +312,10 @@ def convert_json_to_excel(input_file, output_file):
 
 def json_to_xlsx(input_json, output_xlsx):
     """
-    Convert the given JSON file to Excel using the existing logic.
+    Convert the given JSON file (or data) to Excel using the existing logic.
+    Returns True when the workbook was written.
     """
-    convert_json_to_excel(input_json, output_xlsx)
+    return convert_json_to_excel(input_json, output_xlsx)
 
 def main():
     """Main execution function"""
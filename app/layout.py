@@ -0,0 +1,193 @@
+import os
+import re
+
+# Rows read to find the header; the rest of the sheet is read once afterwards
+LAYOUT_SCAN_ROWS = int(os.getenv("LAYOUT_SCAN_ROWS", "30"))
+# Header rows that may follow the first one (e.g. Tally's "Opening / Balance")
+HEADER_CONTINUATION_ROWS = 2
+# account column + one amount column
+MIN_LAYOUT_SCORE = 4
+
+ACCOUNT_WORDS = {"account", "accounts", "particulars", "ledger", "description", "a/c", "head", "name"}
+NOT_ACCOUNT_WORDS = {"code", "no", "number", "group", "type"}
+DEBIT_WORDS = {"debit", "dr"}
+CREDIT_WORDS = {"credit", "cr"}
+# Preference order for the net amount column
+NET_WORDS = ["closing", "amount", "balance"]
+
+
+def _words(text):
+    return set(re.findall(r"[a-z/]+", str(text).lower()))
+
+
+def column_role(label):
+    """'account', 'opening', 'debit', 'credit', 'net' or None for a header label."""
+    words = _words(label)
+    if not words:
+        return None
+    if "opening" in words:
+        return "opening"
+    if words & DEBIT_WORDS:
+        return "debit"
+    if words & CREDIT_WORDS:
+        return "credit"
+    if words.intersection(NET_WORDS):
+        return "net"
+    if words & ACCOUNT_WORDS and not words & NOT_ACCOUNT_WORDS:
+        return "account"
+    return None
+
+
+def _net_rank(label):
+    words = _words(label)
+    return min(rank for rank, word in enumerate(NET_WORDS) if word in words)
+
+
+def _is_blank(value):
+    return value is None or (isinstance(value, str) and not value.strip()) or value != value
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value
+
+
+def _looks_like_amount(value):
+    return _is_number(value) or (isinstance(value, str) and bool(re.search(r"\d", value)))
+
+
+class TrialBalanceLayout:
+    """
+    Where the data of a trial balance sheet is: the last header row and the
+    column index of the account name, debit, credit and net (closing) amount.
+    A layout that was not detected means "use the fixed legacy layout".
+    """
+
+    def __init__(self, header_row=0, account=0, debit=None, credit=None, net=None,
+                 score=0.0, detected=True, labels=None):
+        self.header_row = header_row
+        self.account = account
+        self.debit = debit
+        self.credit = credit
+        self.net = net
+        self.score = score
+        self.detected = detected
+        self.labels = labels or {}
+
+    @classmethod
+    def legacy(cls, header_row=0):
+        """Account in column 0, debit/credit in 1/2, net in 3, header in header_row."""
+        return cls(header_row, 0, 1, 2, 3, detected=False)
+
+    @property
+    def data_start(self):
+        return self.header_row + 1
+
+    @property
+    def columns(self):
+        """
+        Source column per position of the frame extract_records() expects
+        (account, debit, credit[, net]); None for a column the sheet does not have.
+        Only meaningful for a detected layout.
+        """
+        columns = [self.account, self.debit, self.credit]
+        if self.net is not None:
+            columns.append(self.net)
+        return columns
+
+    @property
+    def amount_column(self):
+        """Single amount column for callers that need one: the net column, else debit."""
+        return self.net if self.net is not None else self.debit
+
+    def select_row(self, row):
+        return [row[i] if i is not None and i < len(row) else None for i in self.columns]
+
+    def select_frame(self, df):
+        """The layout's columns of a header=None DataFrame, in extract_records() order."""
+        import pandas as pd
+        data = {}
+        for position, index in enumerate(self.columns):
+            if index is not None and index < df.shape[1]:
+                data[position] = df.iloc[:, index]
+            else:
+                data[position] = pd.Series([None] * len(df), index=df.index, dtype=object)
+        return pd.DataFrame(data)
+
+    def to_dict(self):
+        return {
+            "detected": self.detected,
+            "header_row": self.header_row,
+            "account": self.account,
+            "debit": self.debit,
+            "credit": self.credit,
+            "net": self.net,
+            "score": self.score,
+            "labels": self.labels,
+        }
+
+
+def _header_labels(rows, start):
+    """Labels of the header starting at rows[start], merged with continuation rows below it."""
+    labels = {i: str(v).strip() for i, v in enumerate(rows[start]) if isinstance(v, str) and v.strip()}
+    last = start
+    for offset in range(1, HEADER_CONTINUATION_ROWS + 1):
+        if start + offset >= len(rows):
+            break
+        row = rows[start + offset]
+        texts = {i: str(v).strip() for i, v in enumerate(row) if isinstance(v, str) and v.strip()}
+        # A continuation row has text under the header and nothing that looks like data
+        if not texts or (len(row) > 0 and not _is_blank(row[0])) or any(_is_number(v) for v in row):
+            break
+        for i, text in texts.items():
+            labels[i] = f"{labels[i]} {text}" if i in labels else text
+        last = start + offset
+    return labels, last
+
+
+def _score_candidate(rows, start):
+    labels, last = _header_labels(rows, start)
+    roles = {}
+    for i in sorted(labels):
+        roles.setdefault(column_role(labels[i]), []).append(i)
+    account = (roles.get("account") or [None])[0]
+    debit = (roles.get("debit") or [None])[0]
+    credit = (roles.get("credit") or [None])[0]
+    nets = roles.get("net") or []
+    net = min(nets, key=lambda i: (_net_rank(labels[i]), i)) if nets else None
+    if account is None or (net is None and debit is None):
+        return None
+
+    score = 2.0 + (2.0 if net is not None else 0.0) + (debit is not None) + (credit is not None)
+    # Bonus for data rows underneath that look like "name, amounts"
+    amount_columns = [i for i in (net, debit, credit) if i is not None]
+    checked = matched = 0
+    for row in rows[last + 1:]:
+        if all(_is_blank(v) for v in row):
+            continue
+        checked += 1
+        name = row[account] if account < len(row) else None
+        if isinstance(name, str) and name.strip() and any(
+            i < len(row) and _looks_like_amount(row[i]) for i in amount_columns
+        ):
+            matched += 1
+        if checked == 10:
+            break
+    score += 2.0 * matched / checked if checked else 0.0
+    return TrialBalanceLayout(last, account, debit, credit, net, round(score, 2), labels=labels)
+
+
+def detect_layout(rows, default_header_row=0):
+    """
+    Best-scoring header among the first rows of a sheet (a list of row value
+    tuples, header=None numbering). Falls back to the legacy layout when no row
+    looks like a trial balance header.
+    """
+    rows = [tuple(row) for row in rows]
+    best = None
+    for start in range(len(rows)):
+        candidate = _score_candidate(rows, start)
+        if candidate is not None and (best is None or candidate.score > best.score):
+            best = candidate
+    if best is None or best.score < MIN_LAYOUT_SCORE:
+        return TrialBalanceLayout.legacy(default_header_row)
+    return best
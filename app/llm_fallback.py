@@ -0,0 +1,275 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from dotenv import load_dotenv
+
+from app.workspace import JOBS_ROOT
+
+# Ask an LLM about the accounts the rules and the ML fallback leave Unmapped
+LLM_FALLBACK = os.getenv("LLM_FALLBACK", "0") == "1"
+OPENROUTER_URL = "https://openrouter.ai/api/v1/chat/completions"
+LLM_FALLBACK_URL = os.getenv("LLM_FALLBACK_URL", OPENROUTER_URL)
+LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "mistralai/mixtral-8x7b-instruct")
+# Distinct names per request
+LLM_FALLBACK_BATCH = int(os.getenv("LLM_FALLBACK_BATCH", "40"))
+LLM_FALLBACK_CONCURRENCY = int(os.getenv("LLM_FALLBACK_CONCURRENCY", "4"))
+# Seconds an extraction may spend on the LLM in total (see LLMBudget), and one request at most
+LLM_FALLBACK_BUDGET = float(os.getenv("LLM_FALLBACK_BUDGET", "20"))
+LLM_FALLBACK_TIMEOUT = float(os.getenv("LLM_FALLBACK_TIMEOUT", "10"))
+# mapping version -> name -> category answers, kept across restarts ("" to keep them in memory only)
+LLM_FALLBACK_CACHE_FILE = os.getenv("LLM_FALLBACK_CACHE_FILE", os.path.join(JOBS_ROOT, "llm_fallback_cache.json"))
+
+SYSTEM_PROMPT = (
+    "You are a financial expert. Classify each numbered account name into exactly one of these "
+    "categories: {categories}. Use \"Unmapped\" when none fits. Respond only with a JSON object "
+    "mapping each number to its category, e.g. {{\"1\": \"Current Asset\"}}."
+)
+
+
+def _parse_answer(content, count):
+    """{index: category} from the model's reply; indexes outside 1..count are dropped."""
+    found = re.search(r"\{.*\}", content or "", re.S)
+    if not found:
+        raise ValueError("no JSON object in the reply")
+    data = json.loads(found.group(0))
+    answers = {}
+    for key, value in data.items():
+        try:
+            index = int(str(key).strip().rstrip("."))
+        except ValueError:
+            continue
+        if 1 <= index <= count and isinstance(value, str):
+            answers[index - 1] = value.strip()
+    return answers
+
+
+class LLMBudget:
+    """
+    One time budget shared by every classify() call of an extraction (a
+    streamed sheet calls it once per chunk). The clock starts at the first
+    call that needs the LLM; once it has run out, later calls only use the cache.
+    """
+
+    def __init__(self, seconds=LLM_FALLBACK_BUDGET):
+        self.seconds = seconds
+        self.deadline = None
+
+    def start(self):
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.seconds
+        return self.deadline
+
+    def remaining(self):
+        return self.seconds if self.deadline is None else max(0.0, self.deadline - time.monotonic())
+
+
+class LLMFallback:
+    """
+    Batched OpenRouter classification of residual unmapped account names.
+    Each classify() call deduplicates the names, answers what it can from the
+    name -> category cache, sends the rest in chunks of LLM_FALLBACK_BATCH
+    (a few chunks in parallel) and returns whatever came back before the
+    budget ran out: the LLMBudget passed in, or LLM_FALLBACK_BUDGET seconds
+    for this call alone. Requests still running then are abandoned, and names
+    without an answer simply stay Unmapped. Only answers are cached; a failed
+    or late request, or a name not asked because the budget was used up, is
+    asked again next time, and so is a name the model called Unmapped. Answers
+    are cached per mapping version (or, without one, per category list), so a
+    mapping reload that adds or renames groups asks again.
+    """
+
+    def __init__(self, url=LLM_FALLBACK_URL, model=LLM_FALLBACK_MODEL, api_key=None,
+                 batch_size=LLM_FALLBACK_BATCH, concurrency=LLM_FALLBACK_CONCURRENCY,
+                 budget=LLM_FALLBACK_BUDGET, timeout=LLM_FALLBACK_TIMEOUT, cache_file=LLM_FALLBACK_CACHE_FILE):
+        if api_key is None:
+            load_dotenv()
+            api_key = os.getenv("OPENROUTER_API_KEY")
+        self.url = url
+        self.model = model
+        self.api_key = api_key
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.budget = budget
+        self.timeout = timeout
+        self.cache_file = cache_file
+        self._lock = threading.Lock()
+        self._answers = self._load()
+        self.requests = 0
+        self.failures = 0
+        self.late = 0
+        self.skipped = 0
+        self.cache_hits = 0
+        self.last_ms = None
+
+    @property
+    def enabled(self):
+        # Without a key only a non-OpenRouter endpoint (e.g. a local stub) can answer
+        return bool(self.api_key) or self.url != OPENROUTER_URL
+
+    def _load(self):
+        """{cache key: {name: category}} from the cache file."""
+        if not self.cache_file or not os.path.isfile(self.cache_file):
+            return {}
+        try:
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                answers = json.load(f).get("answers", {})
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"⚠️ Ignoring LLM fallback cache file {self.cache_file}: {e}")
+            return {}
+        # Files from before answers were kept per mapping version hold plain name -> category
+        return {key: dict(names) for key, names in answers.items() if isinstance(names, dict)}
+
+    def _save(self, cache_key, answers):
+        """Merge answers into the cache file (other processes may have added to it meanwhile)."""
+        if not self.cache_file:
+            return
+        merged = self._load()
+        merged.setdefault(cache_key, {}).update(answers)
+        os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+        tmp_path = f"{self.cache_file}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model, "answers": merged}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_file)
+        except OSError as e:
+            print(f"⚠️ Could not save LLM fallback cache: {e}")
+
+    def _ask(self, names, categories, deadline):
+        """One request for a chunk of names: {name: category as answered}."""
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError("time budget used up")
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        payload = {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT.format(categories=", ".join(categories))},
+                {"role": "user", "content": "\n".join(f"{i}. {name}" for i, name in enumerate(names, 1))},
+            ],
+            "temperature": 0,
+        }
+        response = requests.post(self.url, headers=headers, json=payload, timeout=min(self.timeout, remaining))
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+        return {names[i]: category for i, category in _parse_answer(content, len(names)).items()}
+
+    def classify(self, names, categories, budget=None, version=None):
+        """
+        {name: category} for the names the LLM (or the cache) placed in one of
+        categories. Never raises and never takes much longer than the budget
+        (an LLMBudget shared with other calls, or self.budget for this call).
+        version, the mapping version the categories come from, keys the cache.
+        """
+        started = time.monotonic()
+        allowed = {category.lower(): category for category in categories}
+        cache_key = version or "categories:" + hashlib.sha256(
+            "\n".join(sorted(allowed)).encode("utf-8")).hexdigest()[:16]
+        distinct = list(dict.fromkeys(name for name in names if name))
+        with self._lock:
+            known = self._answers.get(cache_key, {})
+            cached = {name: known[name] for name in distinct if name in known}
+            self.cache_hits += len(cached)
+        missing = [name for name in distinct if name not in cached]
+
+        answered = {}
+        deadline = None
+        if missing and self.enabled:
+            deadline = budget.start() if budget is not None else started + self.budget
+            if deadline <= time.monotonic():
+                # Budget used up by earlier calls: do not even start a request
+                with self._lock:
+                    self.skipped += len(missing)
+                deadline = None
+        if deadline is not None:
+            chunks = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+            pool = ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(chunks))),
+                                      thread_name_prefix="llm-fallback")
+            futures = [pool.submit(self._ask, chunk, list(categories), deadline) for chunk in chunks]
+            done, not_done = wait(futures, timeout=max(0.0, deadline - time.monotonic()))
+            # Do not wait for stragglers; they finish (or time out) in the background
+            pool.shutdown(wait=False, cancel_futures=True)
+            failures = 0
+            for future in done:
+                try:
+                    answered.update(future.result())
+                except Exception as e:
+                    failures += 1
+                    print(f"⚠️ LLM fallback request failed: {e}")
+            with self._lock:
+                self.requests += len(futures)
+                self.failures += failures
+                self.late += len(not_done)
+            # Anything outside the category list counts as Unmapped; that may be a
+            # poor answer rather than a final one, so only placed names are cached
+            answered = {name: allowed[category.lower()] for name, category in answered.items()
+                        if category.lower() in allowed and category.lower() != "unmapped"}
+            if answered:
+                with self._lock:
+                    self._answers.setdefault(cache_key, {}).update(answered)
+                    self._save(cache_key, answered)
+
+        self.last_ms = round((time.monotonic() - started) * 1000, 1)
+        results = {**cached, **answered}
+        return {name: allowed[category.lower()] for name, category in results.items()
+                if category.lower() in allowed}
+
+    def stats(self):
+        with self._lock:
+            return {
+                "enabled": LLM_FALLBACK and self.enabled,
+                "url": self.url,
+                "model": self.model,
+                "cached_answers": sum(len(names) for names in self._answers.values()),
+                "cached_versions": len(self._answers),
+                "cache_hits": self.cache_hits,
+                "requests": self.requests,
+                "failures": self.failures,
+                "late": self.late,
+                "skipped": self.skipped,
+                "last_ms": self.last_ms,
+                "persisted_to": self.cache_file or None,
+            }
+
+
+_llm_fallback = None
+_llm_fallback_lock = threading.Lock()
+
+
+def get_llm_fallback():
+    """Process-wide LLM fallback, created on first use."""
+    global _llm_fallback
+    with _llm_fallback_lock:
+        if _llm_fallback is None:
+            _llm_fallback = LLMFallback()
+        return _llm_fallback
+
+
+def classify_with_llm(names, classified, confidences, categories, budget=None, version=None):
+    """
+    Last pass after the rule tiers and the ML fallback: the names still
+    Unmapped go to the LLM in one batched call, within budget (an LLMBudget
+    shared by the extraction's calls); answers are tagged "llm_fallback".
+    version is the mapping version the categories belong to (the cache key).
+    Returns (classified, confidences) like classify_unmapped().
+    """
+    classified = list(classified)
+    confidences = list(confidences) if confidences is not None else [
+        None if mapped_by == "Unmapped" else 1.0 for _, mapped_by in classified
+    ]
+    unmapped = [i for i, (_, mapped_by) in enumerate(classified) if mapped_by == "Unmapped"]
+    if not unmapped:
+        return classified, confidences
+    answers = get_llm_fallback().classify([names[i] for i in unmapped], categories, budget, version)
+    for i in unmapped:
+        group = answers.get(names[i])
+        if group is not None and group != "Unmapped":
+            classified[i] = (group, "llm_fallback")
+    return classified, confidences
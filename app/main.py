@@ -1,5 +1,11 @@
 from fastapi import FastAPI
 from app.api import router
+from app.classifier import save_classification_cache
+from app.executor import shutdown_pools
+from app.workspace import sweep_workspaces
 
 app = FastAPI(title="Financial Notes Generator API")
-app.include_router(router) 
\ No newline at end of file
+app.include_router(router)
+app.add_event_handler("startup", sweep_workspaces)
+app.add_event_handler("shutdown", shutdown_pools)
+app.add_event_handler("shutdown", save_classification_cache)
@@ -0,0 +1,237 @@
+import ast
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app.classifier import CompiledClassifier, get_classification_cache
+from app.extract import get_smart_rules
+from app.ml_fallback import EXCLUDED_GROUPS, NgramNeighbourClassifier, training_examples
+
+# Resolved against the project root, not the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAPPING_ROOT = os.getenv("MAPPING_ROOT", PROJECT_ROOT)
+MAPPING_FILE = os.getenv("MAPPING_FILE", os.path.join("config", "mapping1.json"))
+RULES_FILE = os.getenv("RULES_FILE", os.path.join("config", "rules1.json"))
+DICTIONARY_MAPPING_FILE = os.getenv("DICTIONARY_MAPPING_FILE", "dictionarymapping.json")
+UNIFIED_MAPPINGS_FILE = os.getenv("UNIFIED_MAPPINGS_FILE", "unified_mappings (1).py")
+# Extra labelled accounts the ML fallback is trained on (besides the mappings above)
+ML_MAPPING_FILE = os.getenv("ML_MAPPING_FILE", "new_mapping1.json")
+ML_TRAIN_FILE = os.getenv("ML_TRAIN_FILE", "train.jsonl")
+# How often (seconds) the files are stat()ed for changes
+MAPPING_RELOAD_INTERVAL = float(os.getenv("MAPPING_RELOAD_INTERVAL", "2"))
+
+
+def _read_json(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _read_jsonl(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _read_unified_mappings(path):
+    """The `unified_mappings = {...}` literal of the unified mappings module (parsed, never executed)."""
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(
+            isinstance(target, ast.Name) and target.id == "unified_mappings" for target in node.targets
+        ):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"No unified_mappings dict in {path}")
+
+
+class MappingVersion:
+    """
+    One compiled, read-only snapshot of the mapping files. Requests keep using
+    the snapshot they started with while a newer one is swapped in.
+    """
+
+    def __init__(self, version, exact_mappings, keyword_rules, smart_rules, account_notes, stats,
+                 ml_examples=()):
+        self.version = version
+        self.exact_mappings = exact_mappings
+        self.keyword_rules = keyword_rules
+        self.smart_rules = smart_rules
+        # account name (lowercase) -> note name, from dictionarymapping.json and unified_mappings
+        self.account_notes = account_notes
+        self.stats = stats
+        self.loaded_at = time.time()
+        self.classifier = CompiledClassifier(exact_mappings, keyword_rules, smart_rules)
+        # Every group an account can be classified into (the LLM fallback's choices)
+        self.groups = sorted(
+            {" ".join(group.split()) for group in [*exact_mappings.values(), *keyword_rules, *smart_rules]}
+            - EXCLUDED_GROUPS
+        )
+        # (account name, group) pairs; the model is trained the first time it is needed
+        self.ml_examples = list(ml_examples)
+        self._fallback_model = None
+        self._fallback_lock = threading.Lock()
+
+    def classify_many(self, account_names):
+        """Classify a column through the process-wide classification cache."""
+        return get_classification_cache().classify_many(self.version, self.classifier, account_names)
+
+    def fallback_model(self):
+        """The ML fallback classifier trained on this version's labelled accounts (None without any)."""
+        if self._fallback_model is None and self.ml_examples:
+            with self._fallback_lock:
+                if self._fallback_model is None:
+                    model = NgramNeighbourClassifier(self.ml_examples)
+                    print(f"🤖 ML fallback trained on {model.size} accounts in {model.train_ms} ms")
+                    self._fallback_model = model
+        return self._fallback_model
+
+    def info(self):
+        return {
+            "version": self.version,
+            "loaded_at": self.loaded_at,
+            "exact_mappings": len(self.exact_mappings),
+            "keyword_rules": sum(len(keywords) for keywords in self.keyword_rules.values()),
+            "smart_rules": sum(len(patterns) for patterns in self.smart_rules.values()),
+            "account_notes": len(self.account_notes),
+            "ml_examples": len(self.ml_examples),
+            "ml_fallback": self._fallback_model.info() if self._fallback_model is not None else None,
+            "files": {path: stat is not None for path, stat in self.stats.items()},
+        }
+
+
+class MappingRegistry:
+    """
+    Process-wide owner of the account mappings. Loads and compiles
+    config/mapping1.json, config/rules1.json, dictionarymapping.json, the
+    unified_mappings dict and the ML fallback training files once, then re-stats them at most every
+    MAPPING_RELOAD_INTERVAL seconds and swaps in a recompiled version when one
+    of them changed.
+    """
+
+    def __init__(self, root=MAPPING_ROOT, mapping_file=MAPPING_FILE, rules_file=RULES_FILE,
+                 dictionary_file=DICTIONARY_MAPPING_FILE, unified_file=UNIFIED_MAPPINGS_FILE,
+                 ml_mapping_file=ML_MAPPING_FILE, ml_train_file=ML_TRAIN_FILE,
+                 reload_interval=MAPPING_RELOAD_INTERVAL):
+        self.paths = {
+            "mapping": os.path.join(root, mapping_file),
+            "rules": os.path.join(root, rules_file),
+            "dictionary": os.path.join(root, dictionary_file),
+            "unified": os.path.join(root, unified_file),
+            "ml_mapping": os.path.join(root, ml_mapping_file),
+            "ml_train": os.path.join(root, ml_train_file),
+        }
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._current = None
+        self._checked_at = 0.0
+        self._failed_stats = None
+        self.reloads = 0
+
+    def _stats(self):
+        stats = {}
+        for path in self.paths.values():
+            try:
+                st = os.stat(path)
+                stats[path] = (st.st_mtime_ns, st.st_size)
+            except OSError:
+                stats[path] = None
+        return stats
+
+    def current(self):
+        """The active MappingVersion, reloading first if a file changed on disk."""
+        current = self._current
+        now = time.monotonic()
+        if current is not None and now - self._checked_at < self.reload_interval:
+            return current
+        with self._lock:
+            self._checked_at = now
+            stats = self._stats()
+            if self._current is None or stats not in (self._current.stats, self._failed_stats):
+                self._load(stats)
+            return self._current
+
+    def reload(self):
+        """Reload now, whether or not the files changed."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            self._load(self._stats())
+            return self._current
+
+    def _load(self, stats):
+        try:
+            version = self._build(stats)
+        except Exception as e:
+            if self._current is None:
+                raise
+            # Half-written file: keep serving the previous version until the files change again
+            print(f"⚠️ Mapping reload failed, keeping version {self._current.version[:12]}: {e}")
+            self._failed_stats = stats
+            return
+        if self._current is None or version.version != self._current.version:
+            print(f"🔄 Loaded account mappings version {version.version[:12]}")
+        self._current = version  # swapped in one assignment; readers never see a partial version
+        self.reloads += 1
+
+    def _build(self, stats):
+        paths = self.paths
+        h = hashlib.sha256()
+        loaded = {}
+        for name, path in paths.items():
+            if stats[path] is None:
+                print(f"⚠️ Mapping file not found: {path}")
+                loaded[name] = None
+                continue
+            with open(path, "rb") as f:
+                h.update(name.encode() + b"\0" + f.read())
+            if name == "unified":
+                loaded[name] = _read_unified_mappings(path)
+            elif name == "ml_train":
+                loaded[name] = _read_jsonl(path)
+            else:
+                loaded[name] = _read_json(path)
+
+        smart_rules = get_smart_rules()
+        h.update(json.dumps(smart_rules, sort_keys=True).encode())
+
+        # mapping1.json decides; unified_mappings only adds accounts it does not know
+        exact_mappings = dict(loaded["mapping"] or {})
+        known = {name.lower() for name in exact_mappings}
+        account_notes = {}
+        for note_name, entry in (loaded["unified"] or {}).items():
+            for account in entry.get("accounts", []):
+                account_notes.setdefault(account.lower(), note_name)
+                if entry.get("broad_category") and account.lower() not in known:
+                    exact_mappings[account] = entry["broad_category"]
+                    known.add(account.lower())
+        for note_name, subcategories in (loaded["dictionary"] or {}).items():
+            for accounts in subcategories.values():
+                for account in accounts:
+                    account_notes.setdefault(account.lower(), note_name)
+
+        return MappingVersion(
+            version=h.hexdigest(),
+            exact_mappings=exact_mappings,
+            keyword_rules=dict(loaded["rules"] or {}),
+            smart_rules=smart_rules,
+            account_notes=account_notes,
+            stats=stats,
+            ml_examples=training_examples(exact_mappings, loaded["ml_mapping"], train_rows=loaded["ml_train"] or ()),
+        )
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_mapping_registry():
+    """Process-wide mapping registry, created on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MappingRegistry()
+        return _registry
+
+
+def current_mappings():
+    return get_mapping_registry().current()
@@ -0,0 +1,203 @@
+import os
+import re
+import time
+from collections import Counter
+
+import numpy as np
+
+# Classify accounts the rule tiers leave "Unmapped" with a local model
+ML_FALLBACK = os.getenv("ML_FALLBACK", "1") != "0"
+# Below this the account stays Unmapped
+ML_FALLBACK_MIN_CONFIDENCE = float(os.getenv("ML_FALLBACK_MIN_CONFIDENCE", "0.3"))
+ML_FALLBACK_NEIGHBOURS = int(os.getenv("ML_FALLBACK_NEIGHBOURS", "5"))
+# Queries scored per step (bounds the dense query x training score block)
+ML_FALLBACK_BATCH = 512
+
+NGRAM_SIZES = (2, 3, 4)
+# Labels that say nothing about where an account belongs
+EXCLUDED_GROUPS = {"Unmapped", "Summary"}
+_TRAIN_NAME = re.compile(r"account name '(.*)' under", re.S)
+
+
+def char_ngrams(name):
+    """Character 2-4 grams of each word (letters only), padded with spaces at word edges."""
+    grams = []
+    for word in re.findall(r"[^\W\d_]+", str(name).lower()):
+        padded = f" {word} "
+        for n in NGRAM_SIZES:
+            grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+
+def training_examples(*mappings, train_rows=()):
+    """
+    (account name, group) pairs from {name: group} mappings and train.jsonl
+    rows ({"instruction": "Classify the account name '...' ...", "output": group}).
+    The first label seen for a name (ignoring case) wins; Unmapped/Summary
+    labels are skipped.
+    """
+    pairs = []
+    for mapping in mappings:
+        pairs.extend((mapping or {}).items())
+    for row in train_rows:
+        found = _TRAIN_NAME.search(row.get("instruction", ""))
+        if found:
+            pairs.append((found.group(1), row.get("output", "")))
+
+    examples = {}
+    for name, group in pairs:
+        if not isinstance(name, str) or not isinstance(group, str):
+            continue
+        group = " ".join(group.split())
+        key = name.strip().lower()
+        if not key or not group or group in EXCLUDED_GROUPS or key in examples:
+            continue
+        examples[key] = (name.strip(), group)
+    return list(examples.values())
+
+
+class NgramNeighbourClassifier:
+    """
+    Nearest-neighbour classifier over TF-IDF weighted character n-grams,
+    in NumPy only. The training vectors are kept feature-major (an inverted
+    index), so a batch of names is scored against every training account with
+    a few gathers and one bincount; the group with the largest summed cosine
+    similarity among the nearest neighbours wins. Its confidence is that sum
+    divided by the number of neighbours, so it is high only when the
+    neighbours are both close and agree.
+    """
+
+    def __init__(self, examples, neighbours=ML_FALLBACK_NEIGHBOURS):
+        started = time.perf_counter()
+        self.neighbours = neighbours
+        self.groups = sorted({group for _, group in examples})
+        group_index = {group: i for i, group in enumerate(self.groups)}
+        self.labels = np.array([group_index[group] for _, group in examples], dtype=np.int64)
+        self.size = len(examples)
+
+        self.vocabulary = {}
+        counts = []
+        for name, _ in examples:
+            grams = Counter(char_ngrams(name))
+            counts.append({self.vocabulary.setdefault(gram, len(self.vocabulary)): c for gram, c in grams.items()})
+        doc_freq = np.zeros(len(self.vocabulary), dtype=np.float64)
+        for row in counts:
+            doc_freq[list(row)] += 1
+        # Smoothed idf; unseen n-grams get the largest weight
+        self.idf = np.log((1 + self.size) / (1 + doc_freq)) + 1
+        self.unseen_idf = np.log(1 + self.size) + 1
+
+        rows, features, weights = [], [], []
+        for i, row in enumerate(counts):
+            feature_ids = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            values = np.fromiter(row.values(), dtype=np.float64, count=len(row)) * self.idf[feature_ids]
+            norm = np.linalg.norm(values)
+            rows.append(np.full(len(row), i, dtype=np.int64))
+            features.append(feature_ids)
+            weights.append(values / norm if norm else values)
+        rows = np.concatenate(rows) if rows else np.zeros(0, dtype=np.int64)
+        features = np.concatenate(features) if features else np.zeros(0, dtype=np.int64)
+        weights = np.concatenate(weights) if weights else np.zeros(0)
+        order = np.argsort(features, kind="stable")
+        self._rows = rows[order]
+        self._weights = weights[order]
+        self._indptr = np.zeros(len(self.vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(features, minlength=len(self.vocabulary)), out=self._indptr[1:])
+
+        self.train_ms = round((time.perf_counter() - started) * 1000, 1)
+        self.predictions = 0
+        self.predict_ms = 0.0
+        self.last_predict_ms = None
+
+    def _vectorize(self, names):
+        """(query, feature, weight) triples of the L2-normalised query vectors; unseen n-grams only count in the norm."""
+        queries, features, weights = [], [], []
+        for q, name in enumerate(names):
+            grams = Counter(char_ngrams(name))
+            known = [(self.vocabulary[g], c) for g, c in grams.items() if g in self.vocabulary]
+            unseen = sum(c for g, c in grams.items() if g not in self.vocabulary)
+            if not known:
+                continue
+            feature_ids = np.array([f for f, _ in known], dtype=np.int64)
+            values = np.array([c for _, c in known], dtype=np.float64) * self.idf[feature_ids]
+            # Unseen n-grams match no training account but still count towards the norm
+            norm = np.sqrt(values @ values + unseen * self.unseen_idf ** 2)
+            queries.append(np.full(len(known), q, dtype=np.int64))
+            features.append(feature_ids)
+            weights.append(values / norm)
+        if not queries:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0)
+        return np.concatenate(queries), np.concatenate(features), np.concatenate(weights)
+
+    def _similarities(self, names):
+        """Dense (len(names), training size) cosine similarities."""
+        queries, features, weights = self._vectorize(names)
+        starts = self._indptr[features]
+        counts = self._indptr[features + 1] - starts
+        entry = np.repeat(np.arange(len(features)), counts)
+        offsets = np.arange(len(entry)) - np.repeat(np.cumsum(counts) - counts, counts)
+        positions = starts[entry] + offsets
+        flat = queries[entry] * self.size + self._rows[positions]
+        scores = np.bincount(flat, weights=weights[entry] * self._weights[positions],
+                             minlength=len(names) * self.size)
+        return scores.reshape(len(names), self.size)
+
+    def predict(self, names):
+        """[(group, confidence)] for each name; group is None for a name with no known n-gram."""
+        started = time.perf_counter()
+        names = list(names)
+        distinct = list(dict.fromkeys(names))
+        results = []
+        k = min(self.neighbours, self.size)
+        for begin in range(0, len(distinct), ML_FALLBACK_BATCH):
+            batch = distinct[begin:begin + ML_FALLBACK_BATCH]
+            if k == 0:
+                results.extend((None, 0.0) for _ in batch)
+                continue
+            similarities = self._similarities(batch)
+            nearest = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            nearest_scores = np.take_along_axis(similarities, nearest, axis=1)
+            votes = np.zeros((len(batch), len(self.groups)))
+            np.add.at(votes, (np.arange(len(batch))[:, None], self.labels[nearest]), nearest_scores)
+            best = votes.argmax(axis=1)
+            confidence = votes[np.arange(len(batch)), best] / k
+            for group_id, score in zip(best.tolist(), confidence.tolist()):
+                results.append((self.groups[group_id], round(score, 4)) if score > 0 else (None, 0.0))
+        elapsed = (time.perf_counter() - started) * 1000
+        self.predictions += len(names)
+        self.predict_ms += elapsed
+        self.last_predict_ms = round(elapsed, 2)
+        by_name = dict(zip(distinct, results))
+        return [by_name[name] for name in names]
+
+    def info(self):
+        return {
+            "examples": self.size,
+            "groups": len(self.groups),
+            "features": len(self.vocabulary),
+            "neighbours": self.neighbours,
+            "train_ms": self.train_ms,
+            "predictions": self.predictions,
+            "predict_ms": round(self.predict_ms, 2),
+            "last_predict_ms": self.last_predict_ms,
+        }
+
+
+def classify_unmapped(model, names, classified, min_confidence=ML_FALLBACK_MIN_CONFIDENCE):
+    """
+    Second pass over classify_many() output: every Unmapped name is predicted
+    in one model.predict() call. Returns (classified, confidences), with
+    ("<group>", "ml_fallback") for predictions at or above min_confidence and a
+    confidence per name (1.0 for the rule tiers, None when still Unmapped).
+    """
+    classified = list(classified)
+    confidences = [None if mapped_by == "Unmapped" else 1.0 for _, mapped_by in classified]
+    unmapped = [i for i, (_, mapped_by) in enumerate(classified) if mapped_by == "Unmapped"]
+    if not unmapped or model is None:
+        return classified, confidences
+    for i, (group, confidence) in zip(unmapped, model.predict([names[i] for i in unmapped])):
+        if group is not None and confidence >= min_confidence:
+            classified[i] = (group, "ml_fallback")
+            confidences[i] = confidence
+    return classified, confidences
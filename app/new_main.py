@@ -6,9 +6,11 @@ from pathlib import Path
 from dotenv import load_dotenv
 import re
 import sys
-from typing import Dict, List, Any, Optional
+import time
+from typing import Callable, Dict, Iterator, List, Any, Optional
 import pandas as pd
 from app.utils import convert_note_json_to_lakhs
+from app.columnar import is_columnar, load_trial_balance_records, resolve_parsed_trial_balance
 
 
 # Load environment variables
@@ -70,6 +72,8 @@ class FlexibleFinancialNoteGenerator:
              "mistralai/mixtral-8x7b-instruct",  
             "mistralai/mistral-7b-instruct-v0.2" 
         ]
+        # Model that answered the most recent API call (None if all failed)
+        self.last_model: Optional[str] = None
     
     def load_note_templates(self) -> Dict[str, Any]:
         """Load note templates from app.new.py file."""
@@ -83,10 +87,15 @@ class FlexibleFinancialNoteGenerator:
             print(f"❌ Unexpected error loading note_templates: {e}")
             return {}
     
-    def load_trial_balance(self, file_path: str = "output1/parsed_trial_balance.json") -> Optional[Dict[str, Any]]:
-        """Load the classified trial balance from Excel or JSON."""
+    def load_trial_balance(self, file_path: str = "output1/parsed_trial_balance.tbc") -> Optional[Dict[str, Any]]:
+        """Load the classified trial balance from Excel, the .tbc columnar file or JSON."""
         try:
-            if file_path.endswith('.json'):
+            file_path = resolve_parsed_trial_balance(file_path)
+            if is_columnar(file_path):
+                accounts = load_trial_balance_records(file_path)
+                print(f"✅ Loaded trial balance with {len(accounts)} accounts")
+                return {"accounts": accounts}
+            elif file_path.endswith('.json'):
                 with open(file_path, 'r', encoding='utf-8') as f:
                     data = json.load(f)
                     if isinstance(data, list):
@@ -314,6 +323,7 @@ Generate the final JSON now:
     
     def call_openrouter_api(self, prompt: str) -> Optional[str]:
         """Make API call to OpenRouter with model fallback"""
+        self.last_model = None
         for model in self.recommended_models:
             print(f"🤖 Trying model: {model}")
             payload = {
@@ -337,6 +347,7 @@ Generate the final JSON now:
                 result = response.json()
                 content = result['choices'][0]['message']['content']
                 print(f"✅ Successful response from {model}")
+                self.last_model = model
                 return content
             except Exception as e:
                 print(f"❌ Failed with {model}: {e}")
@@ -412,8 +423,7 @@ Generate the final JSON now:
             print(f"❌ Error saving files: {e}")
             return False
     
-    def generate_note(self, note_number: str, trial_balance_path: str = "output1/parsed_trial_balance"
-    ".json") -> bool:
+    def generate_note(self, note_number: str, trial_balance_path: str = "output1/parsed_trial_balance.tbc", output_dir: str = "generated_notes") -> bool:
         """Generate a specific note based on note number"""
         if note_number not in self.note_templates:
             print(f"❌ Note template {note_number} not found")
@@ -436,41 +446,80 @@ Generate the final JSON now:
             print("❌ Failed to get API response")
             return False
         
-        success = self.save_generated_note(response, note_number)
+        success = self.save_generated_note(response, note_number, output_dir)
         print(f"{'✅' if success else '⚠'} Note {note_number} {'generated successfully' if success else 'generated with issues'}")
         return success
     
-    def generate_all_notes(self, trial_balance_path: str = "output1/parsed_trial_balance.json") -> dict:
-        """Generate all available notes and save them in a single notes.json file."""
+    def generate_note_json(self, note_number: str, trial_balance_path: str = "output1/parsed_trial_balance.tbc",
+                           trial_balance: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Run the LLM for one note and return its parsed JSON, or None on failure.
+        trial_balance ({"accounts": records}) is used instead of loading trial_balance_path.
+        """
+        trial_balance = trial_balance or self.load_trial_balance(trial_balance_path)
+        if not trial_balance:
+            return None
+        classified_accounts = self.classify_accounts_by_note(trial_balance, note_number)
+        prompt = self.build_llm_prompt(note_number, trial_balance, classified_accounts)
+        if not prompt:
+            return None
+        response = self.call_openrouter_api(prompt)
+        if not response:
+            return None
+        json_data, _ = self.extract_json_from_markdown(response)
+        time.sleep(1)
+        return json_data or None
+
+    def iter_notes(self, trial_balance_path: str = "output1/parsed_trial_balance.tbc",
+                   note_numbers: Optional[List[str]] = None,
+                   trial_balance: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Generate notes one at a time, yielding an event per note as soon as it is done:
+        note_number, success, latency_ms, model, completed, total and the parsed note JSON.
+        An in-memory trial_balance ({"accounts": records}) replaces trial_balance_path.
+        """
+        note_numbers = list(note_numbers or self.note_templates.keys())
+        for index, note_number in enumerate(note_numbers, start=1):
+            print(f"\n{'='*60}\n📝 Processing Note {note_number}\n{'='*60}")
+            started = time.perf_counter()
+            if note_number in self.note_templates:
+                json_data = self.generate_note_json(note_number, trial_balance_path, trial_balance)
+            else:
+                print(f"❌ Note template {note_number} not found")
+                self.last_model = None
+                json_data = None
+            yield {
+                "note_number": note_number,
+                "success": bool(json_data),
+                "latency_ms": round((time.perf_counter() - started) * 1000),
+                "model": self.last_model,
+                "completed": index,
+                "total": len(note_numbers),
+                "note": json_data,
+            }
+
+    def generate_all_notes(self, trial_balance_path: str = "output1/parsed_trial_balance.tbc", output_dir: str = "generated_notes",
+                           on_note_done: Optional[Callable[[str, bool, int], None]] = None,
+                           on_note_event: Optional[Callable[[Dict[str, Any]], None]] = None) -> dict:
+        """
+        Generate all available notes and save them in a single notes.json file.
+        on_note_done(note_number, success, total) is called as each note finishes;
+        on_note_event receives the full iter_notes() event.
+        """
         print(f"\n🚀 Starting generation of all {len(self.note_templates)} notes...")
         results = {}
         all_notes = []
-        for note_number in self.note_templates.keys():
-            print(f"\n{'='*60}\n📝 Processing Note {note_number}\n{'='*60}")
-            trial_balance = self.load_trial_balance(trial_balance_path)
-            if not trial_balance:
-                results[note_number] = False
-                continue
-            classified_accounts = self.classify_accounts_by_note(trial_balance, note_number)
-            prompt = self.build_llm_prompt(note_number, trial_balance, classified_accounts)
-            if not prompt:
-                results[note_number] = False
-                continue
-            response = self.call_openrouter_api(prompt)
-            if not response:
-                results[note_number] = False
-                continue
-            json_data, _ = self.extract_json_from_markdown(response)
-            if json_data:
-                all_notes.append(json_data)
-                results[note_number] = True
-            else:
-                results[note_number] = False
-            import time
-            time.sleep(1)
+        for event in self.iter_notes(trial_balance_path):
+            note_number = event["note_number"]
+            if event["success"]:
+                all_notes.append(event["note"])
+            results[note_number] = event["success"]
+            if on_note_done:
+                on_note_done(note_number, event["success"], event["total"])
+            if on_note_event:
+                on_note_event(event)
 
         # Save all notes in one file
-        output_dir = "generated_notes"
         Path(output_dir).mkdir(parents=True, exist_ok=True)
         with open(f"{output_dir}/notes.json", "w", encoding="utf-8") as f:
             json.dump({"notes": all_notes}, f, indent=2, ensure_ascii=False)
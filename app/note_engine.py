@@ -0,0 +1,251 @@
+import re
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from app.utils import clean_value, to_lakhs
+
+
+@lru_cache(maxsize=1024)
+def keyword_pattern(keywords):
+    """One compiled alternation matching any of the (lowercased) keywords as a substring."""
+    return re.compile("|".join(re.escape(kw.lower()) for kw in keywords))
+
+
+class NoteFrame:
+    """
+    A trial balance prepared once for calculate_note(): account names stripped
+    and lowercased, amounts parsed with clean_value() and groups read out, all
+    as columns. Each query is then two vectorized str.contains() calls (keywords,
+    exclude) over the lowercased names and a NumPy sum of the matched amounts,
+    instead of an iterrows() loop over a fillna(0) copy of the frame.
+    """
+
+    def __init__(self, df, account_col, balance_col):
+        self.account_col = account_col
+        self.balance_col = balance_col
+        # str() of the fillna(0) value, as the row loop read it
+        self.accounts = df[account_col].fillna(0).astype(str).reset_index(drop=True)
+        self.names = self.accounts.str.strip().str.lower()
+        self.amounts = np.zeros(len(df))
+        if balance_col is not None:
+            balances = df[balance_col].fillna(0)
+            if balances.dtype.kind in "biuf":
+                self.amounts = balances.to_numpy(dtype=float)
+            else:
+                self.amounts = np.fromiter(map(clean_value, balances), dtype=float, count=len(balances))
+        self.groups = df["group"].fillna(0).tolist() if "group" in df.columns else None
+
+    def __len__(self):
+        return len(self.names)
+
+    def mask(self, keywords, exclude=None):
+        """Rows whose lowercased name contains a keyword and no exclude word."""
+        if not keywords or not len(self):
+            return np.zeros(len(self), dtype=bool)
+        hit = self.names.str.contains(keyword_pattern(tuple(keywords)), regex=True).to_numpy(dtype=bool)
+        if exclude:
+            hit &= ~self.names.str.contains(keyword_pattern(tuple(exclude)), regex=True).to_numpy(dtype=bool)
+        return hit
+
+    def total(self, rows):
+        """Sum of the amounts at the row positions (in row order); 0 when there are none."""
+        selected = self.amounts[rows]
+        if not len(selected):
+            return 0
+        # Running sum in row order, as the loop added them (np.sum's pairwise
+        # order can differ in the last bit)
+        return float(np.cumsum(selected)[-1])
+
+    def matched_accounts(self, rows, with_lakhs=True):
+        accounts = self.accounts.take(rows).tolist()
+        amounts = self.amounts[rows].tolist()
+        groups = [self.groups[i] for i in rows] if self.groups is not None else ["Unknown"] * len(rows)
+        matched = []
+        for account, amount, group in zip(accounts, amounts, groups):
+            entry = {'account': account, 'amount': amount}
+            if with_lakhs:
+                entry['amount_lakhs'] = to_lakhs(amount)
+            entry['group'] = group
+            matched.append(entry)
+        return matched
+
+    def result(self, rows, with_lakhs=True):
+        """{'total', 'matched_accounts'} for the row positions, as calculate_note returns them."""
+        return {'total': self.total(rows), 'matched_accounts': self.matched_accounts(rows, with_lakhs)}
+
+    def calculate(self, keywords, exclude=None, with_lakhs=True):
+        """{'total', 'matched_accounts'} for one keyword query, as calculate_note returns them."""
+        return self.result(np.flatnonzero(self.mask(keywords, exclude)), with_lakhs)
+
+
+class KeywordAutomaton:
+    """
+    Finds every keyword contained in a (lowercased) name in one left-to-right
+    scan. A zero-width lookahead over the keywords, longest first, reports the
+    longest keyword starting at each position; any other keyword starting
+    there is a prefix of it, so each hit is expanded to every keyword that is
+    a substring of the one found.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        ids = {kw: i for i, kw in enumerate(self.keywords)}
+        ordered = sorted(self.keywords, key=len, reverse=True)
+        self._regex = re.compile("(?=(%s))" % "|".join(re.escape(kw) for kw in ordered)) if ordered else None
+        self._implied = {
+            kw: frozenset(ids[other] for other in self.keywords if other in kw)
+            for kw in self.keywords
+        }
+
+    def find(self, name):
+        """Ids of the keywords contained in name."""
+        if self._regex is None:
+            return frozenset()
+        found = set()
+        for match in self._regex.finditer(name):
+            found |= self._implied[match.group(1)]
+        return found
+
+
+class NoteIndex:
+    """
+    Every keyword query of a note run answered from one scan of the trial
+    balance. targets maps a key (e.g. (note, line)) to its (keywords, exclude);
+    all their keywords go into one KeywordAutomaton and each distinct account
+    name is scanned once, giving the targets it belongs to. The result is a
+    sparse account x target membership (the sorted row positions of each
+    target), and a target's total and matched accounts are grouped over it.
+    """
+
+    def __init__(self, frame, targets):
+        self.frame = frame
+        keyword_ids = {}
+        includes = []
+        excludes = []
+        for keywords, exclude in targets.values():
+            includes.append({keyword_ids.setdefault(kw.lower(), len(keyword_ids)) for kw in keywords})
+            excludes.append({keyword_ids.setdefault(kw.lower(), len(keyword_ids)) for kw in exclude or ()})
+        automaton = KeywordAutomaton(keyword_ids)
+        included_by = [[] for _ in keyword_ids]
+        excluded_by = [[] for _ in keyword_ids]
+        for target, (include, exclude) in enumerate(zip(includes, excludes)):
+            for kw in include:
+                included_by[kw].append(target)
+            for kw in exclude:
+                excluded_by[kw].append(target)
+
+        # One scan over the distinct names: the targets each name belongs to
+        codes, names = pd.factorize(frame.names, sort=False)
+        members = [[] for _ in targets]
+        for code, name in enumerate(names):
+            found = automaton.find(name)
+            if not found:
+                continue
+            hit = {target for kw in found for target in included_by[kw]}
+            if not hit:
+                continue
+            hit.difference_update(target for kw in found for target in excluded_by[kw])
+            for target in hit:
+                members[target].append(code)
+
+        # Rows grouped by name, to expand name membership to row positions
+        order = np.argsort(codes, kind="stable")
+        bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(names)))))
+        self.rows = {}
+        for key, codes_of_target in zip(targets, members):
+            if codes_of_target:
+                rows = np.concatenate([order[bounds[c]:bounds[c + 1]] for c in codes_of_target])
+                rows.sort()
+            else:
+                rows = np.zeros(0, dtype=np.intp)
+            self.rows[key] = rows
+
+    def __contains__(self, key):
+        return key in self.rows
+
+    def total(self, key):
+        return self.frame.total(self.rows[key])
+
+    def result(self, key, with_lakhs=True):
+        """{'total', 'matched_accounts'} of one target, as calculate_note returns them."""
+        return self.frame.result(self.rows[key], with_lakhs)
+
+
+def query_signature(keywords, exclude=None):
+    """
+    Normalized (keywords, exclude) of a query: matching is case-insensitive and
+    order-free, so ['Equipment', 'equipment'] and ['equipment'] are one query.
+    """
+    return (
+        tuple(sorted({kw.lower() for kw in keywords})),
+        tuple(sorted({kw.lower() for kw in exclude or ()})),
+    )
+
+
+class NoteQueries:
+    """
+    Per-run memo of calculate_note queries over one NoteFrame, keyed by
+    query_signature(). The queries known up front (planned) are matched
+    together in one NoteIndex; any other query costs one mask scan the first
+    time it is asked. Repeats of a query are answered from the memo.
+    """
+
+    def __init__(self, frame, planned=()):
+        self.frame = frame
+        self.queries = 0
+        self.cache_hits = 0
+        self.scans = 0
+        self._rows = {}
+        self._results = {}
+        targets = {}
+        for keywords, exclude in planned:
+            targets.setdefault(query_signature(keywords, exclude), (keywords, exclude))
+        self._index = NoteIndex(frame, targets) if targets else None
+        self.indexed = len(targets)
+
+    @property
+    def balance_col(self):
+        return self.frame.balance_col
+
+    def rows(self, keywords, exclude=None):
+        """Row positions matching the query."""
+        self.queries += 1
+        key = query_signature(keywords, exclude)
+        rows = self._rows.get(key)
+        if rows is not None:
+            self.cache_hits += 1
+            return rows
+        if self._index is not None and key in self._index:
+            rows = self._index.rows[key]
+        else:
+            self.scans += 1
+            rows = np.flatnonzero(self.frame.mask(keywords, exclude))
+        self._rows[key] = rows
+        return rows
+
+    def total(self, keywords, exclude=None):
+        return self.frame.total(self.rows(keywords, exclude))
+
+    def calculate(self, keywords, exclude=None, with_lakhs=True):
+        """{'total', 'matched_accounts'} for one query, as calculate_note returns them."""
+        rows = self.rows(keywords, exclude)
+        key = (query_signature(keywords, exclude), with_lakhs)
+        result = self._results.get(key)
+        if result is None:
+            result = self._results[key] = self.frame.result(rows, with_lakhs)
+        # Callers may update the dict (e.g. a note's own total); the account entries are shared
+        return {'total': result['total'], 'matched_accounts': list(result['matched_accounts'])}
+
+    def stats(self):
+        """Queries asked this run and the full trial balance scans they did not need."""
+        return {
+            "queries": self.queries,
+            "distinct_queries": len(self._rows),
+            "cache_hits": self.cache_hits,
+            "indexed_queries": self.indexed,
+            "index_scans": int(self._index is not None),
+            "mask_scans": self.scans,
+            "scans_avoided": self.queries - self.scans - int(self._index is not None),
+        }
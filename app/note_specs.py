@@ -0,0 +1,298 @@
+import ast
+import hashlib
+import json
+import os
+import re
+import threading
+
+from app.note_engine import query_signature
+from app.utils import to_lakhs
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NOTE_SPECS_FILE = os.getenv("NOTE_SPECS_FILE", os.path.join(PROJECT_ROOT, "config", "note_specs.json"))
+DEFAULT_COLUMNS = ["Particulars", "March 31, 2024", "March 31, 2023"]
+# A layout row that is drawn as a table separator line
+SEPARATOR_ROW = "---"
+# Roles of the rows of a note table
+ROW_ROLES = ("header", "heading", "line", "total", "separator")
+# A literal amount cell such as '757.0' or '1,037.59'
+_NUMBER = re.compile(r"^-?\d[\d,]*(\.\d+)?$")
+
+# Functions a spec expression may call
+EXPRESSION_FUNCTIONS = {"lakhs": to_lakhs, "abs": abs, "round": round, "min": min, "max": max}
+_EXPRESSION_NODES = (
+    ast.Expression, ast.BinOp, ast.UnaryOp, ast.Name, ast.Load, ast.Constant, ast.Call,
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.USub, ast.UAdd,
+)
+
+
+class NoteSpecError(ValueError):
+    pass
+
+
+def compile_expression(text, names, where):
+    """
+    Compile a spec formula such as 'opening_stock + purchases - closing_stock'.
+    Only arithmetic, numbers, the given names and EXPRESSION_FUNCTIONS are allowed.
+    """
+    try:
+        tree = ast.parse(str(text).strip(), mode="eval")
+    except SyntaxError as e:
+        raise NoteSpecError(f"{where}: invalid expression {text!r}: {e.msg}") from None
+    for node in ast.walk(tree):
+        if not isinstance(node, _EXPRESSION_NODES):
+            raise NoteSpecError(f"{where}: {type(node).__name__} is not allowed in {text!r}")
+        if isinstance(node, ast.Constant) and not isinstance(node.value, (int, float)):
+            raise NoteSpecError(f"{where}: only numbers are allowed as constants in {text!r}")
+        if isinstance(node, ast.Call):
+            if not isinstance(node.func, ast.Name) or node.func.id not in EXPRESSION_FUNCTIONS or node.keywords:
+                raise NoteSpecError(f"{where}: unknown function in {text!r}")
+        elif isinstance(node, ast.Name) and node.id not in names and node.id not in EXPRESSION_FUNCTIONS:
+            raise NoteSpecError(f"{where}: unknown name {node.id!r} in {text!r}")
+    return compile(tree, where, "eval")
+
+
+def _evaluate(code, env):
+    return eval(code, {"__builtins__": {}, **EXPRESSION_FUNCTIONS}, env)
+
+
+def _compile_template(value, names, where):
+    """A breakdown value: strings starting with '=' become formulas, dicts are compiled field by field."""
+    if isinstance(value, dict):
+        return {key: _compile_template(item, names, f"{where}.{key}") for key, item in value.items()}
+    if isinstance(value, str) and value.startswith("="):
+        return compile_expression(value[1:], names, where)
+    return value
+
+
+def _fill_template(template, env):
+    if isinstance(template, dict):
+        return {key: _fill_template(item, env) for key, item in template.items()}
+    if hasattr(template, "co_code"):
+        return _evaluate(template, env)
+    return template
+
+
+def _literal_cell(text, numeric):
+    """(value, text) of a literal cell; amount columns hold numbers where the text is one."""
+    text = str(text)
+    if numeric and _NUMBER.match(text.strip()):
+        return float(text.replace(',', '')), text
+    return text, text
+
+
+def _row_role(particulars, cells):
+    if particulars.startswith("Total"):
+        return "total"
+    if all(isinstance(cell, tuple) and cell[1] == "" for cell in cells[1:]):
+        return "heading"
+    return "line"
+
+
+class TableRow:
+    """
+    One row of a note table: its role, the cell values (numbers for amounts,
+    text otherwise, particulars without markdown) and their markdown texts.
+    """
+
+    __slots__ = ("role", "values", "texts", "bold")
+
+    def __init__(self, role, values=(), texts=None, bold=False):
+        self.role = role
+        self.values = list(values)
+        self.texts = list(texts if texts is not None else map(str, self.values))
+        self.bold = bold
+
+    def markdown(self, width):
+        if self.role == "separator":
+            return "|" + "---|" * width
+        texts = list(self.texts)
+        if self.bold and texts:
+            texts[0] = f"**{texts[0]}**"
+        return "| " + " | ".join(texts) + " |"
+
+    def table_data(self):
+        """The row as a notes_output.json table_data entry."""
+        values = self.values + [""] * (3 - len(self.values))
+        return {"particulars": values[0], "current_year": values[1], "previous_year": values[2], "role": self.role}
+
+
+class NoteTable:
+    """A rendered note: its rows (header first), with the text above and below them."""
+
+    def __init__(self, columns, rows, preamble="", footer=""):
+        self.width = len(columns)
+        self.rows = [TableRow("header", columns), *rows]
+        self.preamble = preamble
+        self.footer = footer
+
+    def markdown(self):
+        lines = [self.rows[0].markdown(self.width), "|" + "---|" * self.width]
+        lines += [row.markdown(self.width) for row in self.rows[1:]]
+        content = "\n" + (f"{self.preamble}\n\n" if self.preamble else "") + "\n".join(lines) + "\n"
+        if self.footer:
+            content += f"\n{self.footer}"
+        return content
+
+    def table_data(self):
+        """table_data rows; separators only draw lines and are left out."""
+        return [row.table_data() for row in self.rows if row.role != "separator"]
+
+
+class CompiledNote:
+    """
+    One note of the spec file, with its formulas compiled:
+
+    - keywords: the accounts the note totals ('matched')
+    - lines: name -> keywords of each breakdown line (its total)
+    - total: formula for the note total (default 'matched')
+    - values: further named formulas, evaluated in order
+    - columns / rows: the table; a cell starting with '=' is a formula, shown as str(value).
+      A row is a list of cells, '---' for a separator line or {"role", "cells"}
+      to set its role (otherwise 'total', 'heading' or 'line' from its cells)
+    - preamble / footer: text above and below the table
+    - breakdown: the note's "breakdown" object; '=' strings are formulas
+    """
+
+    def __init__(self, spec, default_columns):
+        self.name = spec["name"]
+        where = self.name
+        self.keywords = list(spec["keywords"])
+        self.exclude = list(spec.get("exclude", [])) or None
+        self.depends_on = list(spec.get("depends_on", []))
+        self.lines = {line: list(keywords) for line, keywords in spec.get("lines", {}).items()}
+
+        names = {"matched", *self.lines}
+        self.total = compile_expression(spec.get("total", "matched"), names, f"{where}.total")
+        names.add("total")
+        self.values = []
+        for value_name, formula in spec.get("values", {}).items():
+            self.values.append((value_name, compile_expression(formula, names, f"{where}.values.{value_name}")))
+            names.add(value_name)
+
+        title = self.name.split('.', 1)[1].strip() if '.' in self.name else self.name
+        self.columns = list(spec.get("columns", default_columns))
+        # (role, bold, cells): each cell a compiled formula or a literal (value, text)
+        self.rows = []
+        for i, row in enumerate(spec.get("rows", [[title, "=lakhs(total)", "-"]])):
+            if row == SEPARATOR_ROW:
+                self.rows.append(("separator", False, []))
+                continue
+            role = None
+            if isinstance(row, dict):
+                role, row = row.get("role"), row["cells"]
+                if role not in ROW_ROLES:
+                    raise NoteSpecError(f"{where}.rows[{i}]: unknown role {role!r}")
+            particulars = str(row[0]) if row else ""
+            bold = len(particulars) > 4 and particulars.startswith("**") and particulars.endswith("**")
+            if bold:
+                particulars = particulars[2:-2]
+            cells = [(particulars, particulars)]
+            for cell in row[1:]:
+                compiled = _compile_template(cell, names, f"{where}.rows[{i}]")
+                cells.append(compiled if hasattr(compiled, "co_code") else _literal_cell(compiled, numeric=True))
+            self.rows.append((role or _row_role(particulars, cells), bold, cells))
+        self.preamble = spec.get("preamble", "")
+        self.footer = spec.get("footer", "")
+        self.breakdown = _compile_template(spec.get("breakdown", {}), names, f"{where}.breakdown")
+
+    def queries(self):
+        """The (keywords, exclude) queries this note asks."""
+        return [(self.keywords, self.exclude), *((keywords, None) for keywords in self.lines.values())]
+
+    def evaluate(self, queries, result):
+        """
+        Named values of the note for a run's NoteQueries and its keyword result;
+        result['total'] becomes the note total.
+        """
+        env = {"matched": result['total']}
+        for line, keywords in self.lines.items():
+            env[line] = queries.total(keywords)
+        env["total"] = result['total'] = _evaluate(self.total, env)
+        for value_name, code in self.values:
+            env[value_name] = _evaluate(code, env)
+        return env
+
+    def render(self, env):
+        """(NoteTable, special_data) of the evaluated note."""
+        rows = []
+        for role, bold, cells in self.rows:
+            values, texts = [], []
+            for cell in cells:
+                if isinstance(cell, tuple):
+                    value, text = cell
+                else:
+                    value = _evaluate(cell, env)
+                    text = str(value)
+                values.append(value)
+                texts.append(text)
+            rows.append(TableRow(role, values, texts, bold))
+        table = NoteTable(self.columns, rows, self.preamble, self.footer)
+        special_data = {"breakdown": _fill_template(self.breakdown, env)} if self.breakdown else {}
+        return table, special_data
+
+
+class NotePlan:
+    """
+    The compiled spec file: its notes in order and every distinct keyword
+    query they ask, so a run can match them all in one NoteIndex scan. One
+    plan per spec hash is shared by every trial balance the process handles.
+    """
+
+    def __init__(self, specs, spec_hash):
+        self.spec_hash = spec_hash
+        default_columns = specs.get("columns", DEFAULT_COLUMNS)
+        self.notes = {}
+        for spec in specs["notes"]:
+            note = CompiledNote(spec, default_columns)
+            if note.name in self.notes:
+                raise NoteSpecError(f"Note {note.name!r} is defined twice")
+            self.notes[note.name] = note
+        # plan_notes() input
+        self.mappings = {
+            name: {"keywords": note.keywords, "depends_on": note.depends_on} for name, note in self.notes.items()
+        }
+
+    def queries(self, note_names=None):
+        """Distinct (keywords, exclude) queries of the notes (all by default)."""
+        distinct = {}
+        for name in self.notes if note_names is None else note_names:
+            for keywords, exclude in self.notes[name].queries():
+                distinct.setdefault(query_signature(keywords, exclude), (keywords, exclude))
+        return list(distinct.values())
+
+
+_plans = {}
+_loaded = {}
+_plans_lock = threading.Lock()
+
+
+def get_note_plan(path=NOTE_SPECS_FILE):
+    """
+    The NotePlan of a spec file. The file is re-read when it changes on disk
+    and compiled once per content hash; if an edited file does not compile,
+    the last good plan is kept.
+    """
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _plans_lock:
+        loaded = _loaded.get(path)
+        if loaded is not None and loaded[0] == stamp:
+            return loaded[1]
+        with open(path, "rb") as f:
+            data = f.read()
+        spec_hash = hashlib.sha256(data).hexdigest()
+        plan = _plans.get(spec_hash)
+        if plan is None:
+            try:
+                plan = NotePlan(json.loads(data), spec_hash)
+            except (ValueError, KeyError, TypeError) as e:
+                if loaded is None:
+                    raise
+                print(f"⚠️ Note spec reload failed, keeping {loaded[1].spec_hash[:12]}: {e}")
+                _loaded[path] = (stamp, loaded[1])
+                return loaded[1]
+            _plans[spec_hash] = plan
+            print(f"🧩 Compiled {len(plan.notes)} note specs ({spec_hash[:12]})")
+        _loaded[path] = (stamp, plan)
+        return plan
@@ -1,30 +1,29 @@
-from app.utils import clean_value, to_lakhs
+from app.note_engine import NoteFrame, NoteQueries
+from app.utils import to_lakhs, note_matches, plan_notes
 
-def calculate_note(df, note_name, keywords, exclude=None, other_df=None):
+def note_frame(df):
+    """
+    NoteFrame over the account and balance columns calculate_note reads. An
+    existing NoteFrame, or a run's NoteQueries, is used as it is.
+    """
+    if isinstance(df, (NoteFrame, NoteQueries)):
+        return df
     if 'account_name' in df.columns:
         account_col = 'account_name'
         balance_col = 'amount'
     else:
         account_col = df.columns[0]
         balance_col = df.columns[1] if len(df.columns) > 1 else None
+    return NoteFrame(df, account_col, balance_col)
 
-    if not balance_col:
+def calculate_note(df, note_name, keywords, exclude=None, other_df=None):
+    frame = note_frame(df)
+    if not frame.balance_col:
         return {'total': 0}
 
-    df = df.fillna(0)
-    total = 0
-    matched_accounts = []
-
-    for idx, row in df.iterrows():
-        account_name = str(row[account_col]).strip().lower()
-        if any(kw.lower() in account_name for kw in keywords) and (not exclude or not any(ex.lower() in account_name for ex in exclude)):
-            amount = clean_value(row[balance_col])
-            total += amount
-            matched_accounts.append({
-                'account': str(row[account_col]),
-                'amount': amount,
-                'group': row.get('group', 'Unknown') if 'group' in df.columns else 'Unknown'
-            })
+    result = frame.calculate(keywords, exclude, with_lakhs=False)
+    total = result['total']
+    matched_accounts = result['matched_accounts']
 
     # Special case for Trade Receivables
     if other_df is not None and note_name == '12. Trade Receivables':
@@ -41,36 +40,48 @@ def calculate_note(df, note_name, keywords, exclude=None, other_df=None):
 
     return {'total': total, 'matched_accounts': matched_accounts}
 
-def generate_notes(tb_df, debtors_df=None, creditors_df=None):
+# A note may name other notes under 'depends_on' to have plan_notes() compute them
+# first. Every note below still reads its lines straight from the trial balance
+# (Financial Ratios included), so none declares one yet.
+NOTE_MAPPINGS = {
+    '2. Share Capital': {'keywords': ['Share Capital', 'share capital', 'equity share', 'paid up']},
+    '3. Reserves and Surplus': {'keywords': ['Reserves', 'Surplus', 'reserves', 'surplus', 'retained earnings']},
+    '4. Long Term Borrowings': {'keywords': ['loan', 'borrowing', 'term loan'], 'exclude': ['current maturities', 'short term']},
+    '5. Deferred Tax Liability': {'keywords': ['Deferred Tax', 'deferred tax']},
+    '6. Trade Payables': {'keywords': ['Creditors', 'creditors', 'trade payable', 'suppliers']},
+    '7. Other Current Liabilities': {'keywords': ['Expenses Payable', 'Current Maturities', 'payable', 'accrued']},
+    '8. Short Term Provisions': {'keywords': ['Provision', 'provision', 'taxation']},
+    '9. Fixed Assets': {'keywords': ['Equipment', 'Furniture', 'Building', 'Vehicle', 'Motor', 'Asset', 'plant', 'machinery']},
+    '10. Long Term Loans and Advances': {'keywords': ['Long Term', 'Security Deposits', 'advances', 'deposits']},
+    '11. Inventories': {'keywords': ['Stock', 'Inventory', 'stock', 'inventory', 'goods']},
+    '12. Trade Receivables': {'keywords': ['Receivables', 'receivables', 'debtors', 'trade receivable']},
+    '13. Cash and Bank Balances': {'keywords': ['Cash-in-hand', 'Bank accounts','Deposits']},
+    '14. Short Term Loans and Advances': {'keywords': ['Prepaid Expenses', 'TDS Receivables', 'Loans & Advances', 'TCS RECEIVABLES', 'TDS Advance Tax Paid', 'Advance to Perennail']},
+    '15. Other Current Assets': {'keywords': ['Interest accrued', 'accrued', 'current asset']},
+    '16. Revenue from Operations': {'keywords': ['Revenue', 'Sales', 'Service', 'income', 'operations']},
+    '17. Other Income': {'keywords': ['Interest on FD', 'Interest on Income Tax Refund', 'Unadjusted Forex Gain/Loss', 'Forex Gain / Loss']},
+    '18. Cost of Materials Consumed': {'keywords': ['opening stock', 'Bio Lab Consumables', 'Non GST', 'Purchase GST','closing stock']},
+    '28. Earnings per Share': {'keywords': ['Profit', 'Loss', 'profit', 'loss']},
+    '29. Related Party Disclosures': {'keywords': []},
+    '30. Financial Ratios': {'keywords': ['Stock', 'Cash', 'Bank', 'Receivables', 'Creditors', 'Payable']}
+}
+
+def generate_notes(tb_df, debtors_df=None, creditors_df=None, requested_notes=None):
+    """
+    Build the notes from a parsed trial balance. requested_notes (e.g. ['13', '16'])
+    limits the work to those notes and their 'depends_on' notes; by default all are built.
+    """
     notes = []
-    note_mappings = {
-        '2. Share Capital': {'keywords': ['Share Capital', 'share capital', 'equity share', 'paid up']},
-        '3. Reserves and Surplus': {'keywords': ['Reserves', 'Surplus', 'reserves', 'surplus', 'retained earnings']},
-        '4. Long Term Borrowings': {'keywords': ['loan', 'borrowing', 'term loan'], 'exclude': ['current maturities', 'short term']},
-        '5. Deferred Tax Liability': {'keywords': ['Deferred Tax', 'deferred tax']},
-        '6. Trade Payables': {'keywords': ['Creditors', 'creditors', 'trade payable', 'suppliers']},
-        '7. Other Current Liabilities': {'keywords': ['Expenses Payable', 'Current Maturities', 'payable', 'accrued']},
-        '8. Short Term Provisions': {'keywords': ['Provision', 'provision', 'taxation']},
-        '9. Fixed Assets': {'keywords': ['Equipment', 'Furniture', 'Building', 'Vehicle', 'Motor', 'Asset', 'plant', 'machinery']},
-        '10. Long Term Loans and Advances': {'keywords': ['Long Term', 'Security Deposits', 'advances', 'deposits']},
-        '11. Inventories': {'keywords': ['Stock', 'Inventory', 'stock', 'inventory', 'goods']},
-        '12. Trade Receivables': {'keywords': ['Receivables', 'receivables', 'debtors', 'trade receivable']},
-        '13. Cash and Bank Balances': {'keywords': ['Cash-in-hand', 'Bank accounts','Deposits']},
-        '14. Short Term Loans and Advances': {'keywords': ['Prepaid Expenses', 'TDS Receivables', 'Loans & Advances', 'TCS RECEIVABLES', 'TDS Advance Tax Paid', 'Advance to Perennail']},
-        '15. Other Current Assets': {'keywords': ['Interest accrued', 'accrued', 'current asset']},
-        '16. Revenue from Operations': {'keywords': ['Revenue', 'Sales', 'Service', 'income', 'operations']},
-        '17. Other Income': {'keywords': ['Interest on FD', 'Interest on Income Tax Refund', 'Unadjusted Forex Gain/Loss', 'Forex Gain / Loss']},
-        '18. Cost of Materials Consumed': {'keywords': ['opening stock', 'Bio Lab Consumables', 'Non GST', 'Purchase GST','closing stock']},
-        '28. Earnings per Share': {'keywords': ['Profit', 'Loss', 'profit', 'loss']},
-        '29. Related Party Disclosures': {'keywords': []},
-        '30. Financial Ratios': {'keywords': ['Stock', 'Cash', 'Bank', 'Receivables', 'Creditors', 'Payable']}
-    }
+    plan = plan_notes(NOTE_MAPPINGS, requested_notes)
+    planned = [(NOTE_MAPPINGS[name]['keywords'], NOTE_MAPPINGS[name].get('exclude', [])) for name in plan]
+    tb = NoteQueries(note_frame(tb_df), planned)
 
-    for note_name, mapping in note_mappings.items():
+    for note_name in plan:
+        mapping = NOTE_MAPPINGS[note_name]
         keywords = mapping['keywords']
         exclude = mapping.get('exclude', [])
         other_df = debtors_df if note_name == '12. Trade Receivables' else creditors_df if note_name == '6. Trade Payables' else None
-        result = calculate_note(tb_df, note_name, keywords, exclude, other_df)
+        result = calculate_note(tb, note_name, keywords, exclude, other_df)
 
         content = ""
         if note_name == '2. Share Capital':
@@ -104,8 +115,8 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 | {note_name.split('.', 1)[1].strip() if '.' in note_name else note_name}                                 | {to_lakhs(result['total'])}  
 """
         elif note_name == '7. Other Current Liabilities':
-            expenses_payable = calculate_note(tb_df, note_name, ['Expenses Payable', 'payable', 'accrued'])['total']
-            current_maturities = calculate_note(tb_df, note_name, ['Current Maturities', 'current portion'])['total']
+            expenses_payable = calculate_note(tb, note_name, ['Expenses Payable', 'payable', 'accrued'])['total']
+            current_maturities = calculate_note(tb, note_name, ['Current Maturities', 'current portion'])['total']
             statutory_dues = 7935166.72  # Static value
             content = f"""
                                              | March,31 2024  | March,31 2023         
@@ -121,10 +132,10 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 | {note_name.split('.', 1)[1].strip() if '.' in note_name else note_name}                          | {to_lakhs(result['total'])}  
 """
         elif note_name == '9. Fixed Assets':
-            equipments = calculate_note(tb_df, note_name, ['Equipment', 'equipment'])['total']
-            furniture = calculate_note(tb_df, note_name, ['Furniture', 'furniture', 'fixture'])['total']
-            building = calculate_note(tb_df, note_name, ['Building', 'building'])['total']
-            vehicle = calculate_note(tb_df, note_name, ['Vehicle', 'vehicle', 'car'])['total']
+            equipments = calculate_note(tb, note_name, ['Equipment', 'equipment'])['total']
+            furniture = calculate_note(tb, note_name, ['Furniture', 'furniture', 'fixture'])['total']
+            building = calculate_note(tb, note_name, ['Building', 'building'])['total']
+            vehicle = calculate_note(tb, note_name, ['Vehicle', 'vehicle', 'car'])['total']
             content = f"""
 | Particulars | Gross Carrying Value | Accumulated Depreciation | Net Carrying Value |
 |-------------|----------------------|--------------------------|--------------------|
@@ -150,9 +161,9 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 | Total | {to_lakhs(result['total'])} | {to_lakhs(103758506)} |
 """
         elif note_name == '13. Cash and Bank Balances':
-            cash_in_hand = calculate_note(tb_df, note_name, ['Cash-in-hand'])['total']
-            bank_accounts = calculate_note(tb_df, note_name, ['Bank accounts'])['total']
-            fixed_deposit = calculate_note(tb_df, note_name, ['Deposits'])['total']
+            cash_in_hand = calculate_note(tb, note_name, ['Cash-in-hand'])['total']
+            bank_accounts = calculate_note(tb, note_name, ['Bank accounts'])['total']
+            fixed_deposit = calculate_note(tb, note_name, ['Deposits'])['total']
             total = cash_in_hand + bank_accounts + fixed_deposit
             content = f"""
 | Particulars      | March 31, 2024 | March 31, 2023 |
@@ -164,10 +175,10 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 """
             result['total'] = total
         elif note_name == '14. Short Term Loans and Advances':
-            otherAdvances = calculate_note(tb_df, note_name, ['Loans & Advances'])['total']
-            PrepaidExpenses = calculate_note(tb_df, note_name, ['Prepaid Expenses'])['total']
-            advancetaxes = calculate_note(tb_df, note_name, ['TDS Advance Tax Paid'])['total']
-            balances = calculate_note(tb_df, note_name, ['TDS Receivables'])['total']
+            otherAdvances = calculate_note(tb, note_name, ['Loans & Advances'])['total']
+            PrepaidExpenses = calculate_note(tb, note_name, ['Prepaid Expenses'])['total']
+            advancetaxes = calculate_note(tb, note_name, ['TDS Advance Tax Paid'])['total']
+            balances = calculate_note(tb, note_name, ['TDS Receivables'])['total']
             total = otherAdvances + PrepaidExpenses + advancetaxes + balances
             content = f"""
 | Particulars      | March 31, 2024 | March 31, 2023 |
@@ -180,14 +191,14 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 """
             result['total'] = total
         elif note_name == '16. Revenue from Operations':
-            ServicingBABEExport = calculate_note(tb_df, note_name, ['Servicing of BA/BE PROJECTS EXPORT'])['total']
-            WorkingStandardsExport = calculate_note(tb_df, note_name, ['Working Standards - Export'])['total']
+            ServicingBABEExport = calculate_note(tb, note_name, ['Servicing of BA/BE PROJECTS EXPORT'])['total']
+            WorkingStandardsExport = calculate_note(tb, note_name, ['Working Standards - Export'])['total']
             exports = ServicingBABEExport + WorkingStandardsExport
 
-            ServicingBABEInterState = calculate_note(tb_df, note_name, ['Servicing of BA/BE PROJECTS-Inter State'])['total']
-            ServicingBABEIntraState = calculate_note(tb_df, note_name, ['Servicing of BA/BE PROJECTS-Intra State'])['total']
-            ServicingBAIntraState = calculate_note(tb_df, note_name, ['SERVICING OF BA PROJECTS-Intra State'])['total']
-            ServicingClinicalIntraState = calculate_note(tb_df, note_name, ['SERVICING OF ONLY CLINICAL INTRA STATE'])['total']
+            ServicingBABEInterState = calculate_note(tb, note_name, ['Servicing of BA/BE PROJECTS-Inter State'])['total']
+            ServicingBABEIntraState = calculate_note(tb, note_name, ['Servicing of BA/BE PROJECTS-Intra State'])['total']
+            ServicingBAIntraState = calculate_note(tb, note_name, ['SERVICING OF BA PROJECTS-Intra State'])['total']
+            ServicingClinicalIntraState = calculate_note(tb, note_name, ['SERVICING OF ONLY CLINICAL INTRA STATE'])['total']
             domestic = ServicingBABEInterState + ServicingBABEIntraState + ServicingBAIntraState + ServicingClinicalIntraState
 
             total = exports + domestic
@@ -202,10 +213,10 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 """
             result['total'] = total
         elif note_name == '17. Other Income':
-            InterestnFD = calculate_note(tb_df, note_name, ['Interest on FD'])['total']
-            InterestonIncomeTaxRefund = calculate_note(tb_df, note_name, ['Interest on Income Tax Refund'])['total']
-            UnadjustedForexGainLoss = calculate_note(tb_df, note_name, ['Unadjusted Forex Gain/Loss'])['total']
-            ForexGainLoss = calculate_note(tb_df, note_name, ['Forex Gain/Loss'])['total']
+            InterestnFD = calculate_note(tb, note_name, ['Interest on FD'])['total']
+            InterestonIncomeTaxRefund = calculate_note(tb, note_name, ['Interest on Income Tax Refund'])['total']
+            UnadjustedForexGainLoss = calculate_note(tb, note_name, ['Unadjusted Forex Gain/Loss'])['total']
+            ForexGainLoss = calculate_note(tb, note_name, ['Forex Gain/Loss'])['total']
             Interestincome = InterestnFD + InterestonIncomeTaxRefund
             ForeignexchangeainNet = UnadjustedForexGainLoss + ForexGainLoss
             total = Interestincome + ForeignexchangeainNet
@@ -219,11 +230,11 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 """
             result['total'] = total
         elif note_name == '18. Cost of Materials Consumed':
-            openingstock = calculate_note(tb_df, note_name, ['opening stock'])['total']
-            BioLabConsumables = calculate_note(tb_df, note_name, ['Bio Lab Consumables'])['total']
-            NonGST = calculate_note(tb_df, note_name, ['Non GST'])['total']
-            PurchaseGST = calculate_note(tb_df, note_name, ['Purchase GST'])['total']
-            closingstock = calculate_note(tb_df, note_name, ['closing stock'])['total']
+            openingstock = calculate_note(tb, note_name, ['opening stock'])['total']
+            BioLabConsumables = calculate_note(tb, note_name, ['Bio Lab Consumables'])['total']
+            NonGST = calculate_note(tb, note_name, ['Non GST'])['total']
+            PurchaseGST = calculate_note(tb, note_name, ['Purchase GST'])['total']
+            closingstock = calculate_note(tb, note_name, ['closing stock'])['total']
 
             purchases = BioLabConsumables + NonGST + PurchaseGST
             mid = openingstock + purchases
@@ -240,8 +251,8 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
 """
             result['total'] = total
         elif note_name == '30. Financial Ratios':
-            current_assets = sum(calculate_note(tb_df, note_name, [kw])['total'] for kw in ['Stock', 'Cash', 'Bank', 'Receivables', 'Prepaid'])
-            current_liabilities = sum(calculate_note(tb_df, note_name, [kw])['total'] for kw in ['Creditors', 'Payable'])
+            current_assets = sum(calculate_note(tb, note_name, [kw])['total'] for kw in ['Stock', 'Cash', 'Bank', 'Receivables', 'Prepaid'])
+            current_liabilities = sum(calculate_note(tb, note_name, [kw])['total'] for kw in ['Creditors', 'Payable'])
             current_ratio = current_assets / abs(current_liabilities) if current_liabilities != 0 else 0
             content = f"""
 | Particulars     | 2024-03-31 | 2023-03-31 |
@@ -255,5 +266,10 @@ def generate_notes(tb_df, debtors_df=None, creditors_df=None):
                                                  | March,31 2024  | March,31 2023    
 | {note_name.split('.', 1)[1].strip() if '.' in note_name else note_name}                      | {to_lakhs(result['total'])}  
 """
+        if requested_notes and not note_matches(note_name, {str(n).strip() for n in requested_notes}):
+            continue  # computed only as a dependency of a requested note
         notes.append({'Note': note_name, 'Content': content, 'Total': result['total'], 'Matched_Accounts': len(result.get('matched_accounts', []))})
+
+    query_stats = tb.stats()
+    print(f"🔁 {query_stats['queries']} note queries, {query_stats['scans_avoided']} trial balance scans avoided")
     return notes
\ No newline at end of file
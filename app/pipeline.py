@@ -0,0 +1,290 @@
+import hashlib
+import io
+import json
+import time
+
+import pandas as pd
+
+from app.cache import config_fingerprint, file_sha256, get_result_cache
+from app.classification_metrics import collect_extraction_stats
+from app.executor import run_cpu, run_io
+from app.extract import extract_trial_balance_data
+from app.json_xlsx import json_to_xlsx
+from app.note_specs import get_note_plan
+from app.utils import clean_value, note_matches
+import app.main16_23 as main16_23
+
+
+def content_hash(value):
+    """sha256 of a JSON-serialisable value (bytes are hashed as-is)."""
+    h = hashlib.sha256()
+    if isinstance(value, (bytes, bytearray)):
+        h.update(value)
+    else:
+        h.update(json.dumps(value, sort_keys=True, ensure_ascii=False, default=str).encode())
+    return h.hexdigest()
+
+
+_MISSING = object()
+
+
+class Stage:
+    """
+    One pipeline step: output = func(**inputs). Unless memoize is off, the output
+    is kept in the result cache under a hash of the stage and its input hashes, so
+    a stage whose inputs did not change never runs twice.
+
+    partition names a list input whose items are memoized one by one: func only
+    receives the items that are missing and returns {item: result}.
+    runner is "cpu" (process pool), "io" (thread pool) or "inline" for cheap glue.
+    """
+
+    def __init__(self, name, func, inputs, output, version="1", runner="cpu",
+                 memoize=True, binary=False, partition=None):
+        if partition is not None and partition not in inputs:
+            raise ValueError(f"Stage '{name}': partition '{partition}' is not one of its inputs")
+        self.name = name
+        self.func = func
+        self.inputs = list(inputs)
+        self.output = output
+        self.version = version
+        self.runner = runner
+        self.memoize = memoize
+        self.binary = binary
+        self.partition = partition
+
+    def key(self, hashes, fingerprint, item=None):
+        """Memo key of this stage for the given input hashes (and partition item)."""
+        if item is None:
+            input_hashes = [hashes[name] for name in self.inputs]
+        else:
+            input_hashes = [hashes[name] for name in self.inputs if name != self.partition]
+        payload = [self.name, self.version, fingerprint, input_hashes, item]
+        return hashlib.sha256(json.dumps(payload).encode()).hexdigest()
+
+    @property
+    def artifact(self):
+        return f"{self.output}.bin" if self.binary else f"{self.output}.json"
+
+
+class PipelineRun:
+    """Values and content hashes of one pipeline run, plus which stages ran."""
+
+    def __init__(self):
+        self.values = {}
+        self.hashes = {}
+        self.ran = []
+        self.reused = []
+        self.timings_ms = {}
+
+    @property
+    def cached(self):
+        """True when every stage was answered from the memo."""
+        return not self.ran
+
+    def summary(self):
+        return {"ran": self.ran, "reused": self.reused, "timings_ms": self.timings_ms}
+
+
+class Pipeline:
+    """
+    Small DAG runtime. Stages are wired by name (a stage's inputs are other
+    stages' outputs or values passed to run()), results stay in memory between
+    stages and only the stages needed for the requested targets are run.
+    """
+
+    def __init__(self, stages, cache=None):
+        self.producers = {}
+        for stage in stages:
+            if stage.output in self.producers:
+                raise ValueError(f"'{stage.output}' is produced by more than one stage")
+            self.producers[stage.output] = stage
+        self._cache = cache
+
+    @property
+    def cache(self):
+        return self._cache or get_result_cache()
+
+    def plan(self, targets, available=()):
+        """Stages needed for targets, each after the stages it depends on."""
+        order = []
+        done = set()
+
+        def visit(name, path):
+            if name in available:
+                return
+            stage = self.producers.get(name)
+            if stage is None:
+                raise KeyError(f"No stage produces '{name}'")
+            if stage.name in done:
+                return
+            if stage.name in path:
+                raise ValueError(f"Pipeline cycle at stage '{stage.name}'")
+            for dep in stage.inputs:
+                visit(dep, path | {stage.name})
+            done.add(stage.name)
+            order.append(stage)
+
+        for target in targets:
+            visit(target, frozenset())
+        return order
+
+    async def run(self, inputs, targets, input_hashes=None):
+        """
+        Compute targets from inputs ({name: value}). input_hashes may supply
+        precomputed content hashes (e.g. of an uploaded file) for some inputs.
+        """
+        run = PipelineRun()
+        fingerprint = await run_io(config_fingerprint)
+        for name, value in inputs.items():
+            run.values[name] = value
+            run.hashes[name] = (input_hashes or {}).get(name) or content_hash(value)
+
+        for stage in self.plan(targets, inputs):
+            started = time.perf_counter()
+            if stage.partition:
+                value, reused = await self._run_partitioned(stage, run, fingerprint)
+            else:
+                value, reused = await self._run_stage(stage, run, fingerprint)
+            run.values[stage.output] = value
+            # Memoized outputs are identified by their memo key; cheap glue stages
+            # by their content, so equivalent filters share downstream results
+            run.hashes[stage.output] = (
+                stage.key(run.hashes, fingerprint) if stage.memoize else content_hash(value)
+            )
+            if stage.memoize:
+                (run.reused if reused else run.ran).append(stage.name)
+            run.timings_ms[stage.name] = round((time.perf_counter() - started) * 1000, 1)
+        return run
+
+    def _memo_enabled(self, stage):
+        return stage.memoize and self.cache.enabled
+
+    async def _call(self, stage, kwargs):
+        if stage.runner == "cpu":
+            return await run_cpu(stage.func, **kwargs)
+        if stage.runner == "io":
+            return await run_io(stage.func, **kwargs)
+        return stage.func(**kwargs)
+
+    def _load(self, stage, keys):
+        """Memoized results for keys; a missing key maps to _MISSING."""
+        cache = self.cache
+        results = {}
+        for key in keys:
+            if stage.binary:
+                path = cache.get(key, stage.artifact)
+                data = None
+                if path is not None:
+                    try:
+                        with open(path, "rb") as f:
+                            data = f.read()
+                    except OSError:
+                        pass
+                results[key] = _MISSING if data is None else data
+            else:
+                entry = cache.get_json(key, stage.artifact)
+                results[key] = entry["value"] if isinstance(entry, dict) and "value" in entry else _MISSING
+        return results
+
+    def _store(self, stage, values):
+        cache = self.cache
+        for key, value in values.items():
+            if stage.binary:
+                cache.put_bytes(key, stage.artifact, value)
+            else:
+                cache.put_json(key, stage.artifact, {"value": value})
+
+    async def _run_stage(self, stage, run, fingerprint):
+        memo = self._memo_enabled(stage)
+        key = stage.key(run.hashes, fingerprint)
+        if memo:
+            cached = (await run_io(self._load, stage, [key]))[key]
+            if cached is not _MISSING:
+                return cached, True
+        value = await self._call(stage, {name: run.values[name] for name in stage.inputs})
+        if memo and value is not None:
+            await run_io(self._store, stage, {key: value})
+        return value, False
+
+    async def _run_partitioned(self, stage, run, fingerprint):
+        items = list(run.values[stage.partition] or [])
+        memo = self._memo_enabled(stage)
+        keys = {item: stage.key(run.hashes, fingerprint, item) for item in items}
+        cached = await run_io(self._load, stage, list(keys.values())) if memo else {}
+        results = {item: cached.get(keys[item], _MISSING) for item in items}
+        missing = [item for item in items if results[item] is _MISSING]
+        if missing:
+            kwargs = {name: run.values[name] for name in stage.inputs}
+            kwargs[stage.partition] = missing
+            computed = await self._call(stage, kwargs) or {}
+            for item in missing:
+                results[item] = computed.get(item)
+            if memo:
+                await run_io(self._store, stage, {keys[item]: results[item] for item in missing})
+        return {item: results[item] for item in items}, not missing
+
+
+# --- /hardcoded: trial balance -> main16_23 notes -> notes workbook ---
+
+def extract_records(upload):
+    """Classified trial balance records of an uploaded workbook, with the extraction's classification report."""
+    with collect_extraction_stats() as stats:
+        records = extract_trial_balance_data(upload)
+    return {"records": records, "classification": stats.report()}
+
+
+def extraction_records(extraction):
+    return extraction["records"]
+
+
+def note_plan(note_filter):
+    """Note numbers to build for a filter (None = all), in note table order."""
+    requested = {str(n).strip() for n in note_filter} if note_filter else None
+    return [
+        name.split('.')[0].strip()
+        for name in get_note_plan().notes
+        if requested is None or note_matches(name, requested)
+    ]
+
+
+def notes_by_number(records, note_numbers):
+    """main16_23 notes for note_numbers, keyed by note number."""
+    tb_df = pd.DataFrame(records)
+    if 'amount' in tb_df.columns:
+        tb_df['amount'] = tb_df['amount'].apply(clean_value)
+    document = main16_23.generate_notes(tb_df, requested_notes=note_numbers)
+    return {note['note_number']: note for note in document['notes']}
+
+
+def collect_notes(notes):
+    """{number: note} -> the {"notes": [...]} document json_to_xlsx expects."""
+    return {"notes": [note for note in notes.values() if note is not None]}
+
+
+def render_notes_workbook(notes_json):
+    """Notes workbook as .xlsx bytes, or None if it could not be rendered."""
+    buffer = io.BytesIO()
+    if not json_to_xlsx(notes_json, buffer):
+        return None
+    return buffer.getvalue()
+
+
+NOTES_PIPELINE = Pipeline([
+    Stage("extract", extract_records, ["upload"], "extraction", version="2"),
+    Stage("records", extraction_records, ["extraction"], "records", runner="inline", memoize=False),
+    Stage("note_plan", note_plan, ["note_filter"], "note_numbers", runner="inline", memoize=False),
+    Stage("notes", notes_by_number, ["records", "note_numbers"], "notes", partition="note_numbers"),
+    Stage("collect", collect_notes, ["notes"], "notes_json", runner="inline", memoize=False),
+    Stage("workbook", render_notes_workbook, ["notes_json"], "workbook", binary=True),
+])
+
+
+async def run_notes_pipeline(upload_path, note_filter=None, targets=("workbook",)):
+    """Run NOTES_PIPELINE for an upload; the upload is identified by its content hash."""
+    upload_hash = await run_io(file_sha256, upload_path)
+    return await NOTES_PIPELINE.run(
+        {"upload": upload_path, "note_filter": note_filter},
+        targets,
+        input_hashes={"upload": upload_hash},
+    )
@@ -95,8 +95,13 @@ def format_currency(value):
         return f"{value:,.2f}"
     return "0.00"
 
-def generate_pnl_report():
-    """Generate P&L report in Excel format using data from generated_notes folder."""
+def generate_pnl_report(notes_folder="generated_notes", output_file=None):
+    """
+    Generate P&L report in Excel format using data from generated_notes folder.
+    notes_folder/output_file let a job workspace point at its own notes and report path;
+    output_file may also be a file-like object (e.g. io.BytesIO) to keep the workbook in memory.
+    Returns the path (or buffer) the workbook was saved to, or None.
+    """
     wb = Workbook()
     ws = wb.active
     ws.title = "Profit and Loss Statement"
@@ -132,7 +137,7 @@ def generate_pnl_report():
     # Load all required notes
     notes_data = {}
     for note_num in range(16, 29):  # Notes 16-28
-        notes_data[str(note_num)] = load_note_data(str(note_num))
+        notes_data[str(note_num)] = load_note_data(str(note_num), notes_folder)
 
     # Calculate values
     revenue_2024 = extract_total_from_note(notes_data.get("16"), "2024")
@@ -268,23 +273,26 @@ def generate_pnl_report():
         ws.cell(row=row, column=4).alignment = center_align
 
     # Save Excel file with error handling
-    output_folder = "pnl_excel"
-    os.makedirs(output_folder, exist_ok=True)
-    output_file = os.path.join(output_folder, "pnl_report.xlsx")
+    if output_file is None:
+        output_file = os.path.join("pnl_excel", "pnl_report.xlsx")
+    if isinstance(output_file, str):
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
     try:
         wb.save(output_file)
         print(f"P&L report generated successfully and saved to {output_file}")
-        
+        return output_file
     except PermissionError:
         print(f"PermissionError: Unable to save to {output_file}. Trying alternative location...")
         fallback_file = os.path.join(os.path.expanduser("~"), "Desktop", "pnl_report_fallback.xlsx")
         try:
             wb.save(fallback_file)
             print(f"P&L report saved to alternative location: {fallback_file}")
+            return fallback_file
         except Exception as e:
             print(f"Failed to save P&L report: {str(e)}")
     except Exception as e:
         print(f"Error saving P&L report: {str(e)}")
+    return None
 
 if __name__ == "__main__":
     generate_pnl_report()
\ No newline at end of file
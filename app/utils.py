@@ -31,4 +31,34 @@ def convert_note_json_to_lakhs(note_json):
                 obj[i] = convert(obj[i])
         return obj
 
-    return convert(note_json)
\ No newline at end of file
+    return convert(note_json)
+
+def note_matches(note_name, requested_notes):
+    """True if note_name (e.g. '13. Cash and Bank Balances') is one of the requested notes ('13' or the full name)."""
+    number = note_name.split('.')[0].strip() if '.' in note_name else note_name
+    return number in requested_notes or note_name in requested_notes
+
+
+def plan_notes(note_mappings, requested_notes=None):
+    """
+    Execution plan for generate_notes: the note names to compute, each after the
+    notes it lists under 'depends_on', otherwise in table order. With requested_notes
+    only those notes and their (transitive) dependencies are planned; None or empty
+    means every note.
+    """
+    requested = {str(n).strip() for n in requested_notes} if requested_notes else None
+    plan = []
+    seen = set()
+
+    def visit(name):
+        if name in seen or name not in note_mappings:
+            return
+        seen.add(name)
+        for dep in note_mappings[name].get('depends_on', []):
+            visit(dep)
+        plan.append(name)
+
+    for name in note_mappings:
+        if requested is None or note_matches(name, requested):
+            visit(name)
+    return plan
@@ -0,0 +1,128 @@
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+JOBS_ROOT = os.getenv("JOBS_ROOT", "jobs")
+# Workspaces kept for later job_id requests are removed once unused this long
+WORKSPACE_TTL_HOURS = float(os.getenv("WORKSPACE_TTL_HOURS", "24"))
+# Seconds between sweeps triggered by new workspaces
+WORKSPACE_SWEEP_INTERVAL = 600
+
+# Same folder names the single-user scripts use, scoped under jobs/<job_id>/
+WORKSPACE_FOLDERS = [
+    "input",
+    "output1",
+    "output2",
+    "output3",
+    "generated_notes",
+    "generated_notes_excel",
+    "balancesheet_excel",
+    "pnl_excel",
+    "cashflow_excel",
+]
+
+_JOB_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+_last_sweep = 0.0
+_sweep_lock = threading.Lock()
+
+
+def sweep_workspaces(root=None, ttl_hours=WORKSPACE_TTL_HOURS):
+    """
+    Remove the job workspaces under root not created or re-opened within
+    ttl_hours. Only jobs/<job_id> folders are touched. Returns how many went.
+    """
+    root = root or JOBS_ROOT
+    cutoff = time.time() - ttl_hours * 3600
+    removed = 0
+    try:
+        entries = list(os.scandir(root))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        if not _JOB_ID_PATTERN.match(entry.name) or not entry.is_dir(follow_symlinks=False):
+            continue
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime >= cutoff:
+                continue
+        except FileNotFoundError:
+            continue
+        shutil.rmtree(entry.path, ignore_errors=True)
+        removed += 1
+    if removed:
+        print(f"🧹 Removed {removed} job workspace(s) older than {ttl_hours:g}h")
+    return removed
+
+
+def _maybe_sweep(root):
+    global _last_sweep
+    with _sweep_lock:
+        if time.monotonic() - _last_sweep < WORKSPACE_SWEEP_INTERVAL:
+            return
+        _last_sweep = time.monotonic()
+    sweep_workspaces(root)
+
+
+class JobWorkspace:
+    """
+    Per-request working directory. Every intermediate file of a request lives
+    under jobs/<job_id>/ so concurrent uploads never overwrite each other.
+    Requests whose results are not asked for again by job_id call cleanup()
+    when they finish; the others are removed by sweep_workspaces() once they
+    have gone WORKSPACE_TTL_HOURS without use.
+    """
+
+    def __init__(self, job_id=None, root=None):
+        if job_id is None:
+            _maybe_sweep(root or JOBS_ROOT)
+        self.job_id = job_id or uuid.uuid4().hex
+        if not _JOB_ID_PATTERN.match(self.job_id):
+            raise ValueError(f"Invalid job id: {self.job_id}")
+        self.root = os.path.join(root or JOBS_ROOT, self.job_id)
+        for folder in WORKSPACE_FOLDERS:
+            os.makedirs(os.path.join(self.root, folder), exist_ok=True)
+
+    @classmethod
+    def open(cls, job_id, root=None):
+        """Re-open the workspace of an earlier request."""
+        if not job_id or not _JOB_ID_PATTERN.match(job_id):
+            raise ValueError(f"Invalid job id: {job_id}")
+        if not os.path.isdir(os.path.join(root or JOBS_ROOT, job_id)):
+            raise FileNotFoundError(f"Job {job_id} not found")
+        workspace = cls(job_id, root)
+        # Re-opened workspaces count as used for the retention sweep
+        os.utime(workspace.root)
+        return workspace
+
+    def path(self, *parts):
+        return os.path.join(self.root, *parts)
+
+    @property
+    def parsed_trial_balance(self):
+        return self.path("output1", "parsed_trial_balance.tbc")
+
+    @property
+    def notes_output(self):
+        return self.path("output2", "notes_output.json")
+
+    @property
+    def final_output_xlsx(self):
+        return self.path("output3", "final_output.xlsx")
+
+    @property
+    def notes_dir(self):
+        return self.path("generated_notes")
+
+    def save_upload(self, file, folder="input"):
+        """Copy an UploadFile into input/ (or another workspace folder) and return the saved path."""
+        filename = os.path.basename(file.filename or "upload.xlsx")
+        os.makedirs(self.path(folder), exist_ok=True)
+        file_location = self.path(folder, filename)
+        with open(file_location, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+        return file_location
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
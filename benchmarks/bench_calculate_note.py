@@ -0,0 +1,99 @@
+"""
+Row-by-row vs mask-based calculate_note.
+
+    python benchmarks/bench_calculate_note.py [rows ...] [--repeats N] [--rowwise-max ROWS]
+
+For each size (default 1k, 100k and 1M rows) builds a synthetic parsed trial
+balance (account_name, group, amount with some blanks and text amounts) and
+runs every note query generate_notes makes. Where the row loop is run (sizes up
+to --rowwise-max, default 100k) the totals and matched accounts are checked
+against it; the mask-based time includes preparing the NoteFrame once.
+"""
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.main16_23 import calculate_note, calculate_note_rowwise, note_frame
+from app.note_specs import get_note_plan
+
+ACCOUNTS = [
+    "Cash-in-hand", "Bank accounts - HDFC", "Fixed Deposits", "Sundry Creditors", "Expenses Payable",
+    "Salary", "Contribution to PF", "Office Rent", "Servicing of BA/BE PROJECTS EXPORT",
+    "Interest on FD", "Furniture and Fixtures", "Prepaid Expenses", "Provision for Gratuity",
+    "Share Capital", "Miscellaneous expenses", "Depreciation", "Bank Charges", "Audit Fee",
+]
+GROUPS = ["Cash and Cash Equivalents", "Trade Payables", "Other Expenses", "Revenue from Operations", None]
+
+
+def synthetic_trial_balance(rows, seed=7):
+    rng = random.Random(seed)
+    names, groups, amounts = [], [], []
+    for i in range(rows):
+        names.append(f"{rng.choice(ACCOUNTS)} {i % 997}" if i % 100 else None)
+        groups.append(rng.choice(GROUPS))
+        style = rng.random()
+        value = round(rng.uniform(-5_000_000, 5_000_000), 2)
+        amounts.append(None if style < 0.05 else f"{value:,.2f}" if style < 0.1 else value)
+    return pd.DataFrame({"account_name": names, "group": groups, "amount": amounts})
+
+
+def queries():
+    """(keywords, exclude) of every top-level note query."""
+    return [(note.keywords, note.exclude) for note in get_note_plan().notes.values()]
+
+
+def run_rowwise(df):
+    return [calculate_note_rowwise(df, "", keywords, exclude) for keywords, exclude in queries()]
+
+
+def run_masked(df):
+    frame = note_frame(df)
+    return [calculate_note(frame, "", keywords, exclude) for keywords, exclude in queries()]
+
+
+def best_of(func, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    args = sys.argv[1:]
+    repeats = 3
+    rowwise_max = 100_000
+    sizes = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--repeats":
+            repeats = int(args.pop(0))
+        elif arg == "--rowwise-max":
+            rowwise_max = int(args.pop(0))
+        else:
+            sizes.append(int(arg))
+    sizes = sizes or [1_000, 100_000, 1_000_000]
+
+    for rows in sizes:
+        df = synthetic_trial_balance(rows)
+        masked_s, results = best_of(lambda: run_masked(df), repeats)
+        print(f"📊 {rows:,} rows x {len(queries())} note queries")
+        if rows <= rowwise_max:
+            rowwise_s, expected = best_of(lambda: run_rowwise(df), 1)
+            if results != expected:
+                raise SystemExit("❌ mask-based calculate_note returned different results")
+            print(f"   row-by-row: {rowwise_s * 1000:9.1f} ms")
+            print(f"   masks:      {masked_s * 1000:9.1f} ms  ({rowwise_s / masked_s:.1f}x)")
+        else:
+            print(f"   masks:      {masked_s * 1000:9.1f} ms  (row-by-row skipped above {rowwise_max:,} rows)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Row-by-row vs columnar trial balance extraction.
+
+    python benchmarks/bench_extract.py [rows] [repeats]
+
+Builds a synthetic general-ledger style trial balance (account name, debit,
+credit, net with "Cr" suffixes, blanks and subtotal lines), checks that both
+paths return the same records and prints the best time of each.
+"""
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.classifier import CompiledClassifier
+from app.extract import extract_records, extract_records_rowwise, get_smart_rules, load_mappings
+
+ACCOUNTS = [
+    "Cash in Hand", "HDFC Bank Current Account", "Sundry Debtors", "Sundry Creditors",
+    "Salary Payable", "GST Payable", "TDS Payable", "Office Rent", "Sales - Domestic",
+    "Interest on Term Loan", "Furniture and Fixtures", "Prepaid Insurance",
+    "Provision for Gratuity", "Share Capital", "Misc Expenses",
+]
+
+
+def amount_text(rng):
+    value = round(rng.uniform(0, 5_000_000), 2)
+    style = rng.random()
+    if style < 0.4:
+        return value
+    if style < 0.7:
+        return f"{value:,.2f} Cr"
+    if style < 0.9:
+        return f"{value:,.2f} Dr"
+    return ""
+
+
+def synthetic_trial_balance(rows, seed=7):
+    rng = random.Random(seed)
+    data = []
+    for i in range(rows):
+        if i % 50 == 0:
+            data.append([None, None, None, None])
+            continue
+        name = f"{rng.choice(ACCOUNTS)} {i % 997}"
+        net = amount_text(rng) if rng.random() < 0.6 else None
+        data.append([name, amount_text(rng), amount_text(rng), net])
+    return pd.DataFrame(data, columns=["Particulars", "Debit", "Credit", "Closing Balance"])
+
+
+def best_of(func, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    df = synthetic_trial_balance(rows)
+    exact_mappings, keyword_rules = load_mappings(
+        os.path.join("config", "mapping1.json"), os.path.join("config", "rules1.json")
+    )
+    smart_rules = get_smart_rules()
+    classifier = CompiledClassifier(exact_mappings, keyword_rules, smart_rules)
+
+    rowwise_s, expected = best_of(
+        lambda: extract_records_rowwise(df, "synthetic.xlsx", exact_mappings, keyword_rules, smart_rules), repeats
+    )
+    columnar_s, records = best_of(lambda: extract_records(df, "synthetic.xlsx", classifier), repeats)
+    if records != expected:
+        raise SystemExit("❌ columnar extraction returned different records")
+
+    print(f"📊 {rows:,} rows -> {len(records):,} records")
+    print(f"   row-by-row: {rowwise_s * 1000:9.1f} ms")
+    print(f"   columnar:   {columnar_s * 1000:9.1f} ms  ({rowwise_s / columnar_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
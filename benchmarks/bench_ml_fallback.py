@@ -0,0 +1,52 @@
+"""
+Accuracy and speed of the ML fallback classifier.
+
+    python benchmarks/bench_ml_fallback.py [holdout fraction] [query rows]
+
+Trains on the labelled accounts of the mapping registry minus a random
+holdout, reports precision/coverage on the holdout per confidence threshold,
+then times one batch prediction over query rows built from the holdout names.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.mapping_registry import current_mappings
+from app.ml_fallback import NgramNeighbourClassifier
+
+THRESHOLDS = [0.0, 0.2, 0.3, 0.4, 0.5]
+
+
+def main():
+    holdout = float(sys.argv[1]) if len(sys.argv) > 1 else 0.2
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20_000
+    examples = list(current_mappings().ml_examples)
+    random.Random(5).shuffle(examples)
+    cut = int(len(examples) * (1 - holdout))
+    train, test = examples[:cut], examples[cut:]
+
+    model = NgramNeighbourClassifier(train)
+    predictions = model.predict([name for name, _ in test])
+    print(f"📊 trained on {model.size} accounts ({len(model.vocabulary):,} n-grams) in {model.train_ms} ms, "
+          f"{len(test)} held out")
+    for threshold in THRESHOLDS:
+        kept = [(group, expected) for (group, confidence), (_, expected) in zip(predictions, test)
+                if group is not None and confidence >= threshold]
+        correct = sum(group == expected for group, expected in kept)
+        print(f"   confidence >= {threshold:.1f}: coverage {len(kept) / len(test):6.1%}  "
+              f"precision {correct / len(kept) if kept else 0:6.1%}")
+
+    rng = random.Random(9)
+    queries = [f"{rng.choice(test)[0]} {i % 97}" for i in range(rows)]
+    started = time.perf_counter()
+    model.predict(queries)
+    elapsed = (time.perf_counter() - started) * 1000
+    distinct = len(set(queries))
+    print(f"   predict: {rows:,} rows ({distinct:,} distinct) in {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
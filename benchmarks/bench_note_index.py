@@ -0,0 +1,57 @@
+"""
+One mask scan per note line vs one NoteIndex scan for every line.
+
+    python benchmarks/bench_note_index.py [rows ...] [--repeats N]
+
+Runs every distinct note and line query of the note specs (NotePlan.queries())
+on the synthetic trial balances of bench_calculate_note.py, once as a NoteFrame
+query per target and once through a NoteIndex, checks that both give the same
+totals and matched accounts and prints the best time of each.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from bench_calculate_note import best_of, synthetic_trial_balance
+from app.main16_23 import note_frame
+from app.note_engine import NoteIndex
+from app.note_specs import get_note_plan
+
+
+def run_masked(frame, targets):
+    return {key: frame.calculate(keywords, exclude) for key, (keywords, exclude) in targets.items()}
+
+
+def run_indexed(frame, targets):
+    index = NoteIndex(frame, targets)
+    return {key: index.result(key) for key in targets}
+
+
+def main():
+    args = sys.argv[1:]
+    repeats = 3
+    sizes = []
+    while args:
+        arg = args.pop(0)
+        if arg == "--repeats":
+            repeats = int(args.pop(0))
+        else:
+            sizes.append(int(arg))
+    sizes = sizes or [1_000, 100_000, 1_000_000]
+    targets = dict(enumerate(get_note_plan().queries()))
+
+    for rows in sizes:
+        frame = note_frame(synthetic_trial_balance(rows))
+        masked_s, expected = best_of(lambda: run_masked(frame, targets), repeats)
+        indexed_s, results = best_of(lambda: run_indexed(frame, targets), repeats)
+        if results != expected:
+            raise SystemExit("❌ NoteIndex returned different results")
+        print(f"📊 {rows:,} rows x {len(targets)} note lines")
+        print(f"   mask per line: {masked_s * 1000:9.1f} ms")
+        print(f"   one scan:      {indexed_s * 1000:9.1f} ms  ({masked_s / indexed_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
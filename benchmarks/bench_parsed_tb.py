@@ -0,0 +1,69 @@
+"""
+Loading the parsed trial balance: pretty-printed JSON vs the .tbc columnar file.
+
+    python benchmarks/bench_parsed_tb.py [rows] [repeats]
+
+Writes the same synthetic records in both formats, checks they load to the
+same DataFrame and prints file size and best load time of each.
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from app.columnar import load_trial_balance_frame, save_parsed_trial_balance
+
+GROUPS = ["Cash and Cash Equivalents", "Trade Receivables", "Trade Payables", "Other Current Liabilities",
+          "Revenue from Operations", "Other Expenses", "Finance Costs", "Unmapped"]
+METHODS = ["mapping.json", "rules.json", "smart_rules", "Unmapped"]
+
+
+def synthetic_records(rows, seed=3):
+    rng = random.Random(seed)
+    return [
+        {
+            "account_name": f"Account {i % 4001} - {rng.choice(GROUPS)}",
+            "group": rng.choice(GROUPS),
+            "amount": round(rng.uniform(-5_000_000, 5_000_000), 2),
+            "mapped_by": rng.choice(METHODS),
+            "source_file": "synthetic.xlsx",
+        }
+        for i in range(rows)
+    ]
+
+
+def best_of(func, repeats):
+    best = None
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    records = synthetic_records(rows)
+    with tempfile.TemporaryDirectory() as tmp:
+        json_path = os.path.join(tmp, "parsed_trial_balance.json")
+        tbc_path = os.path.join(tmp, "parsed_trial_balance.tbc")
+        save_parsed_trial_balance(records, json_path)
+        save_parsed_trial_balance(records, tbc_path, export_json=False)
+
+        json_s, expected = best_of(lambda: load_trial_balance_frame(json_path), repeats)
+        tbc_s, df = best_of(lambda: load_trial_balance_frame(tbc_path), repeats)
+        if not df.equals(expected):
+            raise SystemExit("❌ columnar file loaded a different trial balance")
+
+        print(f"📊 {rows:,} records")
+        print(f"   json: {os.path.getsize(json_path) / 1e6:7.1f} MB  {json_s * 1000:8.1f} ms")
+        print(f"   tbc:  {os.path.getsize(tbc_path) / 1e6:7.1f} MB  {tbc_s * 1000:8.1f} ms  ({json_s / tbc_s:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Peak memory of streaming vs pandas trial balance extraction.
+
+    python benchmarks/bench_stream_extract.py [rows ...]
+
+For each size, writes a synthetic .xlsx trial balance and extracts it to JSON
+in a fresh process per mode, reporting wall time and peak RSS. Streaming
+should stay roughly flat as the row count grows; pandas grows with the sheet.
+"""
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+ACCOUNTS = ["Cash in Hand", "HDFC Bank", "Sundry Debtors", "Sundry Creditors", "Salary Payable",
+            "GST Payable", "Office Rent", "Sales - Domestic", "Interest on Term Loan"]
+
+
+def write_workbook(path, rows, seed=11):
+    from openpyxl import Workbook
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("TB")
+    sheet.append(["Particulars", "Debit", "Credit", "Closing Balance"])
+    for i in range(rows):
+        amount = round(rng.uniform(0, 1_000_000), 2)
+        net = f"{amount:,.2f} Cr" if i % 3 == 0 else amount
+        sheet.append([f"{rng.choice(ACCOUNTS)} {i % 503}", amount, None, net])
+    workbook.save(path)
+
+
+def run_mode(mode, path, output):
+    """Child process: extract one workbook and print elapsed seconds and peak RSS (KB)."""
+    os.environ["STREAM_EXTRACT"] = "1" if mode == "stream" else "0"
+    from app.extract import extract_trial_balance_to_file
+    started = time.perf_counter()
+    count = extract_trial_balance_to_file(path, output)
+    elapsed = time.perf_counter() - started
+    print(count, elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "--child":
+        run_mode(*sys.argv[2:5])
+        return
+    sizes = [int(arg) for arg in sys.argv[1:]] or [20_000, 100_000, 300_000]
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            path = os.path.join(tmp, f"tb_{rows}.xlsx")
+            write_workbook(path, rows)
+            print(f"📊 {rows:,} rows ({os.path.getsize(path) / 1e6:.1f} MB)")
+            for mode in ("pandas", "stream"):
+                output = os.path.join(tmp, f"{mode}_{rows}.json")
+                result = subprocess.run(
+                    [sys.executable, os.path.abspath(__file__), "--child", mode, path, output],
+                    capture_output=True, text=True, check=True, cwd=ROOT,
+                )
+                count, elapsed, peak_kb = result.stdout.strip().splitlines()[-1].split()
+                print(f"   {mode:<7} {float(elapsed):7.2f} s  peak RSS {int(peak_kb) / 1024:7.1f} MB  ({int(count):,} records)")
+
+
+if __name__ == "__main__":
+    main()
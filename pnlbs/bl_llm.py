@@ -9,13 +9,6 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-try:
-    from temp_bl import BalanceSheet as BalanceSheetTemplate
-    print("Template imported")
-except ImportError:
-    print("temp_bl.py not found")
-    exit(1)
-
 class EnhancedBalanceSheetGenerator:
     def __init__(self, api_key: str):
         self.api_key = api_key
@@ -723,7 +716,17 @@ Return ONLY this JSON format:
             # Load JSON data
             with open(input_file, 'r', encoding='utf-8') as f:
                 json_data = json.load(f)
-            
+        except Exception as e:
+            print(f" Error processing file: {e}")
+            import traceback
+            traceback.print_exc()
+            return None
+        
+        return self.process_data(json_data, output_dir)
+
+    def process_data(self, json_data: dict, output_dir: str = "output"):
+        """Build the balance sheet Excel from already-loaded financial JSON; returns the output path"""
+        try:
             print(" Extracting data from JSON structure...")
             
             # Method 1: Direct extraction from structured JSON
@@ -210,10 +210,17 @@ class FinancialCSVMapper:
         try:
             # Read CSV
             df = pd.read_csv(file_path, encoding='utf-8')
-            
-            filename = os.path.basename(file_path)
-            base_name = os.path.splitext(filename)[0]
-            
+        except Exception as e:
+            return {
+                "file_name": os.path.basename(file_path),
+                "error": str(e),
+                "processing_date": datetime.now().isoformat()
+            }
+        return self.process_dataframe(df, os.path.basename(file_path))
+    
+    def process_dataframe(self, df: pd.DataFrame, filename: str) -> Dict:
+        """Parse one note sheet; filename (e.g. Note_9_Full.csv) selects the parser"""
+        try:
             result = {
                 "file_name": filename,
                 "processing_date": datetime.now().isoformat()
@@ -241,7 +248,7 @@ class FinancialCSVMapper:
             
         except Exception as e:
             return {
-                "file_name": os.path.basename(file_path),
+                "file_name": filename,
                 "error": str(e),
                 "processing_date": datetime.now().isoformat()
             }
@@ -256,10 +263,26 @@ class FinancialCSVMapper:
         if not csv_files:
             return {"error": f"No CSV files found in {self.csv_folder_path}"}
         
+        file_results = {
+            csv_file: self.process_single_csv(os.path.join(self.csv_folder_path, csv_file))
+            for csv_file in csv_files
+        }
+        return self.build_financial_data(file_results)
+    
+    def process_dataframes(self, frames: Dict[str, pd.DataFrame]) -> Dict:
+        """Same as process_all_csvs, for note sheets already loaded as DataFrames keyed by CSV name"""
+        if not frames:
+            return {"error": "No note sheets to process"}
+        
+        file_results = {name: self.process_dataframe(df, name) for name, df in frames.items()}
+        return self.build_financial_data(file_results)
+    
+    def build_financial_data(self, file_results: Dict[str, Dict]) -> Dict:
+        """Organize parsed files into financial statement categories"""
         financial_data = {
             "company_financial_data": {
                 "processing_summary": {
-                    "total_files": len(csv_files),
+                    "total_files": len(file_results),
                     "processing_date": datetime.now().isoformat(),
                     "processed_files": []
                 },
@@ -275,10 +298,7 @@ class FinancialCSVMapper:
         }
         
         # Process each file
-        for csv_file in csv_files:
-            file_path = os.path.join(self.csv_folder_path, csv_file)
-            file_data = self.process_single_csv(file_path)
-            
+        for csv_file, file_data in file_results.items():
             if "error" not in file_data:
                 financial_data["company_financial_data"]["processing_summary"]["processed_files"].append(csv_file)
                 
@@ -5,10 +5,12 @@ from openpyxl.styles import Font, Border, Side, Alignment
 from typing import Dict, List, Tuple, Any
 
 class PnLGenerator:
-    def __init__(self, json_file_path: str = "clean_financial_data_pnl.json"):
-        """Initialize the P&L generator with JSON file path."""
+    def __init__(self, json_file_path: str = "clean_financial_data_pnl.json", data: Dict = None):
+        """Initialize the P&L generator with JSON file path, or with the parsed JSON as data."""
         self.json_file_path = json_file_path
         self.financial_data = {}
+        if data is not None:
+            self.set_financial_data(data)
         
     def load_financial_data(self) -> bool:
         """Load financial data from JSON file."""
@@ -18,16 +20,7 @@ class PnLGenerator:
             with open(self.json_file_path, 'r', encoding='utf-8') as f:
                 data = json.load(f)
             
-            # Handle different JSON structures flexibly
-            if "company_financial_data" in data:
-                self.financial_data = data["company_financial_data"].get("other_data", {})
-            elif "other_data" in data:
-                self.financial_data = data["other_data"]
-            else:
-                # Assume the JSON structure matches your format directly
-                self.financial_data = data
-                
-            print(f" Loaded data for {len(self.financial_data)} financial items")
+            self.set_financial_data(data)
             return True
             
         except FileNotFoundError:
@@ -40,6 +33,19 @@ class PnLGenerator:
             print(f"Error loading data: {str(e)}")
             return False
     
+    def set_financial_data(self, data: Dict) -> None:
+        """Use financial data that is already in memory (same structures as the JSON file)."""
+        # Handle different JSON structures flexibly
+        if "company_financial_data" in data:
+            self.financial_data = data["company_financial_data"].get("other_data", {})
+        elif "other_data" in data:
+            self.financial_data = data["other_data"]
+        else:
+            # Assume the JSON structure matches your format directly
+            self.financial_data = data
+            
+        print(f" Loaded data for {len(self.financial_data)} financial items")
+    
     def extract_values(self, item_key: str) -> Tuple[float, float]:
         """Extract 2024 and 2023 values from financial data."""
         if item_key not in self.financial_data:
@@ -1,33 +1,41 @@
 import os
 import pandas as pd
 import sys
-sys.stdout.reconfigure(encoding='utf-8')
 
-# Load the Excel file
-file_path = "In Lakhs  BS_FY 23-24 V5 - Final.xlsx"
-xls = pd.ExcelFile(file_path)
+# Balance sheet note sheets and the CSV name each one is exported as
+BS_NOTE_SHEETS = {
+    "Note 2 - 8": "Note_2_to_8_Full.csv",
+    "Note 9": "Note_9_Full.csv",
+    "Note 10-15": "Note_10_to_15_Full.csv",
+}
 
 # Define helper to clean each note
-def clean_note(sheet_name, skiprows=3):
+def clean_note(xls, sheet_name, skiprows=3):
     df = xls.parse(sheet_name, skiprows=skiprows)
     df = df.dropna(how='all').dropna(axis=1, how='all').reset_index(drop=True)
     return df
 
-# Clean each sheet
-note_2_8_df = clean_note("Note 2 - 8", skiprows=3)
-note_9_df = clean_note("Note 9", skiprows=3)
-note_10_15_df = clean_note("Note 10-15", skiprows=3)
+def extract_bs_notes(file_path):
+    """Read the balance sheet note sheets into DataFrames keyed by their CSV name."""
+    with pd.ExcelFile(file_path) as xls:
+        return {csv_name: clean_note(xls, sheet_name, skiprows=3) for sheet_name, csv_name in BS_NOTE_SHEETS.items()}
 
-# Ensure output folder exists
-output_folder = "csv_notes_bs"
-os.makedirs(output_folder, exist_ok=True)
+if __name__ == "__main__":
+    sys.stdout.reconfigure(encoding='utf-8')
 
-# Export each as CSV in the folder
-note_2_8_df.to_csv(os.path.join(output_folder, "Note_2_to_8_Full.csv"), index=False)
-note_9_df.to_csv(os.path.join(output_folder, "Note_9_Full.csv"), index=False)
-note_10_15_df.to_csv(os.path.join(output_folder, "Note_10_to_15_Full.csv"), index=False)
+    # Load the Excel file
+    file_path = sys.argv[1] if len(sys.argv) > 1 else "In Lakhs  BS_FY 23-24 V5 - Final.xlsx"
+    frames = extract_bs_notes(file_path)
 
-# Print confirmation and row counts
-print(f"Extracted rows: Note 2–8 = {note_2_8_df.shape[0]} rows")
-print(f"Extracted rows: Note 9   = {note_9_df.shape[0]} rows")
-print(f"Extracted rows: Note 10–15 = {note_10_15_df.shape[0]} rows")
+    # Ensure output folder exists
+    output_folder = "csv_notes_bs"
+    os.makedirs(output_folder, exist_ok=True)
+
+    # Export each as CSV in the folder
+    for csv_name, df in frames.items():
+        df.to_csv(os.path.join(output_folder, csv_name), index=False)
+
+    # Print confirmation and row counts
+    print(f"Extracted rows: Note 2–8 = {frames['Note_2_to_8_Full.csv'].shape[0]} rows")
+    print(f"Extracted rows: Note 9   = {frames['Note_9_Full.csv'].shape[0]} rows")
+    print(f"Extracted rows: Note 10–15 = {frames['Note_10_to_15_Full.csv'].shape[0]} rows")
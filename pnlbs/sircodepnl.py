@@ -1,27 +1,31 @@
 import pandas as pd
 import os
+import sys
 
+# P&L note sheets and the CSV name each one is exported as
+PNL_NOTE_SHEETS = {
+    "Note 16-23": "Note_16_to_23_Full.csv",
+}
 
-file_path = "In Lakhs  BS_FY 23-24 V5 - Final.xlsx"
-xls = pd.ExcelFile(file_path)
-
-
-def clean_note(sheet_name, skiprows=3):
+def clean_note(xls, sheet_name, skiprows=3):
     df = xls.parse(sheet_name, skiprows=skiprows)
     df = df.dropna(how='all').dropna(axis=1, how='all').reset_index(drop=True)
     return df
 
-# Clean each sheet
-note_16_23_df = clean_note("Note 16-23", skiprows=3)
-
+def extract_pnl_notes(file_path):
+    """Read the P&L note sheets into DataFrames keyed by their CSV name."""
+    with pd.ExcelFile(file_path) as xls:
+        return {csv_name: clean_note(xls, sheet_name, skiprows=3) for sheet_name, csv_name in PNL_NOTE_SHEETS.items()}
 
-# Export each as CSV
-output_folder = "csv_notes_pnl"
-os.makedirs(output_folder, exist_ok=True)
+if __name__ == "__main__":
+    file_path = sys.argv[1] if len(sys.argv) > 1 else "In Lakhs  BS_FY 23-24 V5 - Final.xlsx"
+    frames = extract_pnl_notes(file_path)
 
-# Export each as CSV in the folder
-note_16_23_df.to_csv(os.path.join(output_folder, "Note_16_to_23_Full.csv"), index=False)
+    # Export each as CSV
+    output_folder = "csv_notes_pnl"
+    os.makedirs(output_folder, exist_ok=True)
 
+    for csv_name, df in frames.items():
+        df.to_csv(os.path.join(output_folder, csv_name), index=False)
 
-# Print confirmation and row counts
-print(f"Extracted rows: Note 16-23 = {note_16_23_df.shape[0]} rows")
+    print(f"Extracted rows: Note 16-23 = {frames['Note_16_to_23_Full.csv'].shape[0]} rows")
@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+import pytest
+
+import app.extract as extract
+import app.llm_fallback as llm_fallback
+from app.llm_fallback import LLMBudget, LLMFallback
+
+
+class StubLLM:
+    """Local OpenRouter stand-in that answers every name with `category` after `delay` seconds."""
+
+    def __init__(self, delay=0.0, category="Current Asset"):
+        self.delay = delay
+        self.category = category
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.requests += 1
+                time.sleep(stub.delay)
+                lines = body["messages"][1]["content"].splitlines()
+                answer = {str(i): stub.category for i in range(1, len(lines) + 1)}
+                reply = json.dumps({"choices": [{"message": {"content": json.dumps(answer)}}]}).encode()
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(reply)))
+                    self.end_headers()
+                    self.wfile.write(reply)
+                except OSError:
+                    pass  # the client gave up on a late request
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_port}/chat"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(StubLLM(**kwargs))
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def fallback(url, **kwargs):
+    return LLMFallback(url=url, api_key="", cache_file="", **kwargs)
+
+
+def test_answers_are_batched_deduplicated_and_cached(stub):
+    server = stub()
+    llm = fallback(server.url, batch_size=2)
+    names = ["Alpha account", "Beta account", "Alpha account", "Gamma account"]
+    assert llm.classify(names, ["Current Asset"]) == dict.fromkeys(names, "Current Asset")
+    assert server.requests == 2
+    llm.classify(names, ["Current Asset"])
+    assert server.requests == 2
+    assert llm.stats()["cache_hits"] == 3
+
+
+def test_answers_are_cached_per_mapping_version(stub):
+    server = stub()
+    llm = fallback(server.url)
+    llm.classify(["Alpha account"], ["Current Asset"], version="v1")
+    llm.classify(["Alpha account"], ["Current Asset"], version="v1")
+    assert server.requests == 1
+    # A reloaded mapping may have added or renamed groups: ask again
+    llm.classify(["Alpha account"], ["Current Asset"], version="v2")
+    assert server.requests == 2
+    # Without a version the category list keys the cache
+    llm.classify(["Alpha account"], ["Current Asset", "Fixed Asset"])
+    assert server.requests == 3
+
+
+def test_unmapped_answers_are_not_cached(stub):
+    server = stub(category="Unmapped")
+    llm = fallback(server.url)
+    assert llm.classify(["Alpha account"], ["Current Asset"], version="v1") == {}
+    # A timeout or a poor answer must not hide the name from later retries
+    server.category = "Current Asset"
+    assert llm.classify(["Alpha account"], ["Current Asset"], version="v1") == {"Alpha account": "Current Asset"}
+    assert server.requests == 2
+
+
+def test_shared_budget_covers_every_call(stub):
+    server = stub(delay=3)
+    llm = fallback(server.url, batch_size=1, timeout=10)
+    budget = LLMBudget(1)
+    started = time.monotonic()
+    assert llm.classify(["Alpha account", "Beta account"], ["Current Asset"], budget) == {}
+    # The budget is used up: later calls do not send anything
+    assert llm.classify(["Gamma account"], ["Current Asset"], budget) == {}
+    assert time.monotonic() - started < 2
+    stats = llm.stats()
+    assert stats["requests"] == 2 and stats["late"] == 2 and stats["skipped"] == 1
+
+
+class Unmapped:
+    """A classifier that leaves every name to the fallbacks."""
+
+    groups = ["Current Asset"]
+
+    def classify_many(self, names):
+        return [("Unmapped", "Unmapped")] * len(names)
+
+    def fallback_model(self):
+        return None
+
+
+def test_streamed_chunks_share_one_budget(stub, monkeypatch):
+    server = stub(delay=3)
+    monkeypatch.setattr(extract, "ML_FALLBACK", False)
+    monkeypatch.setattr(extract, "LLM_FALLBACK", True)
+    monkeypatch.setattr(llm_fallback, "_llm_fallback", fallback(server.url, timeout=10))
+    chunks = [pd.DataFrame({0: [f"Account {chunk}-{i}" for i in range(3)], 1: [1.0] * 3, 2: [0.0] * 3})
+              for chunk in range(5)]
+    started = time.monotonic()
+    records = list(extract.iter_records(chunks, "stub.xlsx", Unmapped(), LLMBudget(1)))
+    assert time.monotonic() - started < 2
+    assert len(records) == 15 and all(record["mapped_by"] == "Unmapped" for record in records)
+    assert server.requests == 1